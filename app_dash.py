@@ -7,7 +7,9 @@ from dash.dependencies import MATCH, ALL
 import os
 from flask import send_file, abort, send_from_directory
 import hashlib
+import threading
 import time
+import uuid
 from pathlib import Path
 
 ctx = callback_context
@@ -639,6 +641,11 @@ app.layout = dbc.Container([
                 ],
                 style={"marginBottom": "10px"}
             ),
+            # Respuesta RAG parcial mientras el LLM genera (fuera del Loading para que sea visible)
+            html.Div(id="panel-ia-stream"),
+            dcc.Interval(id="rag-stream-interval", interval=300, disabled=True),
+            dcc.Store(id="rag-stream-clave", data=None, storage_type='memory'),
+            dcc.Store(id="rag-stream-sesion", data=None, storage_type='memory'),
             dcc.Loading(
                 id="loading-ia",
                 type="default",
@@ -765,6 +772,105 @@ from dash.dependencies import ALL
 # Callback para mostrar paneles y manejar selección de víctima y paginación
 from dash import ctx
 
+# ============================================================================
+# STREAMING DE RESPUESTAS RAG
+# ============================================================================
+# El callback principal bloquea hasta tener la respuesta completa. Mientras
+# tanto, ejecutar_consulta_rag_inteligente deja aquí las fuentes y el texto
+# parcial del LLM, y un dcc.Interval los muestra en "panel-ia-stream".
+# La clave se deriva de la sesión (uuid por carga de página), el clic y la
+# consulta, igual en ambos callbacks: dos sesiones con el mismo número de
+# clics y la misma consulta no comparten stream.
+
+_streams_rag = {}
+_streams_rag_lock = threading.Lock()
+
+
+def _clave_stream_rag(sesion, n_clicks, consulta):
+    return hashlib.md5(f"{sesion}|{n_clicks}|{consulta}".encode('utf-8')).hexdigest()
+
+
+def _iniciar_stream_rag(clave):
+    ahora = time.time()
+    with _streams_rag_lock:
+        # Descartar streams abandonados (pestaña cerrada, etc.)
+        for vieja in [c for c, e in _streams_rag.items() if ahora - e['inicio'] > 600]:
+            del _streams_rag[vieja]
+        _streams_rag[clave] = {'texto': [], 'fuentes': None, 'terminado': False, 'inicio': ahora}
+
+
+def _agregar_stream_rag(clave, campo, valor):
+    with _streams_rag_lock:
+        estado = _streams_rag.get(clave)
+        if estado is None:
+            return
+        if campo == 'texto':
+            estado['texto'].append(valor)
+        else:
+            estado[campo] = valor
+
+
+def _leer_stream_rag(clave):
+    with _streams_rag_lock:
+        estado = _streams_rag.get(clave)
+        if estado is None:
+            return None
+        if estado['terminado']:
+            del _streams_rag[clave]
+        return {'texto': ''.join(estado['texto']), 'fuentes': estado['fuentes'],
+                'terminado': estado['terminado'], 'inicio': estado['inicio']}
+
+
+@app.callback(
+    Output("rag-stream-sesion", "data"),
+    Input("rag-stream-sesion", "modified_timestamp"),
+    State("rag-stream-sesion", "data")
+)
+def iniciar_sesion_stream_rag(_, sesion):
+    """Identificador de la sesión para las claves de stream"""
+    if sesion:
+        raise PreventUpdate
+    return uuid.uuid4().hex
+
+
+@app.callback(
+    Output("panel-ia-stream", "children"),
+    Output("rag-stream-interval", "disabled"),
+    Output("rag-stream-interval", "n_intervals"),
+    Output("rag-stream-clave", "data"),
+    Input("btn-enviar", "n_clicks"),
+    Input("rag-stream-interval", "n_intervals"),
+    State("input-consulta", "value"),
+    State("rag-stream-clave", "data"),
+    State("rag-stream-sesion", "data"),
+    prevent_initial_call=True
+)
+def mostrar_stream_rag(n_clicks, n_intervals, consulta, clave, sesion):
+    """Muestra la respuesta RAG a medida que llega"""
+    if ctx.triggered_id == "btn-enviar":
+        if not n_clicks or not consulta:
+            raise PreventUpdate
+        return None, False, 0, _clave_stream_rag(sesion, n_clicks, consulta)
+
+    estado = _leer_stream_rag(clave) if clave else None
+    if estado is None:
+        # Consulta que no es RAG (no registra stream): dejar de consultar tras ~6s
+        if n_intervals and n_intervals > 20:
+            return None, True, 0, None
+        raise PreventUpdate
+    if estado['terminado'] or time.time() - estado['inicio'] > 300:
+        return None, True, 0, None
+
+    partes = []
+    if estado['fuentes'] is not None:
+        partes.append(dbc.Badge(f"📚 {len(estado['fuentes'])} fuentes encontradas", color="success", className="mb-2"))
+    if estado['texto']:
+        partes.append(dcc.Markdown(estado['texto'] + " ▌"))
+    else:
+        partes.append(html.Div("🧠 Generando respuesta...", style={"color": "#666"}))
+    return html.Div(partes, style={"background": "#f8fff8", "borderRadius": "8px", "border": "1px dashed #4CAF50",
+                                   "padding": "12px", "marginBottom": "8px", "maxHeight": "400px", "overflowY": "auto"}), False, n_intervals, clave
+
 # ============================================================================
 # CALLBACKS DEL HISTORIAL CONVERSACIONAL
 # ============================================================================
@@ -884,9 +990,10 @@ def update_history_display(history_data):
     Input('btn-pag-prev', 'n_clicks'),
     State('input-pag', 'value'),
     State("conversation-history", "data"),  # Nueva entrada para leer historial actual
-    State("use-context-checkbox", "value")  # Checkbox para activar contexto
+    State("use-context-checkbox", "value"),  # Checkbox para activar contexto
+    State("rag-stream-sesion", "data")
 )
-def actualizar_paneles(n_clicks, consulta, nucs, departamento, municipio, tipo_documento, despacho, fecha_inicio, fecha_fin, victima_clicks, pag_next, pag_prev, pag_input, history_data, use_context):
+def actualizar_paneles(n_clicks, consulta, nucs, departamento, municipio, tipo_documento, despacho, fecha_inicio, fecha_fin, victima_clicks, pag_next, pag_prev, pag_input, history_data, use_context, sesion_stream):
     # Paginación
     page = int(pag_input) if pag_input else 1
     if ctx.triggered_id == 'btn-pag-next':
@@ -896,6 +1003,7 @@ def actualizar_paneles(n_clicks, consulta, nucs, departamento, municipio, tipo_d
 
     # === SISTEMA INTELIGENTE DE CONSULTAS ===
     resultados = None
+    clave_stream = None
     tipo_detectado = None
     victimas_filtradas = None
     total_victimas_filtradas = None
@@ -1014,7 +1122,13 @@ Consulta nueva que debes responder: {consulta_para_rag}
 INSTRUCCIÓN: Interpreta pronombres (su, él, ella, etc.) y referencias usando la conversación anterior. Si la consulta menciona "su relación con X", identifica quién es el sujeto desde el contexto previo y busca la relación específica entre ambas personas."""
                 print(f"🔍 Consulta enriquecida con contexto conversacional (método legacy)")
 
-            resultados_rag = ejecutar_consulta_rag_inteligente(consulta_enriquecida)
+            clave_stream = _clave_stream_rag(sesion_stream, n_clicks, consulta)
+            _iniciar_stream_rag(clave_stream)
+            resultados_rag = ejecutar_consulta_rag_inteligente(
+                consulta_enriquecida,
+                al_fuentes=lambda fuentes: _agregar_stream_rag(clave_stream, 'fuentes', fuentes),
+                al_token=lambda texto: _agregar_stream_rag(clave_stream, 'texto', texto)
+            )
             resultados = {
                 'respuesta_ia': resultados_rag.get('respuesta', 'Sin respuesta RAG'),
                 'trazabilidad': resultados_rag.get('fuentes', []),
@@ -1565,6 +1679,9 @@ busca la relación entre la persona mencionada en la consulta anterior y X."""
 
     # Callback para mostrar texto completo al hacer clic en chunk
     # (Dash requiere un callback extra para esto, pero aquí se deja el markup listo)
+    if clave_stream:
+        _agregar_stream_rag(clave_stream, 'terminado', True)
+
     return ia, bd, fuentes, btn_style, btn_content, graph_context_data, history_data
 
 # === FUNCIONES HELPER PARA DESCARGA DE PDFs ===
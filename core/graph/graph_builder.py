@@ -6,8 +6,10 @@ Maneja duplicados, batch inserts, y progress tracking.
 """
 
 import json
+import multiprocessing
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Set, Tuple, Optional
+from typing import Iterator, List, Dict, Set, Tuple, Optional
 from collections import defaultdict
 from tqdm import tqdm
 import time
@@ -17,6 +19,55 @@ from .age_connector import AGEConnector
 from .config import GraphConfig
 
 
+# Parser por proceso worker (se crea en el initializer del pool)
+_parser_worker: Optional[AnalisisParser] = None
+
+
+def _inicializar_worker() -> None:
+    global _parser_worker
+    _parser_worker = AnalisisParser()
+
+
+def _parsear_en_worker(json_path: str) -> Optional[Dict]:
+    return _parser_worker.parse_documento(json_path)
+
+
+@contextmanager
+def _parsear_en_paralelo(
+    json_files: List[Path],
+    workers: int,
+    ordenado: bool = True,
+    parser: Optional[AnalisisParser] = None
+) -> Iterator[Iterator[Optional[Dict]]]:
+    """
+    Reparte el parseo de JSONs entre procesos y entrega los resultados en streaming.
+
+    El parseo (regex sobre el Markdown de 'analisis') es CPU puro, así que
+    escala con núcleos; los dicts resultantes vuelven al proceso principal
+    a medida que se completan.
+
+    Args:
+        json_files: Archivos a parsear
+        workers: Número de procesos (<= 1 parsea en el proceso actual)
+        ordenado: Si True respeta el orden de json_files
+        parser: Parser a usar en modo secuencial (conserva sus estadísticas)
+
+    Yields:
+        Iterador de resultados de AnalisisParser.parse_documento
+    """
+    rutas = [str(f) for f in json_files]
+
+    if workers <= 1:
+        parser = parser or AnalisisParser()
+        yield (parser.parse_documento(r) for r in rutas)
+        return
+
+    chunksize = max(1, min(32, len(rutas) // (workers * 8) or 1))
+    with multiprocessing.Pool(processes=workers, initializer=_inicializar_worker) as pool:
+        mapear = pool.imap if ordenado else pool.imap_unordered
+        yield mapear(_parsear_en_worker, rutas, chunksize=chunksize)
+
+
 class GraphBuilder:
     """
     Constructor del grafo de documentos jurídicos.
@@ -26,18 +77,41 @@ class GraphBuilder:
     - Deduplicar entidades
     - Insertar nodos y relaciones eficientemente
     - Reportar progreso y estadísticas
+
+    En modo bulk los nodos y relaciones de un lote de JSONs se acumulan en
+    memoria y se insertan con sentencias UNWIND por lotes (ver volcar_lote),
+    en lugar de un CREATE por entidad.
     """
 
-    def __init__(self, config: Optional[GraphConfig] = None):
+    # Estadística que corresponde a cada etiqueta de nodo
+    _STAT_POR_ETIQUETA = {
+        "Persona": "personas_insertadas",
+        "Organizacion": "organizaciones_insertadas",
+        "Lugar": "lugares_insertados",
+        "Documento": "documentos_nodos_insertados",
+    }
+
+    def __init__(self, config: Optional[GraphConfig] = None, modo_bulk: bool = False):
         """
         Inicializa el builder.
 
         Args:
             config: Configuración del grafo
+            modo_bulk: Si True, acumula entidades y las inserta por lotes
         """
         self.config = config or GraphConfig()
         self.parser = AnalisisParser()
         self.connector = AGEConnector(config)
+        self.modo_bulk = modo_bulk
+
+        # Pendientes de inserción en modo bulk
+        self._nodos_pendientes: Dict[str, List[Dict]] = defaultdict(list)
+        self._relaciones_pendientes: List[Dict] = []
+        # clave normalizada -> (etiqueta, propiedad clave) de los nodos conocidos
+        self._etiqueta_por_clave: Dict[str, Tuple[str, str]] = {}
+        self._etiquetas_indexadas: Set[str] = set()
+        # Filas rechazadas por la carga masiva: {'row', 'error'}
+        self.filas_fallidas: List[Dict] = []
 
         # Trackers para deduplicación
         self.personas_vistas: Set[str] = set()
@@ -75,6 +149,78 @@ class GraphBuilder:
         """
         return nombre.strip().lower()
 
+    def _insertar_nodo(self, label: str, properties: Dict, graph_name: str) -> bool:
+        """
+        Inserta un nodo, o lo deja pendiente para el próximo volcado en modo bulk.
+
+        Args:
+            label: Etiqueta del nodo
+            properties: Propiedades (debe incluir nombre_normalizado o archivo_normalizado)
+            graph_name: Nombre del grafo
+
+        Returns:
+            True si se insertó o encoló
+        """
+        if not self.modo_bulk:
+            if self.connector.create_node(label, properties, graph_name):
+                self.stats[self._STAT_POR_ETIQUETA[label]] += 1
+                return True
+            return False
+
+        prop_clave = "archivo_normalizado" if "archivo_normalizado" in properties else "nombre_normalizado"
+        self._etiqueta_por_clave.setdefault(properties[prop_clave], (label, prop_clave))
+        self._nodos_pendientes[label].append(properties)
+        return True
+
+    def volcar_lote(self, graph_name: str) -> None:
+        """
+        Inserta los nodos y relaciones pendientes (modo bulk).
+
+        Primero los nodos agrupados por etiqueta y luego las relaciones
+        agrupadas por las etiquetas de sus extremos, con UNWIND por lotes de
+        config.build_batch_size filas.
+        """
+        batch_size = self.config.build_batch_size
+
+        for label, rows in self._nodos_pendientes.items():
+            if not rows:
+                continue
+            creados = self.connector.create_nodes_bulk(
+                label, rows, graph_name, batch_size, fallidas=self.filas_fallidas
+            )
+            self.stats[self._STAT_POR_ETIQUETA[label]] += creados
+            self.stats["errores"] += len(rows) - creados
+
+            # La tabla de la etiqueta existe tras la primera inserción
+            if label not in self._etiquetas_indexadas:
+                prop_clave = "archivo_normalizado" if label == "Documento" else "nombre_normalizado"
+                self.connector.ensure_property_index(label, prop_clave, graph_name)
+                self._etiquetas_indexadas.add(label)
+        self._nodos_pendientes.clear()
+
+        # Agrupar relaciones por (etiqueta, propiedad) de origen y destino
+        grupos: Dict[Tuple, List[Dict]] = defaultdict(list)
+        for row in self._relaciones_pendientes:
+            origen = self._etiqueta_por_clave.get(row["origen"], (None, "nombre_normalizado"))
+            destino = self._etiqueta_por_clave.get(row["destino"], (None, "nombre_normalizado"))
+            grupos[origen + destino].append(row)
+
+        for (from_label, from_prop, to_label, to_prop), rows in grupos.items():
+            fallidas_previas = len(self.filas_fallidas)
+            self.stats["relaciones_insertadas"] += self.connector.create_relationships_bulk(
+                "VINCULADO",
+                rows,
+                from_label=from_label,
+                from_property=from_prop,
+                to_label=to_label,
+                to_property=to_prop,
+                graph_name=graph_name,
+                batch_size=batch_size,
+                fallidas=self.filas_fallidas
+            )
+            self.stats["errores"] += len(self.filas_fallidas) - fallidas_previas
+        self._relaciones_pendientes.clear()
+
     def _crear_nodo_persona(self, persona: Persona, graph_name: str) -> bool:
         """
         Crea un nodo de tipo Persona en el grafo.
@@ -104,9 +250,8 @@ class GraphBuilder:
         if persona.documento_id:
             properties["documentos"] = [persona.documento_id]
 
-        if self.connector.create_node("Persona", properties, graph_name):
+        if self._insertar_nodo("Persona", properties, graph_name):
             self.personas_vistas.add(nombre_normalizado)
-            self.stats["personas_insertadas"] += 1
             return True
 
         return False
@@ -140,9 +285,8 @@ class GraphBuilder:
         if org.documento_id:
             properties["documentos"] = [org.documento_id]
 
-        if self.connector.create_node("Organizacion", properties, graph_name):
+        if self._insertar_nodo("Organizacion", properties, graph_name):
             self.organizaciones_vistas.add(nombre_normalizado)
-            self.stats["organizaciones_insertadas"] += 1
             return True
 
         return False
@@ -176,9 +320,8 @@ class GraphBuilder:
         if lugar.documento_id:
             properties["documentos"] = [lugar.documento_id]
 
-        if self.connector.create_node("Lugar", properties, graph_name):
+        if self._insertar_nodo("Lugar", properties, graph_name):
             self.lugares_vistos.add(nombre_normalizado)
-            self.stats["lugares_insertados"] += 1
             return True
 
         return False
@@ -226,9 +369,8 @@ class GraphBuilder:
         if documento.entidad_productora:
             properties["entidad_productora"] = documento.entidad_productora
 
-        if self.connector.create_node("Documento", properties, graph_name):
+        if self._insertar_nodo("Documento", properties, graph_name):
             self.documentos_vistos.add(archivo_normalizado)
-            self.stats["documentos_nodos_insertados"] += 1
             return True
 
         return False
@@ -264,6 +406,13 @@ class GraphBuilder:
             "documento_id": relacion.documento_id
         }
 
+        if self.modo_bulk:
+            self._relaciones_pendientes.append(
+                {"origen": origen_norm, "destino": destino_norm, **rel_props}
+            )
+            self.relaciones_vistas.add(rel_tuple)
+            return True
+
         # Intentar crear la relación
         # Nota: AGE tiene issues con MATCH en algunos casos, podemos necesitar
         # un approach más robusto posteriormente
@@ -300,10 +449,25 @@ class GraphBuilder:
         Returns:
             Dict con estadísticas del documento
         """
-        try:
-            # Usar el parser para procesar el documento
-            resultado = self.parser.parse_documento(str(json_path))
+        # Usar el parser para procesar el documento
+        resultado = self.parser.parse_documento(str(json_path))
+        return self.procesar_resultado(resultado, graph_name)
+
+    def procesar_resultado(self, resultado: Optional[Dict], graph_name: str) -> Dict:
+        """
+        Deduplica e inserta las entidades ya parseadas de un documento.
 
+        Es la etapa "escritora": se ejecuta siempre en el proceso principal,
+        que es el único dueño de personas_vistas / relaciones_vistas.
+
+        Args:
+            resultado: Salida de AnalisisParser.parse_documento (o None)
+            graph_name: Nombre del grafo
+
+        Returns:
+            Dict con estadísticas del documento
+        """
+        try:
             if not resultado:
                 self.stats["documentos_sin_entidades"] += 1
                 return {"procesado": True, "tiene_entidades": False}
@@ -383,7 +547,10 @@ class GraphBuilder:
         json_dir: Path,
         graph_name: Optional[str] = None,
         limit: Optional[int] = None,
-        recrear_grafo: bool = False
+        recrear_grafo: bool = False,
+        bulk: Optional[bool] = None,
+        workers: Optional[int] = None,
+        ordenado: bool = True
     ) -> Dict:
         """
         Construye el grafo procesando todos los JSONs de un directorio.
@@ -393,12 +560,20 @@ class GraphBuilder:
             graph_name: Nombre del grafo (usa config si no se proporciona)
             limit: Límite de documentos a procesar (None = todos)
             recrear_grafo: Si True, elimina y recrea el grafo
+            bulk: Si True, inserta por lotes de config.parse_batch_size JSONs
+                  con UNWIND. Si None, usa el modo del builder.
+            workers: Procesos para parsear JSONs en paralelo (None = config.parse_workers,
+                     1 = secuencial). Las inserciones siguen en el proceso principal.
+            ordenado: Si True, los resultados se insertan en el orden de los archivos;
+                      si False, en el orden en que terminan los workers.
 
         Returns:
             Dict con estadísticas finales
         """
         graph_name = graph_name or self.config.graph_name
         json_dir = Path(json_dir)
+        if bulk is not None:
+            self.modo_bulk = bulk
 
         if not json_dir.exists():
             raise ValueError(f"Directorio no existe: {json_dir}")
@@ -428,11 +603,19 @@ class GraphBuilder:
         # Procesar con progress bar
         start_time = time.time()
 
-        with tqdm(total=total_files, desc="Procesando JSONs", unit="doc") as pbar:
-            for json_file in json_files:
-                self.procesar_documento(json_file, graph_name)
+        workers = workers or self.config.parse_workers
+        if workers > 1:
+            print(f"⚙️  Parseando con {workers} procesos ({'ordenado' if ordenado else 'sin orden'})")
+
+        with tqdm(total=total_files, desc="Procesando JSONs", unit="doc") as pbar, \
+                _parsear_en_paralelo(json_files, workers, ordenado, self.parser) as resultados:
+            for i, resultado in enumerate(resultados, 1):
+                self.procesar_resultado(resultado, graph_name)
                 pbar.update(1)
 
+                if self.modo_bulk and i % self.config.parse_batch_size == 0:
+                    self.volcar_lote(graph_name)
+
                 # Actualizar descripción con stats en tiempo real
                 pbar.set_postfix({
                     "Personas": self.stats["personas_insertadas"],
@@ -441,6 +624,15 @@ class GraphBuilder:
                     "Rels": self.stats["relaciones_insertadas"]
                 })
 
+            if self.modo_bulk:
+                self.volcar_lote(graph_name)
+                pbar.set_postfix({
+                    "Personas": self.stats["personas_insertadas"],
+                    "Orgs": self.stats["organizaciones_insertadas"],
+                    "Lugares": self.stats["lugares_insertados"],
+                    "Rels": self.stats["relaciones_insertadas"]
+                })
+
         self.stats["tiempo_total"] = time.time() - start_time
 
         # Obtener estadísticas finales del grafo
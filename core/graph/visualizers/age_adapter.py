@@ -65,7 +65,7 @@ class AGEGraphAdapter:
             config: Configuración del grafo AGE
         """
         self.config = config or GraphConfig()
-        self.connector = AGEConnector(self.config)
+        self.connector = AGEConnector(self.config, read_only=True)
 
         # Mapeo de tipos a niveles Z
         self.type_to_level = {
@@ -618,9 +618,11 @@ class AGEGraphAdapter:
         # Agregar path del proyecto para imports
         sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
         from core.consultas import get_db_connection
+        from core.name_index import obtener_name_index
 
         conn = get_db_connection()
         cur = conn.cursor()
+        indice_nombres = obtener_name_index()
 
         nodes = {}
         edges = []
@@ -632,10 +634,11 @@ class AGEGraphAdapter:
             # EXCLUIR instituciones estatales que aparecen como victimarios (son investigadores, no perpetradores)
 
             # Construir parámetros para la query
-            nombre_pattern = f'%{nombre}%'
+            nombre_pattern = indice_nombres.patron(nombre)
 
             # Usar query parametrizada simple (evitar % dentro de strings SQL)
-            sql_query = """
+            # Filtro por nombre servido por los índices trigram de NameIndex
+            sql_query = f"""
                 SELECT
                     r.entidad_origen,
                     r.entidad_destino,
@@ -643,8 +646,8 @@ class AGEGraphAdapter:
                     r.confianza,
                     COUNT(DISTINCT r.documento_id) as num_documentos
                 FROM relaciones_extraidas r
-                WHERE (LOWER(r.entidad_origen) LIKE LOWER(%s)
-                       OR LOWER(r.entidad_destino) LIKE LOWER(%s))
+                WHERE ({indice_nombres.condicion('r.entidad_origen')}
+                       OR {indice_nombres.condicion('r.entidad_destino')})
                   AND r.confianza >= 0.6
                   AND r.metodo_extraccion = 'gpt4_from_analisis'
                   AND NOT (r.tipo_relacion = 'victima_de' AND (
@@ -764,8 +767,9 @@ class AGEGraphAdapter:
         """
         Búsqueda RÁPIDA usando consulta directa a PostgreSQL.
 
-        Busca co-ocurrencias directamente en la tabla personas (sin filtro de mínimo documentos).
-        Mucho más rápido que buscar en AGE.
+        Lee la vecindad de co-ocurrencia precalculada en mv_personas_coocurrencia
+        (índice trigram sobre persona_a) con una sola consulta para todos los
+        nombres. Si la vista no existe, recurre al self-join sobre personas.
 
         Args:
             nombres: Lista de nombres a buscar
@@ -783,57 +787,77 @@ class AGEGraphAdapter:
         nodes = {}
         edges = []
 
-        # Buscar co-ocurrencias DIRECTAMENTE (sin filtro de mínimo 3 docs)
-        for nombre in nombres:
-            # Obtener personas que co-ocurren con el nombre buscado
-            cur.execute("""
-                SELECT
-                    p1.nombre as entidad_1,
-                    p2.nombre as entidad_2,
-                    p1.tipo as tipo_1,
-                    p2.tipo as tipo_2,
-                    COUNT(DISTINCT p1.documento_id) as fuerza_conexion
-                FROM personas p1
-                JOIN personas p2 ON p1.documento_id = p2.documento_id
-                WHERE p1.nombre != p2.nombre
-                  AND LOWER(p1.nombre) LIKE LOWER(%s)
-                GROUP BY p1.nombre, p2.nombre, p1.tipo, p2.tipo
-                ORDER BY fuerza_conexion DESC
-                LIMIT %s
-            """, (f'%{nombre}%', max_nodes))
+        patrones = [f'%{nombre.lower()}%' for nombre in nombres]
 
-            for row in cur.fetchall():
-                entidad_1, entidad_2, tipo_1, tipo_2, fuerza = row
-
-                # Agregar nodos
-                if entidad_1 not in nodes:
-                    nodes[entidad_1] = {
-                        'id': f"pg_{hash(entidad_1) % 1000000}",
-                        'name': entidad_1,
-                        'type': tipo_1 or 'persona',
-                        'level': 0,
-                        'size': 1.0,
-                        'weight': float(fuerza)
-                    }
+        try:
+            # Una sola consulta: LIMIT por nombre con LATERAL sobre la matriz
+            cur.execute("""
+                SELECT c.persona_a, c.persona_b, c.tipo_a, c.tipo_b, c.n_docs
+                FROM unnest(%s::text[]) WITH ORDINALITY AS q(patron, orden)
+                CROSS JOIN LATERAL (
+                    SELECT persona_a, persona_b, tipo_a, tipo_b, n_docs
+                    FROM mv_personas_coocurrencia
+                    WHERE LOWER(persona_a) LIKE q.patron
+                    ORDER BY n_docs DESC
+                    LIMIT %s
+                ) c
+                ORDER BY q.orden, c.n_docs DESC
+            """, (patrones, max_nodes))
+            filas = cur.fetchall()
+        except psycopg2.ProgrammingError:
+            # Vista aún no creada: co-ocurrencias con self-join por cada nombre
+            conn.rollback()
+            filas = []
+            for patron in patrones:
+                cur.execute("""
+                    SELECT
+                        p1.nombre as entidad_1,
+                        p2.nombre as entidad_2,
+                        p1.tipo as tipo_1,
+                        p2.tipo as tipo_2,
+                        COUNT(DISTINCT p1.documento_id) as fuerza_conexion
+                    FROM personas p1
+                    JOIN personas p2 ON p1.documento_id = p2.documento_id
+                    WHERE p1.nombre != p2.nombre
+                      AND LOWER(p1.nombre) LIKE %s
+                    GROUP BY p1.nombre, p2.nombre, p1.tipo, p2.tipo
+                    ORDER BY fuerza_conexion DESC
+                    LIMIT %s
+                """, (patron, max_nodes))
+                filas.extend(cur.fetchall())
+
+        for row in filas:
+            entidad_1, entidad_2, tipo_1, tipo_2, fuerza = row
+
+            # Agregar nodos
+            if entidad_1 not in nodes:
+                nodes[entidad_1] = {
+                    'id': f"pg_{hash(entidad_1) % 1000000}",
+                    'name': entidad_1,
+                    'type': tipo_1 or 'persona',
+                    'level': 0,
+                    'size': 1.0,
+                    'weight': float(fuerza)
+                }
 
-                if entidad_2 not in nodes:
-                    nodes[entidad_2] = {
-                        'id': f"pg_{hash(entidad_2) % 1000000}",
-                        'name': entidad_2,
-                        'type': tipo_2 or 'persona',
-                        'level': 1,
-                        'size': 1.0,
-                        'weight': float(fuerza)
-                    }
+            if entidad_2 not in nodes:
+                nodes[entidad_2] = {
+                    'id': f"pg_{hash(entidad_2) % 1000000}",
+                    'name': entidad_2,
+                    'type': tipo_2 or 'persona',
+                    'level': 1,
+                    'size': 1.0,
+                    'weight': float(fuerza)
+                }
 
-                # Agregar edge
-                edges.append({
-                    'source': nodes[entidad_1]['id'],
-                    'target': nodes[entidad_2]['id'],
-                    'type': 'CO_OCURRE_CON',
-                    'weight': float(fuerza),
-                    'label': f"{int(fuerza)} docs"
-                })
+            # Agregar edge
+            edges.append({
+                'source': nodes[entidad_1]['id'],
+                'target': nodes[entidad_2]['id'],
+                'type': 'CO_OCURRE_CON',
+                'weight': float(fuerza),
+                'label': f"{int(fuerza)} docs"
+            })
 
         cur.close()
         conn.close()
@@ -0,0 +1,227 @@
+"""
+Resolución de nombres de personas con índices trigram.
+
+Las búsquedas por nombre usaban ``unaccent(LOWER(col)) LIKE unaccent(LOWER('%x%'))``,
+filtro que ningún índice puede servir: cada búsqueda recorría ``personas`` o
+``relaciones_extraidas`` completas. Este módulo centraliza la expresión de
+búsqueda para que coincida con los índices GIN ``gin_trgm_ops`` creados en
+``sql/validated/consultas_busqueda_frecuentes.sql`` sobre la función IMMUTABLE
+``normalizar_nombre(text)``.
+
+Uso:
+
+    from core.name_index import obtener_name_index
+
+    idx = obtener_name_index()
+    cur.execute(f"SELECT COUNT(*) FROM personas p WHERE {idx.condicion('p.nombre')}",
+                (idx.patron('guzman'),))
+
+    idx.resolver('ana matilde guzman')
+    # [('Ana Matilde Guzmán', 1.0), ('Matilde Guzmán', 0.82), ...]
+
+    idx.nombre_canonico('ana matilde guzmna')  # errores de escritura
+    # 'Ana Matilde Guzmán'
+
+Si el esquema aún no tiene ``normalizar_nombre`` (script SQL no aplicado), las
+condiciones caen a la expresión ``unaccent(LOWER(...))`` original.
+"""
+
+import threading
+import time
+import unicodedata
+from typing import List, Optional, Tuple
+
+import psycopg2
+
+from core.db_pool import conexion_bd
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """
+    Equivalente Python de la función SQL ``normalizar_nombre``.
+    'Ana Matilde Guzmán' -> 'ana matilde guzman'
+    """
+    nombre = (nombre or '').lower()
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', nombre)
+        if unicodedata.category(c) != 'Mn'
+    )
+
+
+class NameIndex:
+    """
+    Servicio de resolución de nombres sobre ``mv_nombres_personas``.
+
+    Args:
+        umbral: Similitud trigram mínima para aceptar un candidato aproximado
+        ttl_esquema: Segundos durante los que se cachea la detección del esquema
+    """
+
+    def __init__(self, umbral: float = 0.3, ttl_esquema: float = 300.0):
+        self.umbral = umbral
+        self.ttl_esquema = ttl_esquema
+        self._lock = threading.Lock()
+        self._funcion = False
+        self._vista = False
+        self._verificado = 0.0
+
+    # --- Detección de esquema ---
+
+    def _verificar_esquema(self):
+        ahora = time.monotonic()
+        if self._verificado and ahora - self._verificado < self.ttl_esquema:
+            return
+        with self._lock:
+            if self._verificado and ahora - self._verificado < self.ttl_esquema:
+                return
+            try:
+                with conexion_bd() as conn:
+                    cur = conn.cursor()
+                    cur.execute("""
+                        SELECT to_regprocedure('normalizar_nombre(text)') IS NOT NULL,
+                               to_regclass('mv_nombres_personas') IS NOT NULL
+                    """)
+                    self._funcion, self._vista = cur.fetchone()
+                    cur.close()
+            except psycopg2.Error as e:
+                print(f"⚠️ NameIndex: no se pudo verificar el esquema: {e}")
+                self._funcion, self._vista = False, False
+            self._verificado = ahora
+
+    @property
+    def indexado(self) -> bool:
+        """True si existe ``normalizar_nombre`` (y por tanto sus índices trigram)."""
+        self._verificar_esquema()
+        return self._funcion
+
+    # --- Fragmentos SQL ---
+
+    def expresion(self, columna: str) -> str:
+        """Forma normalizada de una columna o parámetro, igual a la indexada."""
+        if self.indexado:
+            return f"normalizar_nombre({columna})"
+        return f"unaccent(LOWER({columna}))"
+
+    def condicion(self, columna: str) -> str:
+        """
+        Filtro ``LIKE`` insensible a mayúsculas y tildes para usar con ``patron()``.
+        Consume un único parámetro ``%s``.
+        """
+        return f"{self.expresion(columna)} LIKE {self.expresion('%s')}"
+
+    @staticmethod
+    def patron(nombre: str) -> str:
+        """Patrón de subcadena para ``condicion()``."""
+        return f'%{nombre}%'
+
+    # --- Resolución ---
+
+    def resolver(
+        self,
+        consulta: str,
+        tipo: Optional[str] = None,
+        limite: int = 10,
+        conn=None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Resuelve una consulta a nombres canónicos candidatos con su puntaje.
+
+        Combina coincidencia por subcadena (puntaje 1.0 si es exacta) y
+        similitud trigram para variantes con errores de escritura.
+
+        Args:
+            consulta: Nombre tal como lo escribió el usuario
+            tipo: Filtro opcional sobre el tipo de persona (p. ej. 'victim')
+            limite: Máximo de candidatos
+            conn: Conexión opcional; si no se pasa se toma una del pool
+
+        Returns:
+            Lista de tuplas (nombre, puntaje) ordenada por puntaje descendente
+        """
+        consulta_norm = normalizar_nombre(consulta).strip()
+        if not consulta_norm:
+            return []
+
+        if conn is None:
+            with conexion_bd() as conn:
+                return self._resolver(conn, consulta_norm, tipo, limite)
+        return self._resolver(conn, consulta_norm, tipo, limite)
+
+    def _resolver(self, conn, consulta_norm: str, tipo: Optional[str], limite: int):
+        self._verificar_esquema()
+        cur = conn.cursor()
+        filtro_tipo = "AND tipo ILIKE %s" if tipo else ""
+        params_tipo = [f'%{tipo}%'] if tipo else []
+
+        if self._vista:
+            cur.execute("SELECT set_limit(%s)", (self.umbral,))
+            cur.execute(f"""
+                SELECT nombre,
+                       CASE WHEN nombre_norm = %s THEN 1.0
+                            ELSE GREATEST(similarity(nombre_norm, %s),
+                                          word_similarity(%s, nombre_norm))
+                       END as puntaje
+                FROM mv_nombres_personas
+                WHERE (nombre_norm LIKE %s OR nombre_norm %% %s)
+                  {filtro_tipo}
+                GROUP BY nombre, nombre_norm
+                ORDER BY puntaje DESC, SUM(menciones) DESC
+                LIMIT %s
+            """, [consulta_norm] * 3 + [self.patron(consulta_norm), consulta_norm]
+                + params_tipo + [limite])
+        else:
+            # Sin vista: subcadena sobre personas (servida por el índice si existe)
+            cur.execute(f"""
+                SELECT nombre,
+                       CASE WHEN {self.expresion('nombre')} = %s THEN 1.0 ELSE 0.5 END as puntaje
+                FROM personas
+                WHERE {self.condicion('nombre')}
+                  {filtro_tipo}
+                GROUP BY nombre
+                ORDER BY puntaje DESC, COUNT(*) DESC
+                LIMIT %s
+            """, [consulta_norm, self.patron(consulta_norm)] + params_tipo + [limite])
+
+        candidatos = [(nombre, float(puntaje)) for nombre, puntaje in cur.fetchall()]
+        cur.close()
+        return candidatos
+
+    def nombre_canonico(self, consulta: str, tipo: Optional[str] = None) -> str:
+        """
+        Nombre con el que filtrar una búsqueda de persona.
+
+        Si algún candidato contiene la consulta se mantiene la consulta (el
+        filtro por subcadena ya lo encuentra, con todas sus variantes); si no,
+        p. ej. por errores de escritura, se usa el mejor candidato de
+        ``resolver()`` cuyo puntaje alcance el umbral. Ante un error de BD se
+        devuelve la consulta sin cambios.
+        """
+        try:
+            candidatos = self.resolver(consulta, tipo, limite=5)
+        except psycopg2.Error as e:
+            print(f"⚠️ NameIndex: no se pudo resolver '{consulta}': {e}")
+            return consulta
+        return self._elegir(consulta, candidatos)
+
+    def _elegir(self, consulta: str, candidatos: List[Tuple[str, float]]) -> str:
+        consulta_norm = normalizar_nombre(consulta).strip()
+        if not candidatos or any(consulta_norm in normalizar_nombre(nombre) for nombre, _ in candidatos):
+            return consulta
+        nombre, puntaje = candidatos[0]
+        return nombre if puntaje >= self.umbral else consulta
+
+
+# --- Instancia global del proceso ---
+
+_name_index: Optional[NameIndex] = None
+_name_index_lock = threading.Lock()
+
+
+def obtener_name_index() -> NameIndex:
+    """Retorna el NameIndex global, creándolo en el primer uso."""
+    global _name_index
+    if _name_index is None:
+        with _name_index_lock:
+            if _name_index is None:
+                _name_index = NameIndex()
+    return _name_index
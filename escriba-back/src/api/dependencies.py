@@ -15,6 +15,7 @@ sys.path.insert(0, str(proyecto_root))
 
 # Importar la función de conexión desde el MONOLITO (core/consultas.py)
 from core.consultas import get_db_connection as core_get_db_connection
+from core.db_pool import conexion_bd, cerrar_pool
 
 
 # TODO: Implementar autenticación real
@@ -33,6 +34,7 @@ def get_db_connection():
     """
     Obtener conexión a la base de datos PostgreSQL
     Usa la función del core para consistencia con app_dash.py
+    (prestada del pool compartido; conn.close() la devuelve al pool)
     """
     return core_get_db_connection()
 
@@ -41,10 +43,12 @@ def get_db_connection():
 def get_db():
     """
     Dependency de FastAPI para obtener conexión a BD
-    Se cierra automáticamente después de la request
+    Se devuelve al pool automáticamente después de la request
     """
-    conn = get_db_connection()
-    try:
+    with conexion_bd() as conn:
         yield conn
-    finally:
-        conn.close()
+
+
+def shutdown_db_pool():
+    """Cerrar las conexiones del pool al apagar la API"""
+    cerrar_pool()
@@ -13,6 +13,7 @@ env_path = Path(__file__).parent.parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 from src.api.routes import consultas
+from src.api.dependencies import shutdown_db_pool
 
 # Versión de la API
 API_VERSION = "1.0.0"
@@ -38,6 +39,11 @@ app.add_middleware(
 # Incluir routers
 app.include_router(consultas.router, prefix="/api/v1", tags=["consultas"])
 
+# Liberar conexiones del pool al apagar
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_db_pool()
+
 # Health check
 @app.get("/")
 async def root():
@@ -29,6 +29,7 @@ class VictimasResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = Field(None, description="Cursor opaco para la página siguiente")
 
 
 # ==================== MODELOS DE DOCUMENTOS ====================
@@ -3,8 +3,13 @@ Endpoints de consultas - Conectados con lógica real
 """
 import sys
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
+import json
+import queue
+import threading
 import time
 import asyncio
 
@@ -28,15 +33,10 @@ from core.consultas import (
     ejecutar_consulta_geografica_directa,  # Función directa que bypasea agentes
     ejecutar_consulta_rag_inteligente,
     ejecutar_consulta_hibrida,
-    obtener_victimas_paginadas,
+    obtener_pagina_victimas,
     obtener_detalle_victima,
     obtener_metadatos_documento,
-    obtener_opciones_nuc,
-    obtener_opciones_departamento,
-    obtener_opciones_municipio,
-    obtener_opciones_tipo_documento,
-    obtener_opciones_despacho,
-    obtener_rango_fechas,
+    obtener_snapshot_opciones,
     clasificar_consulta
 )
 
@@ -48,13 +48,15 @@ router = APIRouter()
 @router.get("/victimas", response_model=VictimasResponse, tags=["victimas"])
 async def listar_victimas(
     page: int = 1,
-    page_size: int = 20
+    page_size: int = 20,
+    cursor: Optional[str] = None
 ):
     """
     Listar víctimas con paginación
 
     - **page**: Número de página (default: 1)
     - **page_size**: Tamaño de página (default: 20, max: 100)
+    - **cursor**: Cursor opaco (`next_cursor` de la respuesta anterior); si se envía, prevalece sobre `page`
     """
     try:
         # Validar parámetros
@@ -64,7 +66,11 @@ async def listar_victimas(
             raise HTTPException(status_code=400, detail="page_size debe estar entre 1 y 100")
 
         # Obtener víctimas paginadas
-        victimas_data, total = obtener_victimas_paginadas(page, page_size)
+        try:
+            pagina = obtener_pagina_victimas(page, page_size, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        victimas_data, total = pagina["victimas"], pagina["total"]
 
         # Convertir a modelos Pydantic
         victimas = [Victima(**v) for v in victimas_data]
@@ -75,9 +81,10 @@ async def listar_victimas(
         return VictimasResponse(
             victimas=victimas,
             total=total,
-            page=page,
+            page=pagina["page"],
             page_size=page_size,
-            total_pages=total_pages
+            total_pages=total_pages,
+            next_cursor=pagina["siguiente_cursor"]
         )
 
     except HTTPException:
@@ -239,6 +246,72 @@ def consulta_rag(request: ConsultaRAGRequest):
         raise HTTPException(status_code=500, detail=f"Error en consulta RAG: {str(e)}")
 
 
+def _evento_sse(evento: str, datos) -> str:
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/consultas/rag/stream", tags=["consultas"])
+def consulta_rag_stream(request: ConsultaRAGRequest):
+    """
+    Ejecutar consulta RAG en streaming (text/event-stream)
+
+    Emite `fuentes` en cuanto termina la búsqueda en Azure Search, luego
+    `token` con cada fragmento de la respuesta de GPT y finalmente `fin` con
+    la misma estructura que POST /consultas/rag. Si el cliente se desconecta
+    el hilo deja de generar.
+    """
+    eventos: queue.Queue = queue.Queue()
+    cancelado = threading.Event()
+    tiempo_inicio = time.time()
+
+    def ejecutar():
+        try:
+            resultado = ejecutar_consulta_rag_inteligente(
+                consulta=request.consulta,
+                contexto_conversacional=request.contexto_conversacional,
+                al_fuentes=lambda fuentes: eventos.put(('fuentes', fuentes)),
+                al_token=lambda texto: eventos.put(('token', texto)),
+                cancelado=cancelado
+            )
+            eventos.put(('fin', {
+                "tipo": "rag",
+                "respuesta": resultado.get("respuesta", ""),
+                "fuentes": resultado.get("fuentes", []),
+                "confianza": resultado.get("confianza"),
+                "tiempo_ms": int((time.time() - tiempo_inicio) * 1000),
+                "metadata": {
+                    "consulta_original": request.consulta,
+                    "modelo": "gpt-4o-mini",
+                    "top_k": request.top_k
+                }
+            }))
+        except Exception as e:
+            eventos.put(('error', {"detail": f"Error en consulta RAG: {str(e)}"}))
+        finally:
+            eventos.put(None)
+
+    threading.Thread(target=ejecutar, name="rag-stream", daemon=True).start()
+
+    async def generar():
+        try:
+            while True:
+                # get() bloquea: en el threadpool, para que la desconexión cancele la espera
+                item = await run_in_threadpool(eventos.get)
+                if item is None:
+                    return
+                yield _evento_sse(*item)
+        finally:
+            # Fin normal, GeneratorExit o cancelación por desconexión del cliente
+            cancelado.set()
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/consultas/hibrida", response_model=ConsultaHibridaResponse, tags=["consultas"])
 def consulta_hibrida(request: ConsultaHibridaRequest):
     """
@@ -315,31 +388,24 @@ async def clasificar_tipo_consulta(consulta: str):
 # ==================== ENDPOINTS DE OPCIONES/FILTROS ====================
 
 @router.get("/opciones/filtros", response_model=OpcionesFiltrosResponse, tags=["opciones"])
-async def obtener_opciones():
+async def obtener_opciones(request: Request, response: Response):
     """
     Obtener todas las opciones disponibles para filtros
 
-    Útil para poblar dropdowns en el frontend.
+    Útil para poblar dropdowns en el frontend. Se sirve desde un snapshot
+    en memoria (mv_opciones_filtros); responde 304 si el cliente envía
+    `If-None-Match` con el ETag vigente.
     """
     try:
-        nucs = obtener_opciones_nuc()
-        departamentos = obtener_opciones_departamento()
-        municipios = obtener_opciones_municipio()
-        tipos_documento = obtener_opciones_tipo_documento()
-        despachos = obtener_opciones_despacho()
-        fecha_min, fecha_max = obtener_rango_fechas()
-
-        return OpcionesFiltrosResponse(
-            nucs=nucs,
-            departamentos=departamentos,
-            municipios=municipios,
-            tipos_documento=tipos_documento,
-            despachos=despachos,
-            rango_fechas={
-                "min": fecha_min,
-                "max": fecha_max
-            }
-        )
+        opciones, etag = obtener_snapshot_opciones()
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [e.strip() for e in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        return OpcionesFiltrosResponse(**opciones)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo opciones: {str(e)}")
@@ -359,6 +425,7 @@ async def consultas_health():
             "GET /documentos/{archivo}/metadatos",
             "POST /consultas/bd",
             "POST /consultas/rag",
+            "POST /consultas/rag/stream",
             "POST /consultas/hibrida",
             "POST /consultas/clasificar",
             "GET /opciones/filtros"
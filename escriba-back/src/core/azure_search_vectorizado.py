@@ -10,9 +10,17 @@ import httpx
 from typing import List, Dict, Optional
 from dataclasses import dataclass
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.search.documents.models import VectorizedQuery
 from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
+
+try:
+    from .servicio_embeddings import obtener_servicio_embeddings
+    from .registro_clientes import ClientesPorLoop
+except ImportError:
+    from servicio_embeddings import obtener_servicio_embeddings
+    from registro_clientes import ClientesPorLoop
 
 @dataclass
 class DocumentoCompleto:
@@ -79,21 +87,81 @@ class AzureSearchVectorizado:
         self.search_client = self.search_client_chunks
         self.index_name = self.index_chunks
         
+        # Clientes asíncronos (métodos async): uno por event loop, creados al
+        # primer uso en él, porque sus sesiones HTTP quedan ligadas al loop
+        self._clientes_aio = ClientesPorLoop(self._crear_clientes_aio, self._cerrar_clientes_aio,
+                                             nombre='clientes aio de Azure Search')
+        
         logging.info(f"Azure Search inicializado: {self.search_endpoint}")
         logging.info(f"Índice chunks: {self.index_chunks}")
         logging.info(f"Índice documentos: {self.index_documentos}")
     
+    def _crear_clientes_aio(self) -> Dict:
+        return {
+            "openai": AsyncAzureOpenAI(
+                api_key=os.getenv('AZURE_OPENAI_API_KEY'),
+                api_version=os.getenv('AZURE_OPENAI_API_VERSION', '2024-12-01-preview'),
+                azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
+                http_client=httpx.AsyncClient()
+            ),
+            "chunks": AsyncSearchClient(
+                endpoint=self.search_endpoint,
+                index_name=self.index_chunks,
+                credential=AzureKeyCredential(self.search_key)
+            ),
+            "documentos": AsyncSearchClient(
+                endpoint=self.search_endpoint,
+                index_name=self.index_documentos,
+                credential=AzureKeyCredential(self.search_key)
+            ),
+        }
+
+    @staticmethod
+    async def _cerrar_clientes_aio(clientes: Dict):
+        for nombre in ("chunks", "documentos"):
+            try:
+                await clientes[nombre].close()
+            except Exception as e:
+                logging.warning(f"Error cerrando cliente Azure Search {nombre}: {e}")
+        try:
+            await clientes["openai"].close()
+        except Exception as e:
+            logging.warning(f"Error cerrando cliente Azure OpenAI: {e}")
+
+    def _clientes_async(self) -> Dict:
+        """Clientes aio (OpenAI + Search) del event loop actual"""
+        return self._clientes_aio.obtener()
+    
+    def cliente_openai_async(self) -> AsyncAzureOpenAI:
+        """Cliente AsyncAzureOpenAI del event loop actual"""
+        return self._clientes_async()["openai"]
+    
+    async def cerrar(self):
+        """Cierra las sesiones HTTP de los clientes asíncronos (de todos los event loops vivos)"""
+        await self._clientes_aio.cerrar()
+    
+    def cerrar_sincrono(self):
+        """Cierra los clientes síncronos (SearchClient + AzureOpenAI)"""
+        for cliente in (self.search_client_chunks, self.search_client_documentos, self.openai_client):
+            try:
+                cliente.close()
+            except Exception as e:
+                logging.warning(f"Error cerrando cliente síncrono: {e}")
+    
     async def generar_embedding(self, texto: str) -> List[float]:
         """Genera embedding para un texto usando Azure OpenAI"""
         try:
-            response = self.openai_client.embeddings.create(
-                input=texto,
-                model="text-embedding-ada-002"  # Modelo de embeddings
-            )
-            return response.data[0].embedding
+            return await obtener_servicio_embeddings().embedding_async(texto, self._llamar_embeddings)
         except Exception as e:
             logging.error(f"Error generando embedding: {e}")
             raise
+
+    async def _llamar_embeddings(self, textos: List[str]) -> List[List[float]]:
+        response = await self.cliente_openai_async().embeddings.create(
+            input=textos,
+            model="text-embedding-ada-002"  # Modelo de embeddings
+        )
+        return [d.embedding for d in response.data]
     
     async def buscar_semanticamente(self, pregunta: str, top_k: int = 10) -> List[DocumentoChunk]:
         """Realiza búsqueda semántica usando embeddings"""
@@ -109,7 +177,7 @@ class AzureSearchVectorizado:
             )
             
             # Ejecutar búsqueda
-            results = self.search_client.search(
+            results = await self._clientes_async()["chunks"].search(
                 search_text=pregunta,
                 vector_queries=[vector_query],
                 select=[
@@ -121,7 +189,7 @@ class AzureSearchVectorizado:
             
             # Procesar resultados
             chunks = []
-            for result in results:
+            async for result in results:
                 chunk = DocumentoChunk(
                     id=result.get("chunk_id", ""),
                     expediente_nuc=result.get("nuc", ""),
@@ -175,7 +243,7 @@ class AzureSearchVectorizado:
                     filter_expression = " and ".join(filter_parts)
             
             # Ejecutar búsqueda híbrida
-            results = self.search_client.search(
+            results = await self._clientes_async()["chunks"].search(
                 search_text=pregunta,
                 vector_queries=[vector_query],
                 filter=filter_expression,
@@ -189,7 +257,7 @@ class AzureSearchVectorizado:
             
             # Procesar resultados
             chunks = []
-            for result in results:
+            async for result in results:
                 # Debug: imprimir campos disponibles en el primer resultado
                 if len(chunks) == 0:
                     logging.info(f"Campos disponibles en Azure Search: {list(result.keys())}")
@@ -263,7 +331,7 @@ INSTRUCCIONES:
 RESPUESTA:
 """
 
-            response = self.openai_client.chat.completions.create(
+            response = await self.cliente_openai_async().chat.completions.create(
                 model=os.getenv('AZURE_OPENAI_DEPLOYMENT', 'gpt-4'),
                 messages=[
                     {"role": "system", "content": "Eres un experto analista jurídico especializado en documentos de crímenes de lesa humanidad."},
@@ -285,11 +353,7 @@ RESPUESTA:
         """Busca en el índice de documentos completos para obtener metadatos de filtrado"""
         try:
             # Generar embedding para la pregunta
-            embedding_response = self.openai_client.embeddings.create(
-                input=pregunta,
-                model="text-embedding-ada-002"
-            )
-            embedding = embedding_response.data[0].embedding
+            embedding = await self.generar_embedding(pregunta)
             
             # Configurar consulta vectorial
             vector_query = VectorizedQuery(
@@ -319,7 +383,7 @@ RESPUESTA:
                     filter_expression = " and ".join(filter_parts)
             
             # Ejecutar búsqueda en índice de documentos completos
-            results = self.search_client_documentos.search(
+            results = await self._clientes_async()["documentos"].search(
                 search_text=pregunta,
                 vector_queries=[vector_query],
                 filter=filter_expression,
@@ -334,7 +398,7 @@ RESPUESTA:
             
             # Procesar resultados
             documentos = []
-            for result in results:
+            async for result in results:
                 # Debug: imprimir campos disponibles en el primer resultado
                 if len(documentos) == 0:
                     logging.info(f"Campos disponibles en exhaustive-legal-index: {list(result.keys())}")
@@ -460,6 +524,8 @@ async def test_azure_search():
         print(respuesta)
         print("-" * 80)
         
+        await azure_search.cerrar()
+        
     except Exception as e:
         print(f"❌ Error en prueba: {e}")
         import traceback
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Cache semántico de respuestas RAG (preguntas parafraseadas)
+
+rag_cache solo acierta con el hash exacto de la pregunta normalizada, así que
+"¿quién es Oswaldo Olivo?" y "qué sabes de Oswaldo Olivo" pagaban cada una
+Azure Search + GPT. Este cache guarda el embedding de la pregunta junto a la
+respuesta (columna rag_cache.pregunta_embedding) y mantiene en memoria una
+matriz numpy normalizada con esos embeddings: una búsqueda es un producto
+punto contra todas las filas y acierta si la similitud coseno supera el
+umbral.
+
+Preguntas de plantilla sobre personas distintas ("¿quién es Oswaldo Olivo?"
+/ "¿quién es Rosa Edith Sierra?") tienen embeddings casi idénticos, así que
+además del umbral se exige que coincidan sus términos distintivos: las
+palabras de la pregunta normalizada que no son de plantilla (nombres,
+lugares, números, NUC).
+
+- Las entradas expiran con rag_cache.expires_at y, como máximo, tras
+  RAG_CACHE_SEMANTICO_TTL segundos en memoria.
+- Se vacía cuando se invalida el cache de respuestas (invalidar_cache_rag()
+  tras cada ingesta); ver CacheRespuestas.al_invalidar.
+- Si la columna pregunta_embedding no existe (script SQL no aplicado) el
+  cache queda deshabilitado.
+
+Variables de entorno:
+    RAG_CACHE_SEMANTICO_UMBRAL  Similitud coseno mínima (default 0.97)
+    RAG_CACHE_SEMANTICO_MAX     Entradas máximas en memoria (default 5000)
+    RAG_CACHE_SEMANTICO_TTL     Segundos máximos en memoria (default 3600)
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+import psycopg2
+import psycopg2.extras
+
+try:
+    from .cache_respuestas import normalizar_pregunta
+except ImportError:
+    from cache_respuestas import normalizar_pregunta
+
+logger = logging.getLogger(__name__)
+
+# Palabras de plantilla (ya normalizadas: minúsculas, sin tildes). Todo lo
+# demás cuenta como término distintivo y debe coincidir para acertar.
+_PALABRAS_PLANTILLA = frozenset("""
+    a al algo algun alguna algunas alguno algunos ante como con contra cual cuales
+    cuando cuanta cuantas cuanto cuantos de del desde donde dos durante e el ella
+    ellas ellos en entre es esa esas ese eso esos esta estaba estan estas este
+    esto estos fue fueron ha han hay hubo la las le les lo los mas me mi mis muy
+    ni no nos o otra otras otro otros para pero por porque que quien quienes se
+    sea ser si sin sobre son su sus tambien te tiene tienen tu tus u un una unas
+    uno unos y ya yo
+    sabes sabe saber conoces conoce conocer dime dame decir di cuentame cuenta
+    explica explicame describe describeme muestra muestrame informacion info datos
+    dato detalle detalles relacion relaciones relacionado relacionada
+    relacionados relacionadas papel rol participacion vinculo vinculos persona
+    personas quisiera quiero necesito puedes podrias favor hola buscar busca
+    encuentra encontrar mencion menciones mencionado mencionada aparece aparecen
+    documento documentos caso casos respecto acerca hizo hace hacia paso
+""".split())
+
+
+def terminos_distintivos(pregunta: str) -> FrozenSet[str]:
+    """
+    Términos de la pregunta que no son de plantilla (nombres, lugares,
+    números). 'qué sabes de Oswaldo Olivo' -> {'oswaldo', 'olivo'}
+    """
+    return frozenset(
+        palabra for palabra in normalizar_pregunta(pregunta).split()
+        if palabra not in _PALABRAS_PLANTILLA and (len(palabra) > 1 or palabra.isdigit())
+    )
+
+
+class CacheSemantico:
+    """Índice vectorial local sobre las preguntas cacheadas en rag_cache"""
+
+    def __init__(self, conectar: Callable[[], Any], umbral: Optional[float] = None,
+                 max_entradas: Optional[int] = None, ttl: Optional[float] = None):
+        self.conectar = conectar
+        self.umbral = umbral or float(os.getenv('RAG_CACHE_SEMANTICO_UMBRAL', '0.97'))
+        self.max_entradas = max_entradas or int(os.getenv('RAG_CACHE_SEMANTICO_MAX', '5000'))
+        self.ttl = ttl or float(os.getenv('RAG_CACHE_SEMANTICO_TTL', '3600'))
+
+        self._lock = threading.Lock()
+        self._matriz: Optional[np.ndarray] = None   # (n, dim) float32, filas normalizadas
+        self._entradas: List[Dict[str, Any]] = []   # alineadas con las filas de _matriz
+        self._cargado = False
+        self._habilitado = True
+        self.metricas = {'aciertos': 0, 'fallos': 0}
+
+    @contextmanager
+    def _conexion(self):
+        conn = self.conectar()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _normalizar(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(vector)
+        return vector / norma if norma > 0 else vector
+
+    # --- Carga ---
+
+    def _cargar(self):
+        """Carga desde rag_cache las preguntas vigentes con embedding"""
+        try:
+            with self._conexion() as conn:
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                    cur.execute("""
+                        SELECT pregunta_hash, pregunta_normalizada, pregunta_embedding,
+                               respuesta_cacheada, fuentes_cache,
+                               EXTRACT(EPOCH FROM expires_at - NOW()) as vigencia
+                        FROM rag_cache
+                        WHERE pregunta_embedding IS NOT NULL
+                          AND expires_at > NOW()
+                        ORDER BY ultima_utilizacion DESC
+                        LIMIT %s
+                    """, (self.max_entradas,))
+                    filas = cur.fetchall()
+        except psycopg2.ProgrammingError as e:
+            logger.warning(f"Cache semántico deshabilitado (¿falta rag_cache.pregunta_embedding?): {e}")
+            self._habilitado = False
+            return
+
+        ahora = time.monotonic()
+        entradas, vectores = [], []
+        for fila in reversed(filas):  # las más recientes al final, como en agregar()
+            vectores.append(self._normalizar(fila['pregunta_embedding']))
+            entradas.append({
+                'hash': fila['pregunta_hash'],
+                'terminos': terminos_distintivos(fila['pregunta_normalizada']),
+                'respuesta': fila['respuesta_cacheada'],
+                'fuentes': fila['fuentes_cache'],
+                'expira': ahora + min(self.ttl, float(fila['vigencia']))
+            })
+        self._entradas = entradas
+        self._matriz = np.vstack(vectores) if vectores else None
+        logger.info(f"Cache semántico cargado: {len(entradas)} preguntas")
+
+    # --- API ---
+
+    def buscar(self, embedding: List[float], pregunta: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Respuesta cacheada de la pregunta más parecida, si supera el umbral y
+        tiene los mismos términos distintivos que `pregunta`.
+        Puede leer rag_cache en la primera llamada (bloqueante).
+
+        Returns:
+            (entrada, similitud) o None
+        """
+        with self._lock:
+            if not self._cargado:
+                self._cargar()
+                self._cargado = True
+            if not self._habilitado or self._matriz is None:
+                self.metricas['fallos'] += 1
+                return None
+
+            similitudes = self._matriz @ self._normalizar(embedding)
+            terminos = terminos_distintivos(pregunta)
+            ahora = time.monotonic()
+            for i in np.argsort(similitudes)[::-1]:
+                if similitudes[i] < self.umbral:
+                    break
+                entrada = self._entradas[i]
+                if entrada['expira'] > ahora and entrada['terminos'] == terminos:
+                    self.metricas['aciertos'] += 1
+                    return entrada, float(similitudes[i])
+            self.metricas['fallos'] += 1
+            return None
+
+    def agregar(self, pregunta_hash: str, pregunta: str, embedding: List[float], respuesta: str, fuentes):
+        """
+        Guarda el embedding junto a la fila de rag_cache (que debe existir,
+        ver CacheRespuestas.guardar) y lo añade al índice en memoria.
+        """
+        if not self._habilitado:
+            return
+        try:
+            with self._conexion() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE rag_cache SET pregunta_embedding = %s
+                        WHERE pregunta_hash = %s
+                    """, (list(map(float, embedding)), pregunta_hash))
+        except psycopg2.ProgrammingError as e:
+            logger.warning(f"Cache semántico deshabilitado (¿falta rag_cache.pregunta_embedding?): {e}")
+            self._habilitado = False
+            return
+
+        vector = self._normalizar(embedding)
+        entrada = {'hash': pregunta_hash, 'terminos': terminos_distintivos(pregunta),
+                   'respuesta': respuesta, 'fuentes': fuentes, 'expira': time.monotonic() + self.ttl}
+        with self._lock:
+            if not self._cargado:
+                return  # La próxima búsqueda carga la fila desde la BD
+            ahora = time.monotonic()
+            vigentes = [i for i, e in enumerate(self._entradas)
+                        if e['expira'] > ahora and e['hash'] != pregunta_hash]
+            vigentes = vigentes[-(self.max_entradas - 1):] if self.max_entradas > 1 else []
+            self._entradas = [self._entradas[i] for i in vigentes] + [entrada]
+            previos = self._matriz[vigentes] if self._matriz is not None and vigentes else None
+            self._matriz = vector[None, :] if previos is None else np.vstack([previos, vector])
+
+    def limpiar(self):
+        """Vacía el índice en memoria; se recarga en la próxima búsqueda"""
+        with self._lock:
+            self._matriz = None
+            self._entradas = []
+            self._cargado = False
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Aciertos, fallos y tamaño del índice"""
+        with self._lock:
+            return dict(self.metricas, entradas=len(self._entradas), umbral=self.umbral,
+                        habilitado=self._habilitado)
+
+
+_cache_semantico: Optional[CacheSemantico] = None
+_cache_semantico_lock = threading.Lock()
+
+
+def obtener_cache_semantico(conectar: Callable[[], Any], cache_respuestas=None) -> CacheSemantico:
+    """
+    Cache semántico global del proceso. Si se pasa el CacheRespuestas, el
+    índice se vacía con cada invalidación de éste.
+    """
+    global _cache_semantico
+    if _cache_semantico is None:
+        with _cache_semantico_lock:
+            if _cache_semantico is None:
+                _cache_semantico = CacheSemantico(conectar)
+                if cache_respuestas is not None:
+                    cache_respuestas.al_invalidar(_cache_semantico.limpiar)
+    return _cache_semantico
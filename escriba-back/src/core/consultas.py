@@ -1,10 +1,16 @@
+import hashlib
+import json
 import os
+import threading
+import time
 import psycopg2
 import psycopg2.extras
 from typing import Dict, List, Optional, Tuple, Any, Union
 
 # Importar constantes centralizadas (sanitización v3.3)
 from config.constants import ENTIDADES_NO_PERSONAS, PALABRAS_ANALISIS
+from src.core.db_pool import conexion_bd, obtener_pool
+from src.core.name_index import obtener_name_index
 
 # --- Función auxiliar para aplicar filtro universal ---
 def aplicar_filtro_universal(entidades, externos):
@@ -21,16 +27,19 @@ def obtener_detalle_victima_completo(nombre):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
-    # Menciones: contar en personas (con búsqueda flexible)
-    cur.execute("""
+    # Menciones: contar en personas (búsqueda flexible servida por índice trigram)
+    nombres = obtener_name_index()
+    # Errores de escritura: se busca por el nombre canónico más parecido
+    patron_nombre = nombres.patron(nombres.nombre_canonico(nombre, tipo='victim'))
+    cur.execute(f"""
         SELECT COUNT(*) FROM personas
-        WHERE nombre ILIKE %s AND tipo ILIKE %s
-    """, (f'%{nombre}%', '%victim%'))
+        WHERE {nombres.condicion('nombre')} AND tipo ILIKE %s
+    """, (patron_nombre, '%victim%'))
     result = cur.fetchone()
     menciones = result[0] if result else 0
 
     # Documentos relacionados - CON TODOS LOS METADATOS NECESARIOS
-    cur.execute("""
+    cur.execute(f"""
         SELECT DISTINCT
             d.archivo,
             m.nuc,
@@ -59,10 +68,10 @@ def obtener_detalle_victima_completo(nombre):
         FROM personas p
         JOIN documentos d ON p.documento_id = d.id
         LEFT JOIN metadatos m ON d.id = m.documento_id
-        WHERE p.nombre ILIKE %s AND p.tipo ILIKE %s
+        WHERE {nombres.condicion('p.nombre')} AND p.tipo ILIKE %s
         ORDER BY m.fecha_creacion DESC NULLS LAST
         LIMIT 10
-    """, (f'%{nombre}%', '%victim%'))
+    """, (patron_nombre, '%victim%'))
 
     documentos = []
     for row in cur.fetchall():
@@ -152,20 +161,46 @@ def obtener_detalle_victima(nombre):
 
 # Configuración de conexión
 def get_db_connection():
-    conn = psycopg2.connect(
-        host=os.getenv('POSTGRES_HOST', 'localhost'),
-        port=os.getenv('POSTGRES_PORT', '5432'),
-        database=os.getenv('POSTGRES_DB', 'documentos_juridicos_gpt4'),
-        user=os.getenv('POSTGRES_USER', 'docs_user'),
-        password=os.getenv('POSTGRES_PASSWORD', 'docs_password_2025')
-    )
-    return conn
+    """
+    Presta una conexión del pool compartido del proceso (src.core.db_pool).
 
-# Paginación real para víctimas
-def obtener_victimas_paginadas(page=1, page_size=20):
-    conn = get_db_connection()
-    cur = conn.cursor()  # Cursor normal, no DictCursor
+    conn.close() la devuelve al pool. Para código nuevo preferir
+    ``with conexion_bd() as conn:``.
+    """
+    return obtener_pool().obtener()
+
+# --- Cursor opaco para paginación keyset de víctimas ---
+def codificar_cursor_victimas(menciones, nombre):
+    """Cursor opaco (base64 urlsafe) con la clave (menciones, nombre) de la última fila."""
+    import base64
+    crudo = json.dumps([int(menciones), nombre], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor_victimas(cursor):
+    """Inverso de codificar_cursor_victimas. Lanza ValueError si el cursor no es válido."""
+    import base64
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        menciones, nombre = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+        return int(menciones), str(nombre)
+    except Exception as e:
+        raise ValueError(f"cursor inválido: {cursor!r}") from e
+
+
+def obtener_pagina_victimas(page=1, page_size=20, cursor=None):
+    """
+    Página del listado de víctimas ordenado por menciones.
+
+    Lee mv_victimas_menciones: la página N es un rango sobre ``posicion`` y el
+    cursor continúa tras la clave (menciones, nombre) de la página anterior,
+    así que el costo por página no depende de su profundidad. El total sale
+    de la misma vista (se actualiza con refresh_all_mv tras cada ingesta).
+    Si la vista no existe se usa la consulta GROUP BY/OFFSET original.
 
+    Returns:
+        Dict con victimas, total, page y siguiente_cursor (None en la última página)
+    """
     # Validación robusta de parámetros
     try:
         page = int(page) if page is not None else 1
@@ -182,56 +217,110 @@ def obtener_victimas_paginadas(page=1, page_size=20):
     if page_size < 1:
         page_size = 20
 
-    # Inicializar total a 0 para asegurar que siempre esté definido
-    total = 0
+    clave = decodificar_cursor_victimas(cursor) if cursor else None
+
+    conn = get_db_connection()
+    cur = conn.cursor()  # Cursor normal, no DictCursor
 
-    # Consulta SOLO VÍCTIMAS - corregida
     try:
-        cur.execute("SELECT COUNT(*) FROM personas WHERE tipo ILIKE '%victim%' AND tipo NOT ILIKE '%victimario%';")
-        res = cur.fetchone()
-        total = res[0] if res and len(res) > 0 else 0
+        rows, total = _pagina_victimas_mv(cur, page, page_size, clave)
+        if rows:
+            page = (rows[0][2] - 1) // page_size + 1
+    except psycopg2.ProgrammingError:
+        # Vista aún no creada: consulta original sobre personas
+        conn.rollback()
+        try:
+            rows, total = _pagina_victimas_directa(cur, page, page_size, clave)
+        except Exception as e:
+            print(f"Error en main query: {e}")
+            import traceback
+            traceback.print_exc()
+            rows, total = [], 0
     except Exception as e:
-        print(f"Error en count query: {e}")
+        print(f"Error en main query: {e}")
+        rows, total = [], 0
+    finally:
         cur.close()
         conn.close()
+
+    victimas = [{"nombre": row[0], "menciones": row[1]} for row in rows if row and len(row) >= 2]
+    siguiente_cursor = None
+    if len(rows) == page_size:
+        siguiente_cursor = codificar_cursor_victimas(rows[-1][1], rows[-1][0])
+
+    return {
+        "victimas": victimas,
+        "total": total,
+        "page": page,
+        "siguiente_cursor": siguiente_cursor,
+    }
+
+
+def _pagina_victimas_mv(cur, page, page_size, clave):
+    cur.execute("SELECT COALESCE(MAX(posicion), 0) FROM mv_victimas_menciones")
+    total = cur.fetchone()[0]
+    if total == 0:
         return [], 0
 
+    if clave is not None:
+        cur.execute("""
+            SELECT nombre, menciones, posicion
+            FROM mv_victimas_menciones
+            WHERE (menciones, nombre) < (%(menciones)s, %(nombre)s)
+            ORDER BY menciones DESC, nombre DESC
+            LIMIT %(limit)s
+        """, {'menciones': clave[0], 'nombre': clave[1], 'limit': page_size})
+    else:
+        cur.execute("""
+            SELECT nombre, menciones, posicion
+            FROM mv_victimas_menciones
+            WHERE posicion > %(desde)s
+            ORDER BY posicion
+            LIMIT %(limit)s
+        """, {'desde': (page - 1) * page_size, 'limit': page_size})
+    return cur.fetchall(), total
+
+
+def _pagina_victimas_directa(cur, page, page_size, clave):
+    cur.execute("""
+        SELECT COUNT(DISTINCT nombre) FROM personas
+        WHERE tipo ILIKE '%victim%' AND tipo NOT ILIKE '%victimario%' AND nombre IS NOT NULL
+    """)
+    res = cur.fetchone()
+    total = res[0] if res and len(res) > 0 else 0
     if total == 0:
-        cur.close()
-        conn.close()
         return [], 0
 
-    start = (page - 1) * page_size
+    filtro_cursor = ""
+    params = {
+        'victim_pattern': '%victim%',
+        'victimario_pattern': '%victimario%',
+        'offset': (page - 1) * page_size,
+        'limit': page_size
+    }
+    if clave is not None:
+        filtro_cursor = "HAVING (COUNT(*), nombre) < (%(menciones)s, %(nombre)s)"
+        params.update({'menciones': clave[0], 'nombre': clave[1], 'offset': 0})
+
+    # Named parameters (evita error "tuple index out of range")
+    cur.execute(f"""
+        SELECT nombre, COUNT(*) as menciones
+        FROM personas
+        WHERE tipo ILIKE %(victim_pattern)s AND tipo NOT ILIKE %(victimario_pattern)s
+          AND nombre IS NOT NULL
+        GROUP BY nombre
+        {filtro_cursor}
+        ORDER BY menciones DESC, nombre DESC
+        OFFSET %(offset)s LIMIT %(limit)s
+    """, params)
+    return cur.fetchall(), total
 
-    # Ejecutar consulta principal con named parameters (evita error "tuple index out of range")
-    try:
-        cur.execute("""
-            SELECT nombre, COUNT(*) as menciones
-            FROM personas
-            WHERE tipo ILIKE %(victim_pattern)s AND tipo NOT ILIKE %(victimario_pattern)s
-            GROUP BY nombre
-            ORDER BY menciones DESC
-            OFFSET %(offset)s LIMIT %(limit)s
-        """, {
-            'victim_pattern': '%victim%',
-            'victimario_pattern': '%victimario%',
-            'offset': start,
-            'limit': page_size
-        })
-        rows = cur.fetchall()
-        victimas = []
-        for row in rows:
-            if row and len(row) >= 2:
-                victimas.append({"nombre": row[0], "menciones": row[1]})
-    except Exception as e:
-        print(f"Error en main query: {e}")
-        import traceback
-        traceback.print_exc()
-        victimas = []
 
-    cur.close()
-    conn.close()
-    return victimas, total
+# Paginación real para víctimas
+def obtener_victimas_paginadas(page=1, page_size=20):
+    """Compatibilidad: (victimas, total) de obtener_pagina_victimas."""
+    pagina = obtener_pagina_victimas(page, page_size)
+    return pagina["victimas"], pagina["total"]
 # Fuentes simuladas para una víctima
 def obtener_fuentes_victima(nombre):
     conn = get_db_connection()
@@ -258,12 +347,12 @@ def obtener_fuentes_victima(nombre):
     ]
     # Fuentes RAG: usar la pregunta completa para análisis semántico
     try:
-        from src.core.sistema_rag_completo import SistemaRAGTrazable
-        sistema_rag = SistemaRAGTrazable()
-        import asyncio
+        from src.core.sistema_rag_completo import obtener_sistema_rag
+        from src.core.registro_clientes import obtener_registro_clientes
+        sistema_rag = obtener_sistema_rag()
         # Si el frontend provee la consulta completa, úsala; si no, usa el nombre
         pregunta = nombre if not isinstance(nombre, str) else nombre
-        respuesta_rag = asyncio.run(sistema_rag._resolver_consulta_rag(pregunta))
+        respuesta_rag = obtener_registro_clientes().ejecutar(sistema_rag._resolver_consulta_rag(pregunta))
         fuentes_rag = respuesta_rag.fuentes if hasattr(respuesta_rag, 'fuentes') else []
     except Exception as e:
         fuentes_rag = [{"error": f"No se pudo obtener fuentes RAG: {e}"}]
@@ -488,9 +577,11 @@ def ejecutar_consulta(consulta, nucs=None, departamento=None, municipio=None, ti
     trazabilidad = []
 
     # Procesar cada oración según estrategia
-    import asyncio
-    from src.core.sistema_rag_completo import SistemaRAGTrazable
-    sistema_rag = SistemaRAGTrazable()
+    from src.core.sistema_rag_completo import obtener_sistema_rag
+    from src.core.registro_clientes import obtener_registro_clientes
+    # Instancia compartida: los clientes y el event loop se reutilizan entre oraciones y consultas
+    sistema_rag = obtener_sistema_rag()
+    ejecutar_rag = obtener_registro_clientes().ejecutar
     conn = get_db_connection()
     cur = conn.cursor()  # Use regular cursor to avoid parameter issues
     for oracion in plan.oraciones_analizadas:
@@ -596,9 +687,9 @@ def ejecutar_consulta(consulta, nucs=None, departamento=None, municipio=None, ti
                                 fuentes_detalle=""
                             )
                         )
-                        respuesta_rag = asyncio.run(sistema_rag._resolver_consulta_rag(prompt))
+                        respuesta_rag = ejecutar_rag(sistema_rag._resolver_consulta_rag(prompt))
                     else:
-                        respuesta_rag = asyncio.run(sistema_rag._resolver_consulta_rag(oracion.texto_original))
+                        respuesta_rag = ejecutar_rag(sistema_rag._resolver_consulta_rag(oracion.texto_original))
                     
                     # Validación robusta de respuesta_rag
                     if respuesta_rag is not None:
@@ -644,8 +735,15 @@ def ejecutar_consulta(consulta, nucs=None, departamento=None, municipio=None, ti
 
 # === FUNCIONES RAG Y CONSULTAS INTELIGENTES ===
 
-def ejecutar_consulta_rag_inteligente(consulta, contexto_conversacional=None):
-    """Motor RAG inteligente con Azure Search y trazabilidad completa"""
+def ejecutar_consulta_rag_inteligente(consulta, contexto_conversacional=None, al_fuentes=None, al_token=None,
+                                      cancelado=None):
+    """
+    Motor RAG inteligente con Azure Search y trazabilidad completa.
+
+    al_fuentes/al_token (opcionales) reciben las fuentes en cuanto termina la
+    búsqueda y cada fragmento de la respuesta del LLM (modo streaming);
+    cancelado (threading.Event opcional) corta la generación si se activa.
+    """
     try:
         # Usar función síncrona más simple
         from src.core.sistema_rag_completo import consulta_hibrida_sincrona
@@ -659,7 +757,8 @@ CONSULTA ACTUAL: {consulta}"""
             print(f"🔍 RAG: Consulta enriquecida con contexto conversacional ({len(contexto_conversacional)} caracteres)")
 
         # Ejecutar consulta
-        resultado = consulta_hibrida_sincrona(consulta_enriquecida)
+        resultado = consulta_hibrida_sincrona(consulta_enriquecida, al_fuentes=al_fuentes, al_token=al_token,
+                                              cancelado=cancelado)
 
         if resultado and 'respuesta' in resultado:
             # Estructurar respuesta
@@ -732,13 +831,7 @@ def ejecutar_consulta_hibrida(
             consulta_lower = consulta_bd.lower()
             try:
                 # Cargar municipios desde BD
-                import psycopg2
-                conn = psycopg2.connect(
-                    host="localhost",
-                    database="documentos_juridicos_gpt4",
-                    user="docs_user",
-                    password="docs_password_2025"
-                )
+                conn = get_db_connection()
                 cur = conn.cursor()
                 cur.execute("""
                     SELECT DISTINCT municipio
@@ -1043,13 +1136,21 @@ def ejecutar_consulta_persona(nombre_persona, limit=10, departamento=None, munic
         conn = get_db_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
+        # Filtro por nombre insensible a tildes servido por índice trigram
+        nombres = obtener_name_index()
+        cond_nombre = nombres.condicion('p.nombre')
+        # Si la consulta no aparece tal cual (errores de escritura), NameIndex
+        # la resuelve al nombre canónico más parecido
+        nombre_busqueda = nombres.nombre_canonico(nombre_persona, tipo='victim')
+        patron_nombre = nombres.patron(nombre_busqueda)
+
         # Configurar si necesitamos JOINs geográficos/temporales
         necesita_joins = departamento or municipio or fecha_inicio or fecha_fin
 
         if necesita_joins:
             # Con filtros: usar JOINs y COUNT(DISTINCT) y solo nombre completo
-            where_conditions = ["p.nombre ILIKE %s", "p.tipo ILIKE %s"]
-            params = [f'%{nombre_persona}%', '%victim%']
+            where_conditions = [cond_nombre, "p.tipo ILIKE %s"]
+            params = [patron_nombre, '%victim%']
 
             # Filtros geográficos
             if departamento:
@@ -1091,8 +1192,8 @@ def ejecutar_consulta_persona(nombre_persona, limit=10, departamento=None, munic
                     geo_subquery = f"AND EXISTS (SELECT 1 FROM analisis_lugares al2 WHERE al2.documento_id = d.id AND ({' OR '.join(['al2.municipio ILIKE %s' for _ in normalizar_municipio_busqueda(municipio)])}))"
 
                 # Crear query de conteo sin JOIN a analisis_lugares
-                where_simple = ["p.nombre ILIKE %s", "p.tipo ILIKE %s"]
-                params_simple = [f'%{nombre_persona}%', '%victim%']
+                where_simple = [cond_nombre, "p.tipo ILIKE %s"]
+                params_simple = [patron_nombre, '%victim%']
 
                 if fecha_inicio:
                     where_simple.append("m.fecha_creacion >= %s")
@@ -1123,10 +1224,10 @@ def ejecutar_consulta_persona(nombre_persona, limit=10, departamento=None, munic
                     SELECT COUNT(*) FROM personas p
                     JOIN documentos d ON p.documento_id = d.id
                     LEFT JOIN metadatos m ON d.id = m.documento_id
-                    WHERE p.nombre ILIKE %s AND p.tipo ILIKE %s
+                    WHERE {cond_nombre} AND p.tipo ILIKE %s
                         {f"AND m.fecha_creacion >= '{fecha_inicio}'" if fecha_inicio else ""}
                         {f"AND m.fecha_creacion <= '{fecha_fin}'" if fecha_fin else ""}
-                """, [f'%{nombre_persona}%', '%victim%'])
+                """, [patron_nombre, '%victim%'])
 
             result = cur.fetchone()
             total_menciones = result[0] if result else 0
@@ -1178,15 +1279,15 @@ def ejecutar_consulta_persona(nombre_persona, limit=10, departamento=None, munic
             documentos_relacionados = []
 
             for nombre_var in nombres_variantes:
-                cur.execute("""
+                cur.execute(f"""
                     SELECT COUNT(*) FROM personas
-                    WHERE nombre ILIKE %s AND tipo ILIKE %s
-                """, (f'%{nombre_var}%', '%victim%'))
+                    WHERE {nombres.condicion('nombre')} AND tipo ILIKE %s
+                """, (nombres.patron(nombre_var), '%victim%'))
                 result = cur.fetchone()
                 menciones_var = result[0] if result else 0
                 total_menciones += menciones_var
 
-                cur.execute("""
+                cur.execute(f"""
                     SELECT DISTINCT
                         d.archivo,
                         m.nuc,
@@ -1199,10 +1300,10 @@ def ejecutar_consulta_persona(nombre_persona, limit=10, departamento=None, munic
                     FROM personas p
                     JOIN documentos d ON p.documento_id = d.id
                     LEFT JOIN metadatos m ON d.id = m.documento_id
-                    WHERE p.nombre ILIKE %s AND p.tipo ILIKE %s
+                    WHERE {cond_nombre} AND p.tipo ILIKE %s
                     ORDER BY m.fecha_creacion DESC NULLS LAST
                     LIMIT %s
-                """, (f'%{nombre_var}%', '%victim%', limit))
+                """, (nombres.patron(nombre_var), '%victim%', limit))
 
                 for row in cur.fetchall():
                     if len(row) >= 8:
@@ -1219,8 +1320,9 @@ def ejecutar_consulta_persona(nombre_persona, limit=10, departamento=None, munic
                         documentos_relacionados.append(doc)
 
         # Crear respuesta estructurada
+        aviso_nombre = f"\n**Nombre buscado:** {nombre_busqueda}\n" if nombre_busqueda != nombre_persona else ""
         respuesta_bd = f"""**📊 Información de Base de Datos para {nombre_persona}:**
-
+{aviso_nombre}
 **Total menciones encontradas:** {total_menciones}
 **Documentos relacionados:** {len(documentos_relacionados)}
 
@@ -1449,4 +1551,86 @@ def obtener_rango_fechas() -> Tuple[Optional[str], Optional[str]]:
         print(f"Error obteniendo rango de fechas: {e}")
         return (None, None)
 
+# === SNAPSHOT DE OPCIONES DE FILTROS ===
+
+_snapshot_opciones = {"datos": None, "etag": None, "version": None, "verificado": 0.0}
+_snapshot_opciones_lock = threading.Lock()
+
+
+def _formatear_fecha(valor) -> Optional[str]:
+    if not valor:
+        return None
+    return valor.strftime('%Y-%m-%d') if hasattr(valor, 'strftime') else str(valor)[:10]
+
+
+def _etag_opciones(datos: Dict[str, Any]) -> str:
+    crudo = json.dumps(datos, sort_keys=True, ensure_ascii=False, default=str)
+    return '"' + hashlib.md5(crudo.encode('utf-8')).hexdigest() + '"'
+
+
+def _construir_opciones_directas() -> Dict[str, Any]:
+    """Snapshot calculado con las funciones individuales (sin vista materializada)."""
+    fecha_min, fecha_max = obtener_rango_fechas()
+    return {
+        "nucs": obtener_opciones_nuc(),
+        "departamentos": obtener_opciones_departamento(),
+        "municipios": obtener_opciones_municipio(),
+        "tipos_documento": obtener_opciones_tipo_documento(),
+        "despachos": obtener_opciones_despacho(),
+        "rango_fechas": {"min": fecha_min, "max": fecha_max},
+    }
+
+
+def obtener_snapshot_opciones() -> Tuple[Dict[str, Any], str]:
+    """
+    Opciones de todos los filtros en un solo snapshot, con su ETag.
+
+    Se lee de mv_opciones_filtros (refrescada por refresh_all_mv) y se cachea
+    en memoria; cada OPCIONES_FILTROS_TTL segundos solo se consulta la columna
+    ``generado`` para detectar un refresh. Si la vista no existe se recalcula
+    con las funciones obtener_opciones_* y se cachea el mismo tiempo.
+
+    Returns:
+        Tuple[Dict, str]: (opciones, etag)
+    """
+    ttl = float(os.getenv('OPCIONES_FILTROS_TTL', '30'))
+    cache = _snapshot_opciones
+    if cache["datos"] is not None and time.monotonic() - cache["verificado"] < ttl:
+        return cache["datos"], cache["etag"]
+
+    with _snapshot_opciones_lock:
+        if cache["datos"] is not None and time.monotonic() - cache["verificado"] < ttl:
+            return cache["datos"], cache["etag"]
+
+        try:
+            with conexion_bd() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT generado FROM mv_opciones_filtros")
+                fila = cur.fetchone()
+                version = fila[0] if fila else None
+                if cache["datos"] is None or version != cache["version"]:
+                    cur.execute("""
+                        SELECT nucs, departamentos, municipios, tipos_documento,
+                               despachos, fecha_min, fecha_max
+                        FROM mv_opciones_filtros
+                    """)
+                    fila = cur.fetchone()
+                    if fila:
+                        datos = {
+                            "nucs": fila[0], "departamentos": fila[1], "municipios": fila[2],
+                            "tipos_documento": fila[3], "despachos": fila[4],
+                            "rango_fechas": {"min": _formatear_fecha(fila[5]), "max": _formatear_fecha(fila[6])},
+                        }
+                    else:
+                        datos = _construir_opciones_directas()
+                    cache.update(datos=datos, etag=_etag_opciones(datos), version=version)
+                cur.close()
+        except psycopg2.ProgrammingError:
+            # Vista aún no creada
+            datos = _construir_opciones_directas()
+            cache.update(datos=datos, etag=_etag_opciones(datos), version=None)
+
+        cache["verificado"] = time.monotonic()
+        return cache["datos"], cache["etag"]
+
 # Función duplicada eliminada - usar la implementación de línea 161
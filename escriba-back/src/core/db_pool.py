@@ -0,0 +1,398 @@
+"""
+Pool de conexiones PostgreSQL compartido por proceso.
+
+Evita abrir una conexión nueva (TCP + autenticación) en cada consulta del
+dashboard y de la API. Las conexiones se reutilizan entre llamadas, se
+verifican antes de entregarse y se reciclan al superar su tiempo de vida.
+
+Uso recomendado:
+
+    from src.core.db_pool import conexion_bd
+
+    with conexion_bd() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+
+Compatibilidad: las conexiones entregadas por el pool exponen la misma API
+que psycopg2; llamar a ``conn.close()`` devuelve la conexión al pool en
+lugar de cerrarla.
+
+Variables de entorno:
+    POSTGRES_POOL_MIN           Conexiones abiertas de forma anticipada (default 1)
+    POSTGRES_POOL_MAX           Máximo de conexiones simultáneas (default 10)
+    POSTGRES_POOL_MAX_LIFETIME  Segundos de vida máxima por conexión (default 1800)
+    POSTGRES_POOL_CHECK_IDLE    Segundos ociosa tras los que se hace 'SELECT 1' (default 30)
+    POSTGRES_POOL_TIMEOUT       Segundos máximos de espera por una conexión (default 30)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolAgotadoError(psycopg2.OperationalError):
+    """No hubo conexiones disponibles dentro del tiempo de espera."""
+
+
+class _EntradaPool:
+    """Conexión física junto con sus marcas de tiempo."""
+
+    __slots__ = ("conn", "creada", "liberada", "pid")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.creada = time.monotonic()
+        self.liberada = self.creada
+        self.pid = os.getpid()
+
+
+class ConexionPooled:
+    """
+    Envoltorio de una conexión psycopg2 prestada por el pool.
+
+    Delega todos los atributos a la conexión real. ``close()`` la devuelve
+    al pool; si el objeto se descarta sin cerrarse, ``__del__`` la libera
+    igualmente para no agotar el pool.
+    """
+
+    _entrada = None
+
+    def __init__(self, pool: "PostgresConnectionPool", entrada: _EntradaPool):
+        self._pool = pool
+        self._entrada = entrada
+
+    @property
+    def raw(self):
+        """Conexión psycopg2 subyacente."""
+        if self._entrada is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return self._entrada.conn
+
+    def __getattr__(self, nombre):
+        return getattr(self.raw, nombre)
+
+    @property
+    def closed(self):
+        if self._entrada is None:
+            return 1
+        return self._entrada.conn.closed
+
+    def close(self):
+        """Devuelve la conexión al pool (idempotente)."""
+        entrada, self._entrada = self._entrada, None
+        if entrada is not None:
+            self._pool._liberar(entrada)
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self.raw.__exit__(exc_type, exc, tb)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class PostgresConnectionPool:
+    """
+    Pool de conexiones psycopg2 thread-safe.
+
+    Args:
+        conn_kwargs: Parámetros para ``psycopg2.connect``
+        min_size: Conexiones que se abren al crear el pool
+        max_size: Máximo de conexiones físicas abiertas (prestadas + ociosas)
+        max_lifetime: Segundos tras los cuales una conexión se recicla
+        check_idle: Segundos ociosa a partir de los cuales se valida con ``SELECT 1``
+            antes de entregarla (0 = validar siempre)
+        acquire_timeout: Segundos máximos de espera cuando el pool está lleno
+        inicializar: Callback opcional ``f(conn)`` ejecutado sobre cada conexión
+            física recién creada (p. ej. ``LOAD 'age'``)
+    """
+
+    def __init__(
+        self,
+        conn_kwargs: Dict[str, Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        max_lifetime: float = 1800.0,
+        check_idle: float = 30.0,
+        acquire_timeout: float = 30.0,
+        inicializar: Optional[Callable[[Any], None]] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size debe ser >= 1")
+        self.conn_kwargs = dict(conn_kwargs)
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+        self.acquire_timeout = acquire_timeout
+        self.inicializar = inicializar
+
+        self._cond = threading.Condition(threading.Lock())
+        self._ociosas: deque = deque()
+        # Conexiones heredadas del padre tras un fork: nunca se cierran aquí
+        self._heredadas: list = []
+        self._total = 0
+        self._pid = os.getpid()
+        self._cerrado = False
+
+        for _ in range(self.min_size):
+            try:
+                entrada = self._abrir()
+            except psycopg2.Error as e:
+                print(f"⚠️ Pool PostgreSQL: no se pudo precalentar conexión: {e}")
+                break
+            with self._cond:
+                self._total += 1
+                self._ociosas.append(entrada)
+
+    # --- Gestión de conexiones físicas ---
+
+    def _abrir(self) -> _EntradaPool:
+        conn = psycopg2.connect(**self.conn_kwargs)
+        try:
+            if self.inicializar is not None:
+                self.inicializar(conn)
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        return _EntradaPool(conn)
+
+    def _descartar(self, entrada: _EntradaPool):
+        try:
+            if not entrada.conn.closed:
+                entrada.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def _expirada(self, entrada: _EntradaPool, ahora: float) -> bool:
+        return bool(self.max_lifetime) and ahora - entrada.creada > self.max_lifetime
+
+    def _saludable(self, entrada: _EntradaPool, ahora: float) -> bool:
+        conn = entrada.conn
+        if conn.closed:
+            return False
+        if ahora - entrada.liberada < self.check_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _desvincular(self, entrada: _EntradaPool):
+        """
+        Aparta una conexión heredada del padre. Se conserva referenciada y su
+        descriptor se redirige a /dev/null: si el hijo la cierra o el
+        recolector la libera, PQfinish envía el Terminate a /dev/null y no por
+        el socket que el padre sigue usando.
+        """
+        try:
+            fd = entrada.conn.fileno()
+            nulo = os.open(os.devnull, os.O_RDWR)
+            try:
+                os.dup2(nulo, fd)
+            finally:
+                os.close(nulo)
+        except Exception:
+            pass
+        self._heredadas.append(entrada)
+
+    def _verificar_fork(self):
+        """Tras un fork (gunicorn, multiprocessing) no se comparten sockets con el padre."""
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    for entrada in self._ociosas:
+                        self._desvincular(entrada)
+                    self._ociosas.clear()
+                    self._total = 0
+                    self._pid = os.getpid()
+
+    # --- API pública ---
+
+    def obtener(self, timeout: Optional[float] = None) -> ConexionPooled:
+        """
+        Presta una conexión del pool.
+
+        Raises:
+            PoolAgotadoError: Si no se libera ninguna conexión en ``timeout`` segundos
+        """
+        self._verificar_fork()
+        timeout = self.acquire_timeout if timeout is None else timeout
+        limite = time.monotonic() + timeout
+
+        while True:
+            entrada = None
+            crear = False
+            with self._cond:
+                if self._cerrado:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                while not self._ociosas and self._total >= self.max_size:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolAgotadoError(
+                            f"pool agotado: {self.max_size} conexiones en uso"
+                        )
+                    self._cond.wait(restante)
+                if self._ociosas:
+                    entrada = self._ociosas.pop()
+                else:
+                    self._total += 1
+                    crear = True
+
+            if crear:
+                try:
+                    entrada = self._abrir()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                return ConexionPooled(self, entrada)
+
+            ahora = time.monotonic()
+            if self._expirada(entrada, ahora) or not self._saludable(entrada, ahora):
+                self._descartar(entrada)
+                continue
+            return ConexionPooled(self, entrada)
+
+    def _liberar(self, entrada: _EntradaPool):
+        if entrada.pid != os.getpid():
+            # Prestada en el padre antes del fork: no se reutiliza ni se cierra
+            self._verificar_fork()
+            with self._cond:
+                self._desvincular(entrada)
+            return
+        conn = entrada.conn
+        reutilizable = not conn.closed and not self._cerrado
+        if reutilizable:
+            try:
+                # Descartar transacciones abiertas: mismo efecto que close()
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                reutilizable = False
+        if not reutilizable or self._expirada(entrada, time.monotonic()):
+            self._descartar(entrada)
+            return
+        entrada.liberada = time.monotonic()
+        with self._cond:
+            self._ociosas.append(entrada)
+            self._cond.notify()
+
+    @contextmanager
+    def conexion(self, timeout: Optional[float] = None):
+        """
+        Context manager que presta una conexión y la devuelve al salir.
+
+        Si el bloque lanza una excepción se hace rollback antes de devolverla.
+        """
+        conn = self.obtener(timeout)
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def cerrar(self):
+        """Cierra todas las conexiones ociosas y rechaza nuevos préstamos."""
+        self._verificar_fork()
+        with self._cond:
+            self._cerrado = True
+            ociosas = list(self._ociosas)
+            self._ociosas.clear()
+            self._total -= len(ociosas)
+            self._cond.notify_all()
+        for entrada in ociosas:
+            try:
+                entrada.conn.close()
+            except Exception:
+                pass
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Conexiones abiertas, ociosas y prestadas."""
+        with self._cond:
+            return {
+                "total": self._total,
+                "ociosas": len(self._ociosas),
+                "en_uso": self._total - len(self._ociosas),
+                "max": self.max_size,
+            }
+
+
+# --- Pool global del proceso ---
+
+_pool: Optional[PostgresConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def parametros_conexion_default() -> Dict[str, Any]:
+    """Parámetros de conexión tomados de las variables POSTGRES_*."""
+    return {
+        "host": os.getenv('POSTGRES_HOST', 'localhost'),
+        "port": os.getenv('POSTGRES_PORT', '5432'),
+        "database": os.getenv('POSTGRES_DB', 'documentos_juridicos_gpt4'),
+        "user": os.getenv('POSTGRES_USER', 'docs_user'),
+        "password": os.getenv('POSTGRES_PASSWORD', 'docs_password_2025'),
+    }
+
+
+def obtener_pool() -> PostgresConnectionPool:
+    """Retorna el pool global, creándolo en el primer uso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PostgresConnectionPool(
+                    parametros_conexion_default(),
+                    min_size=int(os.getenv('POSTGRES_POOL_MIN', '1')),
+                    max_size=int(os.getenv('POSTGRES_POOL_MAX', '10')),
+                    max_lifetime=float(os.getenv('POSTGRES_POOL_MAX_LIFETIME', '1800')),
+                    check_idle=float(os.getenv('POSTGRES_POOL_CHECK_IDLE', '30')),
+                    acquire_timeout=float(os.getenv('POSTGRES_POOL_TIMEOUT', '30')),
+                )
+    return _pool
+
+
+def cerrar_pool():
+    """Cierra el pool global (llamar en el shutdown de la aplicación)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+
+@contextmanager
+def conexion_bd(timeout: Optional[float] = None):
+    """Atajo: ``with conexion_bd() as conn`` sobre el pool global."""
+    with obtener_pool().conexion(timeout) as conn:
+        yield conn
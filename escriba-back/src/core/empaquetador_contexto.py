@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Empaquetado del contexto RAG dentro de un presupuesto de tokens
+
+_formatear_contexto_lista_para_llm enviaba hasta 10 items con el texto
+completo y construir_contexto_rag recortaba por caracteres (content[:500],
+estimación len // 4). El prompt podía desbordar o desperdiciar la ventana del
+modelo y los fragmentos casi idénticos del mismo documento ocupaban varias
+citas. Aquí:
+
+- Los tokens se cuentan con el tokenizador del modelo (tiktoken); si no está
+  instalado se usa la estimación de ~4 caracteres por token.
+- Se eliminan los fragmentos casi duplicados del mismo documento (Jaccard
+  sobre trigramas de palabras), conservando el más relevante.
+- Los items se ordenan por relevancia y se llenan de forma voraz hasta el
+  presupuesto: un item que no cabe se descarta y se prueba el siguiente.
+- Los descartados se devuelven (y registran) con su motivo.
+
+Variables de entorno:
+    RAG_CONTEXTO_MAX_TOKENS   Presupuesto de tokens del contexto (default 6000)
+    RAG_CONTEXTO_MAX_ITEMS    Items máximos en el contexto (default 10)
+    RAG_CONTEXTO_UMBRAL_DUP   Similitud para considerar duplicado (default 0.85)
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MODELO_POR_DEFECTO = "gpt-4o-mini"
+
+_PALABRA = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=8)
+def _codificador(modelo: str):
+    """
+    Codificador tiktoken del modelo, o None para usar la estimación. El None
+    también queda cacheado: sin red tiktoken no puede descargar el BPE y
+    fallaría (lento) en cada llamada; se avisa una sola vez por modelo.
+    """
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(modelo)
+        except KeyError:
+            # Nombres de deployment de Azure que tiktoken no reconoce
+            return tiktoken.get_encoding("o200k_base" if "4o" in modelo else "cl100k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizador de {modelo} no disponible ({e}); se estiman ~4 caracteres por token")
+        return None
+
+
+def contar_tokens(texto: str, modelo: str = MODELO_POR_DEFECTO) -> int:
+    """Tokens de un texto según el tokenizador del modelo (o ~4 caracteres por token)"""
+    if not texto:
+        return 0
+    codificador = _codificador(modelo)
+    if codificador is None:
+        return len(texto) // 4 + 1
+    return len(codificador.encode(texto, disallowed_special=()))
+
+
+def _trigramas(texto: str) -> frozenset:
+    palabras = _PALABRA.findall((texto or '').lower())
+    if len(palabras) < 3:
+        return frozenset([tuple(palabras)]) if palabras else frozenset()
+    return frozenset(zip(palabras, palabras[1:], palabras[2:]))
+
+
+def _similitud(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class ContextoEmpaquetado:
+    """Resultado del empaquetado: items incluidos (en orden de cita) y descartados"""
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    bloques: List[str] = field(default_factory=list)      # Texto formateado de cada item incluido
+    descartados: List[Dict[str, Any]] = field(default_factory=list)  # {'item', 'motivo', 'tokens'}
+    tokens: int = 0
+    presupuesto: int = 0
+
+    def resumen(self) -> Dict[str, Any]:
+        """Métricas serializables (para metadatos_llm)"""
+        motivos: Dict[str, int] = {}
+        for descartado in self.descartados:
+            motivos[descartado['motivo']] = motivos.get(descartado['motivo'], 0) + 1
+        return {
+            'tokens_contexto': self.tokens,
+            'presupuesto_tokens': self.presupuesto,
+            'items_incluidos': len(self.items),
+            'items_descartados': motivos,
+        }
+
+
+class EmpaquetadorContexto:
+    """Deduplica, ordena por relevancia y llena el presupuesto de tokens"""
+
+    def __init__(self, presupuesto: Optional[int] = None, max_items: Optional[int] = None,
+                 umbral_duplicado: Optional[float] = None, modelo: str = MODELO_POR_DEFECTO):
+        self.presupuesto = presupuesto or int(os.getenv('RAG_CONTEXTO_MAX_TOKENS', '6000'))
+        self.max_items = max_items or int(os.getenv('RAG_CONTEXTO_MAX_ITEMS', '10'))
+        self.umbral_duplicado = umbral_duplicado or float(os.getenv('RAG_CONTEXTO_UMBRAL_DUP', '0.85'))
+        self.modelo = modelo
+
+    def contar(self, texto: str) -> int:
+        return contar_tokens(texto, self.modelo)
+
+    def empaquetar(self, items: List[Dict[str, Any]], formatear: Callable[[int, Dict[str, Any]], str],
+                   presupuesto: Optional[int] = None, clave_texto: str = 'texto',
+                   clave_documento: str = 'nombre_archivo',
+                   clave_relevancia: str = 'relevancia', ordenar: bool = True) -> ContextoEmpaquetado:
+        """
+        Selecciona los items que caben en el presupuesto.
+
+        Args:
+            items: Fragmentos candidatos (dicts)
+            formatear: (número de cita, item) -> texto del item en el prompt;
+                el número es la posición final entre los incluidos (1, 2, ...)
+            presupuesto: Tokens disponibles (default: el del empaquetador)
+            ordenar: False si los items ya vienen en orden de relevancia (p. ej. tras reranking)
+        """
+        presupuesto = self.presupuesto if presupuesto is None else presupuesto
+        resultado = ContextoEmpaquetado(presupuesto=presupuesto)
+
+        ordenados = items
+        if ordenar:
+            ordenados = sorted(items, key=lambda x: float(x.get(clave_relevancia) or 0.0), reverse=True)
+
+        # Casi duplicados del mismo documento: se queda el primero (más relevante)
+        vistos: Dict[Any, List[frozenset]] = {}
+        candidatos = []
+        for item in ordenados:
+            documento = item.get(clave_documento) or item.get('expediente_nuc')
+            trigramas = _trigramas(item.get(clave_texto, ''))
+            previos = vistos.setdefault(documento, [])
+            if documento is not None and any(_similitud(trigramas, p) >= self.umbral_duplicado for p in previos):
+                resultado.descartados.append({'item': item, 'motivo': 'duplicado', 'tokens': 0})
+                continue
+            previos.append(trigramas)
+            candidatos.append(item)
+
+        for item in candidatos:
+            if len(resultado.items) >= self.max_items:
+                resultado.descartados.append({'item': item, 'motivo': 'max_items', 'tokens': 0})
+                continue
+            bloque = formatear(len(resultado.items) + 1, item)
+            tokens = self.contar(bloque)
+            if resultado.tokens + tokens > presupuesto:
+                resultado.descartados.append({'item': item, 'motivo': 'presupuesto', 'tokens': tokens})
+                continue
+            resultado.items.append(item)
+            resultado.bloques.append(bloque)
+            resultado.tokens += tokens
+
+        if resultado.descartados:
+            logger.info(
+                f"Contexto empaquetado: {len(resultado.items)} items, {resultado.tokens}/{presupuesto} tokens; "
+                f"descartados {resultado.resumen()['items_descartados']}"
+            )
+        return resultado
@@ -7,11 +7,61 @@ Maneja la conexión y operaciones básicas con Apache AGE usando psycopg2.
 import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import List, Dict, Any, Callable, Optional, Tuple, Union
 import json
+import math
+import re
+import threading
 from contextlib import contextmanager
 
 from .config import GraphConfig
+from ..db_pool import PostgresConnectionPool
+
+
+# Pools compartidos por todos los AGEConnector del proceso, uno por destino
+_age_pools: Dict[Tuple, PostgresConnectionPool] = {}
+_age_pools_lock = threading.Lock()
+
+
+def _inicializar_sesion_age(conn) -> None:
+    """Deja la sesión lista para Cypher: extensión AGE cargada y search_path fijado."""
+    with conn.cursor() as cur:
+        cur.execute("LOAD 'age';")
+        cur.execute('SET search_path = ag_catalog, "$user", public;')
+    conn.commit()
+
+
+def get_age_pool(config: GraphConfig) -> PostgresConnectionPool:
+    """
+    Retorna el pool de conexiones AGE para la configuración dada.
+
+    Las conexiones del pool se inicializan una sola vez al abrirse, de modo
+    que ``execute_cypher`` no repite ``LOAD 'age'`` ni el ``SET search_path``.
+    """
+    clave = (config.db_host, config.db_port, config.db_name, config.db_user)
+    pool = _age_pools.get(clave)
+    if pool is None:
+        with _age_pools_lock:
+            pool = _age_pools.get(clave)
+            if pool is None:
+                pool = PostgresConnectionPool(
+                    config.get_connection_dict(),
+                    min_size=config.pool_min_size,
+                    max_size=config.pool_max_size,
+                    max_lifetime=config.pool_max_lifetime,
+                    inicializar=_inicializar_sesion_age,
+                )
+                _age_pools[clave] = pool
+    return pool
+
+
+def close_age_pools() -> None:
+    """Cierra todos los pools AGE del proceso."""
+    with _age_pools_lock:
+        pools = list(_age_pools.values())
+        _age_pools.clear()
+    for pool in pools:
+        pool.cerrar()
 
 
 def agtype_to_python(value: Any) -> Any:
@@ -45,21 +95,81 @@ def agtype_to_python(value: Any) -> Any:
     return value
 
 
+_IDENTIFICADOR_CYPHER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def cypher_clave(clave: Any) -> str:
+    """Nombre de propiedad Cypher: tal cual si es un identificador simple, si no entre backquotes."""
+    clave = str(clave)
+    if _IDENTIFICADOR_CYPHER.match(clave):
+        return clave
+    if not clave or "$$" in clave:
+        raise ValueError(f"Nombre de propiedad no válido para Cypher: {clave!r}")
+    return "`" + clave.replace("`", "``") + "`"
+
+
+def to_cypher_literal(value: Any) -> str:
+    """
+    Serializa un valor Python como literal Cypher (strings escapados, listas, mapas).
+
+    Se usa para incrustar lotes de filas en sentencias UNWIND, ya que cypher()
+    solo acepta parámetros desde sentencias preparadas.
+    """
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and not math.isfinite(value):
+        # nan/inf no son literales Cypher válidos
+        return "null"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple, set)):
+        return "[" + ", ".join(to_cypher_literal(v) for v in value) + "]"
+    if isinstance(value, dict):
+        return "{" + ", ".join(
+            f"{cypher_clave(k)}: {to_cypher_literal(v)}" for k, v in value.items()
+        ) + "}"
+    texto = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    # Evitar cerrar el dollar-quoting de cypher($$ ... $$)
+    texto = texto.replace("$$", "$ $")
+    return f"'{texto}'"
+
+
+def _agrupar_por_claves(rows: List[Dict[str, Any]]) -> Dict[Tuple[str, ...], List[Dict[str, Any]]]:
+    """Agrupa filas por su conjunto de claves (orden estable)."""
+    grupos: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for row in rows:
+        grupos.setdefault(tuple(sorted(row.keys())), []).append(row)
+    return grupos
+
+
+def _mapa_desde_row(claves: Tuple[str, ...], var: str) -> str:
+    """Construye '{k1: row.k1, k2: row.k2}' para CREATE con UNWIND."""
+    if not claves:
+        return ""
+    return "{" + ", ".join(f"{cypher_clave(k)}: {var}.{cypher_clave(k)}" for k in claves) + "}"
+
+
 class AGEConnector:
     """
     Conector para Apache AGE.
 
     Proporciona métodos para conectar, crear grafos y ejecutar consultas Cypher.
+    Las conexiones salen de un pool compartido cuyas sesiones ya tienen AGE
+    cargado y el search_path configurado.
     """
 
-    def __init__(self, config: Optional[GraphConfig] = None):
+    def __init__(self, config: Optional[GraphConfig] = None, read_only: bool = False):
         """
         Inicializa el conector AGE.
 
         Args:
             config: Configuración del grafo. Si no se proporciona, usa config por defecto.
+            read_only: Si True, execute_cypher no hace commit (solo consultas MATCH/RETURN)
         """
         self.config = config or GraphConfig()
+        self.read_only = read_only
         self._connection = None
 
     @contextmanager
@@ -67,20 +177,14 @@ class AGEConnector:
         """
         Context manager para obtener una conexión a la base de datos.
 
+        La conexión se presta del pool AGE y se devuelve al salir; las
+        transacciones no confirmadas se descartan.
+
         Yields:
-            psycopg2.connection: Conexión activa a PostgreSQL
-        """
-        conn = psycopg2.connect(
-            host=self.config.db_host,
-            port=self.config.db_port,
-            dbname=self.config.db_name,
-            user=self.config.db_user,
-            password=self.config.db_password
-        )
-        try:
+            psycopg2.connection: Conexión activa a PostgreSQL con AGE cargado
+        """
+        with get_age_pool(self.config).conexion() as conn:
             yield conn
-        finally:
-            conn.close()
 
     def test_connection(self) -> bool:
         """
@@ -104,13 +208,13 @@ class AGEConnector:
         """
         Carga la extensión AGE en la sesión actual.
 
+        Las conexiones de get_connection() ya vienen inicializadas; solo hace
+        falta para conexiones creadas fuera del pool.
+
         Args:
             conn: Conexión activa a PostgreSQL
         """
-        with conn.cursor() as cur:
-            cur.execute("LOAD 'age';")
-            cur.execute('SET search_path = ag_catalog, "$user", public;')
-        conn.commit()
+        _inicializar_sesion_age(conn)
 
     def graph_exists(self, graph_name: str) -> bool:
         """
@@ -124,7 +228,6 @@ class AGEConnector:
         """
         try:
             with self.get_connection() as conn:
-                self.load_age_extension(conn)
                 with conn.cursor() as cur:
                     cur.execute(
                         "SELECT COUNT(*) FROM ag_catalog.ag_graph WHERE name = %s;",
@@ -149,14 +252,12 @@ class AGEConnector:
         graph_name = graph_name or self.config.graph_name
 
         try:
-            with self.get_connection() as conn:
-                self.load_age_extension(conn)
-
-                # Verificar si ya existe
-                if self.graph_exists(graph_name):
-                    print(f"⚠️  El grafo '{graph_name}' ya existe")
-                    return True
+            # Verificar si ya existe
+            if self.graph_exists(graph_name):
+                print(f"⚠️  El grafo '{graph_name}' ya existe")
+                return True
 
+            with self.get_connection() as conn:
                 with conn.cursor() as cur:
                     # Crear grafo usando la función de AGE
                     cur.execute(
@@ -185,13 +286,11 @@ class AGEConnector:
         graph_name = graph_name or self.config.graph_name
 
         try:
-            with self.get_connection() as conn:
-                self.load_age_extension(conn)
-
-                if not self.graph_exists(graph_name):
-                    print(f"⚠️  El grafo '{graph_name}' no existe")
-                    return True
+            if not self.graph_exists(graph_name):
+                print(f"⚠️  El grafo '{graph_name}' no existe")
+                return True
 
+            with self.get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute(
                         sql.SQL("SELECT drop_graph(%s, %s);"),
@@ -210,7 +309,8 @@ class AGEConnector:
         cypher_query: str,
         parameters: Optional[Dict[str, Any]] = None,
         graph_name: Optional[str] = None,
-        column_definitions: Optional[List[str]] = None
+        column_definitions: Optional[List[str]] = None,
+        read_only: Optional[bool] = None
     ) -> List[Dict[str, Any]]:
         """
         Ejecuta una consulta Cypher en AGE.
@@ -222,16 +322,18 @@ class AGEConnector:
             column_definitions: Definiciones de columnas para queries complejas.
                                Ej: ["nombre agtype", "count agtype"]
                                Si None, usa "(result agtype)" por defecto.
+            read_only: Si True, no hace commit. Si None, usa el modo del conector.
 
         Returns:
             List[Dict]: Resultados de la consulta
         """
         graph_name = graph_name or self.config.graph_name
         parameters = parameters or {}
+        if read_only is None:
+            read_only = self.read_only
 
         try:
             with self.get_connection() as conn:
-                self.load_age_extension(conn)
 
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     # Construir definición de columnas
@@ -249,7 +351,9 @@ class AGEConnector:
                     results = cur.fetchall()
 
                     # IMPORTANTE: Hacer commit para persistir cambios en AGE
-                    conn.commit()
+                    # (en modo lectura la transacción se descarta al devolver la conexión)
+                    if not read_only:
+                        conn.commit()
 
                     # Convertir resultados agtype a Python dicts
                     parsed_results = []
@@ -342,6 +446,193 @@ class AGEConnector:
         result = self.execute_cypher(cypher, graph_name=graph_name)
         return len(result) > 0
 
+    def _execute_cypher_bulk(self, cypher_query: str, graph_name: str) -> int:
+        """
+        Ejecuta una sentencia de carga masiva que retorna un único conteo.
+
+        A diferencia de execute_cypher, propaga los errores y no imprime la
+        query completa (puede contener miles de filas).
+        """
+        # Los '%' de los datos no deben interpretarse como placeholders de psycopg2
+        query = sql.SQL(
+            "SELECT * FROM cypher(%s, $$ {} $$) as (total agtype);"
+        ).format(sql.SQL(cypher_query.replace("%", "%%")))
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, (graph_name,))
+                row = cur.fetchone()
+            conn.commit()
+
+        total = agtype_to_python(row[0]) if row else 0
+        return int(total or 0)
+
+    def _ejecutar_lote_bulk(
+        self,
+        construir_cypher: Callable[[List[Dict[str, Any]]], str],
+        lote: List[Dict[str, Any]],
+        graph_name: str,
+        fallidas: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Ejecuta un lote UNWIND; si falla lo divide en mitades (cada sentencia
+        hace su propio commit) hasta aislar las filas que fallan, que se
+        agregan a `fallidas`.
+        """
+        try:
+            return self._execute_cypher_bulk(construir_cypher(lote), graph_name)
+        except Exception as e:
+            if len(lote) == 1:
+                fallidas.append({"row": lote[0], "error": str(e)})
+                return 0
+        mitad = len(lote) // 2
+        return (self._ejecutar_lote_bulk(construir_cypher, lote[:mitad], graph_name, fallidas)
+                + self._ejecutar_lote_bulk(construir_cypher, lote[mitad:], graph_name, fallidas))
+
+    def create_nodes_bulk(
+        self,
+        label: str,
+        rows: List[Dict[str, Any]],
+        graph_name: Optional[str] = None,
+        batch_size: int = 1000,
+        fallidas: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Crea muchos nodos de una misma etiqueta con UNWIND por lotes.
+
+        Si un lote falla se divide en mitades hasta aislar las filas que
+        fallan; el resto del lote se inserta igual.
+
+        Args:
+            label: Etiqueta de los nodos
+            rows: Propiedades de cada nodo
+            graph_name: Nombre del grafo
+            batch_size: Filas por sentencia
+            fallidas: Lista donde se agregan {'row', 'error'} de las filas no insertadas
+
+        Returns:
+            int: Número de nodos creados
+        """
+        graph_name = graph_name or self.config.graph_name
+        fallidas = [] if fallidas is None else fallidas
+        previas = len(fallidas)
+        creados = 0
+
+        # Agrupar por conjunto de propiedades para no crear propiedades nulas
+        for claves, grupo in _agrupar_por_claves(rows).items():
+            props_str = _mapa_desde_row(claves, "row")
+
+            def _cypher(lote: List[Dict[str, Any]]) -> str:
+                return (
+                    f"UNWIND {to_cypher_literal(lote)} AS row "
+                    f"CREATE (n:{label} {props_str}) "
+                    f"RETURN count(n)"
+                )
+
+            for i in range(0, len(grupo), batch_size):
+                creados += self._ejecutar_lote_bulk(_cypher, grupo[i:i + batch_size], graph_name, fallidas)
+
+        if len(fallidas) > previas:
+            print(f"❌ Carga masiva de nodos {label}: {len(fallidas) - previas} filas no insertadas "
+                  f"(primer error: {fallidas[previas]['error']})")
+        return creados
+
+    def create_relationships_bulk(
+        self,
+        rel_type: str,
+        rows: List[Dict[str, Any]],
+        from_label: Optional[str] = None,
+        from_property: str = "nombre_normalizado",
+        to_label: Optional[str] = None,
+        to_property: str = "nombre_normalizado",
+        graph_name: Optional[str] = None,
+        batch_size: int = 1000,
+        fallidas: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Crea muchas relaciones con UNWIND por lotes.
+
+        Cada fila debe traer 'origen' y 'destino' (valores de from_property /
+        to_property); el resto de claves son propiedades de la relación. Si una
+        etiqueta es None se busca el nodo por nombre_normalizado o
+        archivo_normalizado sin filtrar etiqueta (más lento). Los lotes que
+        fallan se dividen como en create_nodes_bulk y las filas que fallan se
+        agregan a `fallidas`.
+
+        Returns:
+            int: Número de relaciones creadas
+        """
+        graph_name = graph_name or self.config.graph_name
+
+        def _match(var: str, label: Optional[str], prop: str, campo: str) -> str:
+            if label:
+                return f"MATCH ({var}:{label}) WHERE {var}.{prop} = row.{campo}"
+            return (f"MATCH ({var}) WHERE {var}.nombre_normalizado = row.{campo} "
+                    f"OR {var}.archivo_normalizado = row.{campo}")
+
+        fallidas = [] if fallidas is None else fallidas
+        previas = len(fallidas)
+        creadas = 0
+        for claves, grupo in _agrupar_por_claves(rows).items():
+            props_str = _mapa_desde_row(
+                tuple(k for k in claves if k not in ("origen", "destino")), "row"
+            )
+
+            def _cypher(lote: List[Dict[str, Any]]) -> str:
+                return (
+                    f"UNWIND {to_cypher_literal(lote)} AS row "
+                    f"{_match('a', from_label, from_property, 'origen')} "
+                    f"{_match('b', to_label, to_property, 'destino')} "
+                    f"CREATE (a)-[r:{rel_type} {props_str}]->(b) "
+                    f"RETURN count(r)"
+                )
+
+            for i in range(0, len(grupo), batch_size):
+                creadas += self._ejecutar_lote_bulk(_cypher, grupo[i:i + batch_size], graph_name, fallidas)
+
+        if len(fallidas) > previas:
+            print(f"❌ Carga masiva de relaciones {rel_type}: {len(fallidas) - previas} filas no insertadas "
+                  f"(primer error: {fallidas[previas]['error']})")
+        return creadas
+
+    def ensure_property_index(
+        self,
+        label: str,
+        property_name: str,
+        graph_name: Optional[str] = None
+    ) -> bool:
+        """
+        Crea (si no existe) un índice btree sobre una propiedad de una etiqueta.
+
+        Permite que los MATCH ... WHERE n.prop = valor de la carga masiva de
+        relaciones sean búsquedas por índice en lugar de recorridos completos.
+
+        Returns:
+            bool: True si el índice existe al terminar
+        """
+        graph_name = graph_name or self.config.graph_name
+        index_name = f"idx_{label}_{property_name}".lower()
+
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        sql.SQL(
+                            "CREATE INDEX IF NOT EXISTS {} ON {}.{} USING btree "
+                            "(ag_catalog.agtype_access_operator(VARIADIC ARRAY[properties, {}::agtype]));"
+                        ).format(
+                            sql.Identifier(index_name),
+                            sql.Identifier(graph_name),
+                            sql.Identifier(label),
+                            sql.Literal(json.dumps(property_name))
+                        )
+                    )
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"⚠️  No se pudo crear índice {label}.{property_name}: {e}")
+            return False
+
     def get_graph_stats(self, graph_name: Optional[str] = None) -> Dict[str, int]:
         """
         Obtiene estadísticas del grafo.
@@ -362,20 +653,17 @@ class AGEConnector:
         }
 
         try:
-            with self.get_connection() as conn:
-                self.load_age_extension(conn)
-
-                # Contar nodos totales
-                cypher_nodes = "MATCH (n) RETURN count(n) as count"
-                result = self.execute_cypher(cypher_nodes, graph_name=graph_name)
-                if result:
-                    stats["total_nodes"] = result[0].get("count", 0)
-
-                # Contar relaciones totales
-                cypher_rels = "MATCH ()-[r]->() RETURN count(r) as count"
-                result = self.execute_cypher(cypher_rels, graph_name=graph_name)
-                if result:
-                    stats["total_relationships"] = result[0].get("count", 0)
+            # Contar nodos totales
+            cypher_nodes = "MATCH (n) RETURN count(n) as count"
+            result = self.execute_cypher(cypher_nodes, graph_name=graph_name, read_only=True)
+            if result:
+                stats["total_nodes"] = result[0].get("count", 0)
+
+            # Contar relaciones totales
+            cypher_rels = "MATCH ()-[r]->() RETURN count(r) as count"
+            result = self.execute_cypher(cypher_rels, graph_name=graph_name, read_only=True)
+            if result:
+                stats["total_relationships"] = result[0].get("count", 0)
 
         except Exception as e:
             print(f"⚠️  Error obteniendo estadísticas: {e}")
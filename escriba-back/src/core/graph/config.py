@@ -25,6 +25,7 @@ class GraphConfig:
 
     # Configuración de parsing
     parse_batch_size: int = 100  # Procesar JSONs en lotes
+    parse_workers: int = int(os.getenv("GRAPH_PARSE_WORKERS", "1"))  # Procesos de parseo
 
     # Configuración de construcción del grafo
     build_batch_size: int = 1000  # Insertar nodos/edges en lotes
@@ -33,6 +34,11 @@ class GraphConfig:
     enable_cache: bool = True
     cache_ttl_seconds: int = 300  # 5 minutos
 
+    # Pool de conexiones AGE (sesiones con LOAD 'age' y search_path ya aplicados)
+    pool_min_size: int = int(os.getenv("AGE_POOL_MIN", "1"))
+    pool_max_size: int = int(os.getenv("AGE_POOL_MAX", "8"))
+    pool_max_lifetime: float = float(os.getenv("AGE_POOL_MAX_LIFETIME", "1800"))
+
     # Paths
     json_files_dir: str = "json_files"
 
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Servicio de embeddings compartido por los clientes de Azure Search
+
+Cada cliente (AzureSearchVectorizado, AzureSearchClient,
+AzureSearchLegalCompleto, AzureSearchClientMejorado, RAGVectorizado) llamaba
+al endpoint de embeddings por su cuenta y sin cache: una consulta híbrida
+calculaba varias veces el embedding de la misma pregunta. Este servicio:
+
+- Cachea por hash del contenido (sha256 de modelo + texto) en un LRU en
+  memoria y, si se configura RAG_EMBEDDINGS_DIR, en un SQLite en disco.
+- Agrupa las llamadas concurrentes con el mismo texto: solo una va a la API
+  y las demás esperan su resultado.
+- Envía todos los textos faltantes de una petición en una sola llamada
+  (lotes de RAG_EMBEDDINGS_LOTE).
+
+El transporte lo aporta cada cliente (su AzureOpenAI/AsyncAzureOpenAI o HTTP):
+
+    servicio = obtener_servicio_embeddings()
+    vector = servicio.embedding(texto, lambda textos: [
+        d.embedding for d in cliente.embeddings.create(input=textos, model=servicio.modelo).data
+    ])
+
+Variables de entorno:
+    RAG_EMBEDDINGS_CACHE_MAX  Embeddings en memoria (default 5000)
+    RAG_EMBEDDINGS_DIR        Directorio del almacén en disco (default: sin disco)
+    RAG_EMBEDDINGS_LOTE       Textos por llamada a la API (default 16)
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+MODELO_EMBEDDINGS = "text-embedding-ada-002"
+
+# Funciones de transporte: reciben una lista de textos y devuelven sus vectores en orden
+LlamadaEmbeddings = Callable[[List[str]], List[List[float]]]
+LlamadaEmbeddingsAsync = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class _AlmacenDisco:
+    """Embeddings persistidos en SQLite (float32)"""
+
+    def __init__(self, directorio: str):
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directorio, 'embeddings.sqlite'), check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (clave TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def leer(self, claves: Sequence[str]) -> Dict[str, List[float]]:
+        if not claves:
+            return {}
+        with self._lock:
+            filas = self._conn.execute(
+                f"SELECT clave, vector FROM embeddings WHERE clave IN ({','.join('?' * len(claves))})",
+                list(claves)
+            ).fetchall()
+        resultado = {}
+        for clave, blob in filas:
+            vector = array('f')
+            vector.frombytes(blob)
+            resultado[clave] = vector.tolist()
+        return resultado
+
+    def escribir(self, vectores: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (clave, vector) VALUES (?, ?)",
+                [(clave, array('f', vector).tobytes()) for clave, vector in vectores.items()]
+            )
+            self._conn.commit()
+
+
+class ServicioEmbeddings:
+    """Cache LRU (+ disco opcional), coalescencia y lotes para embeddings"""
+
+    def __init__(self, modelo: str = MODELO_EMBEDDINGS, max_entradas: Optional[int] = None,
+                 directorio: Optional[str] = None, lote: Optional[int] = None):
+        self.modelo = modelo
+        self.max_entradas = max_entradas or int(os.getenv('RAG_EMBEDDINGS_CACHE_MAX', '5000'))
+        self.lote = lote or int(os.getenv('RAG_EMBEDDINGS_LOTE', '16'))
+        directorio = directorio or os.getenv('RAG_EMBEDDINGS_DIR')
+        self._disco = _AlmacenDisco(directorio) if directorio else None
+
+        self._memoria: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._en_vuelo: Dict[str, Future] = {}
+        self._en_vuelo_async: Dict[tuple, asyncio.Task] = {}
+        self.metricas = {'aciertos_memoria': 0, 'aciertos_disco': 0, 'llamadas_api': 0,
+                         'textos_api': 0, 'coalescidos': 0}
+
+    def clave(self, texto: str) -> str:
+        """Hash del contenido usado como clave de cache"""
+        return hashlib.sha256(f"{self.modelo}\n{texto}".encode('utf-8')).hexdigest()
+
+    # --- Cache ---
+
+    def _leer_cache(self, claves: Sequence[str]) -> Dict[str, List[float]]:
+        encontrados = {}
+        with self._lock:
+            for clave in claves:
+                vector = self._memoria.get(clave)
+                if vector is not None:
+                    self._memoria.move_to_end(clave)
+                    encontrados[clave] = vector
+            self.metricas['aciertos_memoria'] += len(encontrados)
+        faltantes = [c for c in claves if c not in encontrados]
+        if self._disco is not None and faltantes:
+            en_disco = self._disco.leer(faltantes)
+            if en_disco:
+                self._guardar_memoria(en_disco)
+                with self._lock:
+                    self.metricas['aciertos_disco'] += len(en_disco)
+                encontrados.update(en_disco)
+        return encontrados
+
+    def _guardar_memoria(self, vectores: Dict[str, List[float]]):
+        with self._lock:
+            for clave, vector in vectores.items():
+                self._memoria[clave] = vector
+                self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_entradas:
+                self._memoria.popitem(last=False)
+
+    def _guardar(self, vectores: Dict[str, List[float]]):
+        self._guardar_memoria(vectores)
+        if self._disco is not None:
+            try:
+                self._disco.escribir(vectores)
+            except sqlite3.Error as e:
+                logger.warning(f"No se pudieron persistir embeddings en disco: {e}")
+
+    def _registrar_llamada(self, textos: int):
+        with self._lock:
+            self.metricas['llamadas_api'] += 1
+            self.metricas['textos_api'] += textos
+
+    @staticmethod
+    def _unicos(textos: Sequence[str], claves: Sequence[str]) -> Dict[str, str]:
+        """clave -> texto, sin repetidos y en orden de aparición"""
+        return dict(zip(claves, textos))
+
+    # --- API síncrona ---
+
+    def embeddings(self, textos: Sequence[str], llamar: LlamadaEmbeddings) -> List[List[float]]:
+        """Embeddings de varios textos; los faltantes se piden en lotes"""
+        claves = [self.clave(t) for t in textos]
+        resultado = self._leer_cache(claves)
+
+        propios: Dict[str, Future] = {}
+        ajenos: Dict[str, Future] = {}
+        with self._lock:
+            for clave, texto in self._unicos(textos, claves).items():
+                if clave in resultado:
+                    continue
+                if clave in self._en_vuelo:
+                    ajenos[clave] = self._en_vuelo[clave]
+                    self.metricas['coalescidos'] += 1
+                else:
+                    propios[clave] = self._en_vuelo[clave] = Future()
+
+        if propios:
+            pendientes = list(propios)
+            textos_por_clave = self._unicos(textos, claves)
+            try:
+                for i in range(0, len(pendientes), self.lote):
+                    grupo = pendientes[i:i + self.lote]
+                    vectores = llamar([textos_por_clave[c] for c in grupo])
+                    self._registrar_llamada(len(grupo))
+                    nuevos = dict(zip(grupo, vectores))
+                    self._guardar(nuevos)
+                    resultado.update(nuevos)
+                    for clave in grupo:
+                        propios[clave].set_result(nuevos[clave])
+            except BaseException as e:
+                for futuro in propios.values():
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for clave in propios:
+                        self._en_vuelo.pop(clave, None)
+
+        for clave, futuro in ajenos.items():
+            resultado[clave] = futuro.result()
+
+        return [resultado[c] for c in claves]
+
+    def embedding(self, texto: str, llamar: LlamadaEmbeddings) -> List[float]:
+        """Embedding de un texto"""
+        return self.embeddings([texto], llamar)[0]
+
+    # --- API asíncrona ---
+
+    async def embeddings_async(self, textos: Sequence[str], llamar: LlamadaEmbeddingsAsync) -> List[List[float]]:
+        """
+        Versión async de embeddings(); coalesce dentro del mismo event loop.
+
+        La llamada a la API corre en su propia tarea y cada interesado (quien la
+        lanzó y los coalescidos) la espera con asyncio.shield: cancelar a uno no
+        cancela la llamada ni a los demás.
+        """
+        loop = asyncio.get_running_loop()
+        claves = [self.clave(t) for t in textos]
+        if self._disco is not None:
+            resultado = await loop.run_in_executor(None, self._leer_cache, claves)
+        else:
+            resultado = self._leer_cache(claves)
+
+        textos_por_clave = self._unicos(textos, claves)
+        propios: List[str] = []
+        esperas: Dict[asyncio.Task, List[str]] = {}
+        for clave in textos_por_clave:
+            if clave in resultado:
+                continue
+            en_vuelo = self._en_vuelo_async.get((loop, clave))
+            if en_vuelo is not None:
+                esperas.setdefault(en_vuelo, []).append(clave)
+                with self._lock:
+                    self.metricas['coalescidos'] += 1
+            else:
+                propios.append(clave)
+
+        if propios:
+            # Sin await entre la consulta de _en_vuelo_async y el registro
+            tarea = loop.create_task(self._pedir_async(loop, propios, textos_por_clave, llamar))
+            tarea.add_done_callback(self._descartar_excepcion)
+            for clave in propios:
+                self._en_vuelo_async[(loop, clave)] = tarea
+            esperas[tarea] = propios
+
+        for tarea, grupo in esperas.items():
+            vectores = await self._esperar_async(tarea)
+            for clave in grupo:
+                resultado[clave] = vectores[clave]
+
+        return [resultado[c] for c in claves]
+
+    async def _pedir_async(self, loop, claves: List[str], textos_por_clave: Dict[str, str],
+                           llamar: LlamadaEmbeddingsAsync) -> Dict[str, List[float]]:
+        """Llama a la API por lotes para las claves registradas en vuelo; devuelve clave -> vector"""
+        obtenidos: Dict[str, List[float]] = {}
+        try:
+            for i in range(0, len(claves), self.lote):
+                grupo = claves[i:i + self.lote]
+                vectores = await llamar([textos_por_clave[c] for c in grupo])
+                self._registrar_llamada(len(grupo))
+                nuevos = dict(zip(grupo, vectores))
+                if self._disco is not None:
+                    await loop.run_in_executor(None, self._guardar, nuevos)
+                else:
+                    self._guardar_memoria(nuevos)
+                obtenidos.update(nuevos)
+            return obtenidos
+        finally:
+            for clave in claves:
+                if self._en_vuelo_async.get((loop, clave)) is asyncio.current_task():
+                    del self._en_vuelo_async[(loop, clave)]
+
+    @staticmethod
+    async def _esperar_async(tarea: asyncio.Task) -> Dict[str, List[float]]:
+        """
+        Espera la tarea compartida sin poder cancelarla. Si la tarea misma terminó
+        cancelada (p. ej. al cerrar el loop), los demás reciben un error común y
+        no un CancelledError que no pidieron.
+        """
+        try:
+            return await asyncio.shield(tarea)
+        except asyncio.CancelledError:
+            actual = asyncio.current_task()
+            if tarea.cancelled() and not (actual is not None and actual.cancelling()):
+                raise RuntimeError("La llamada compartida de embeddings fue cancelada") from None
+            raise
+
+    @staticmethod
+    def _descartar_excepcion(tarea: asyncio.Task):
+        """Marca como recuperada la excepción de una tarea que ya nadie espera"""
+        if not tarea.cancelled():
+            tarea.exception()
+
+    async def embedding_async(self, texto: str, llamar: LlamadaEmbeddingsAsync) -> List[float]:
+        """Embedding de un texto (async)"""
+        return (await self.embeddings_async([texto], llamar))[0]
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Aciertos de cache, llamadas a la API y peticiones coalescidas"""
+        with self._lock:
+            return dict(self.metricas, entradas=len(self._memoria))
+
+
+_servicio: Optional[ServicioEmbeddings] = None
+_servicio_lock = threading.Lock()
+
+
+def obtener_servicio_embeddings() -> ServicioEmbeddings:
+    """Servicio de embeddings global del proceso"""
+    global _servicio
+    if _servicio is None:
+        with _servicio_lock:
+            if _servicio is None:
+                _servicio = ServicioEmbeddings()
+    return _servicio
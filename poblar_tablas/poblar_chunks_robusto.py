@@ -17,6 +17,10 @@ from azure.core.credentials import AzureKeyCredential
 import psycopg2
 import time
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src.core.almacen_embeddings import AlmacenEmbeddings
+from src.core.indice_vectorial_local import DIRECTORIO_EMBEDDINGS_MEL
+
 # Cargar configuración
 load_dotenv('config/.env')
 
@@ -30,10 +34,18 @@ DB_CONFIG = {
 
 class PobladorChunksRobusto:
     def obtener_todos_los_chunks(self, carpeta_jsons='chunks_semanticos_mel_json'):
-        """Obtiene todos los chunks de todos los archivos JSON en la carpeta indicada"""
+        """
+        Obtiene todos los chunks de todos los archivos JSON en la carpeta indicada.
+        chunqueo_semantico_mel.py guarda los embeddings en el almacén
+        `embeddings_mel/` de la carpeta; los JSON antiguos los traen en línea.
+        """
         import glob
         import json
         documentos = []
+        almacen = None
+        if os.path.exists(os.path.join(carpeta_jsons, DIRECTORIO_EMBEDDINGS_MEL, 'manifiesto.json')):
+            almacen = AlmacenEmbeddings(os.path.join(carpeta_jsons, DIRECTORIO_EMBEDDINGS_MEL))
+            print(f"💾 {len(almacen):,} embeddings MEL en {almacen.directorio}")
         archivos_json = glob.glob(os.path.join(carpeta_jsons, '*.json'))
         print(f"📁 Buscando archivos JSON en: {carpeta_jsons}")
         print(f"📊 Total archivos JSON encontrados: {len(archivos_json):,}")
@@ -48,6 +60,10 @@ class PobladorChunksRobusto:
                     import re
                     raw_chunk_id = chunk.get('chunk_id')
                     safe_chunk_id = re.sub(r'[^a-zA-Z0-9_\-=]', '_', raw_chunk_id) if raw_chunk_id else None
+                    embedding = chunk.get('mel_embedding')
+                    if embedding is None and almacen is not None and raw_chunk_id:
+                        vector = almacen.obtener(raw_chunk_id)
+                        embedding = vector.tolist() if vector is not None else None
                     doc = {
                         'chunk_id': safe_chunk_id,
                         'texto_chunk': chunk.get('texto_chunk'),
@@ -56,7 +72,7 @@ class PobladorChunksRobusto:
                         'posicion': chunk.get('posicion'),
                         'num_oraciones': chunk.get('num_oraciones'),
                         'longitud': chunk.get('longitud'),
-                        'mel_emedding': chunk.get('mel_embedding') if chunk.get('mel_embedding') is not None else [],
+                        'mel_emedding': embedding if embedding is not None else [],
                         # Puedes agregar más campos si existen en el chunk/data
                     }
                     documentos.append(doc)
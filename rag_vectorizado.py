@@ -16,6 +16,8 @@ from azure.core.credentials import AzureKeyCredential
 from dotenv import load_dotenv
 import json
 
+from src.core.servicio_embeddings import obtener_servicio_embeddings
+
 # Cargar variables de entorno
 load_dotenv('.env.gpt41')
 
@@ -49,33 +51,30 @@ class RAGVectorizado:
         
     def generar_embedding_consulta(self, consulta):
         """Generar embedding para la consulta del usuario"""
+        try:
+            return obtener_servicio_embeddings().embedding(consulta, self._llamar_embeddings)
+        except Exception as e:
+            logger.error(f"❌ Excepción al generar embedding: {str(e)}")
+            return None
+
+    def _llamar_embeddings(self, textos):
+        """Llamada HTTP al deployment de embeddings (un lote de textos)"""
         headers = {
             "Content-Type": "application/json",
             "api-key": self.openai_key
         }
         
-        data = {
-            "input": consulta
-        }
+        response = requests.post(
+            f"{self.openai_endpoint}openai/deployments/{self.deployment_embedding}/embeddings?api-version=2023-05-15",
+            headers=headers,
+            json={"input": textos},
+            timeout=30
+        )
         
-        try:
-            response = requests.post(
-                f"{self.openai_endpoint}openai/deployments/{self.deployment_embedding}/embeddings?api-version=2023-05-15",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["data"][0]["embedding"]
-            else:
-                logger.error(f"❌ Error generando embedding: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"❌ Excepción al generar embedding: {str(e)}")
-            return None
+        if response.status_code != 200:
+            raise RuntimeError(f"Error generando embedding: {response.status_code}")
+        datos = sorted(response.json()["data"], key=lambda d: d["index"])
+        return [d["embedding"] for d in datos]
     
     def busqueda_semantica(self, consulta, top_k=10, threshold_score=0.7):
         """
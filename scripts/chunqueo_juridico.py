@@ -1,12 +1,17 @@
 import os
 import json
 import re
+import argparse
 from uuid import uuid4
 
+from ejecutor_chunqueo import agregar_argumentos, ejecutar_chunqueo
+
 INPUT_DIR = '/home/lab4/scripts/documentos_judiciales/json_files'
 OUTPUT_DIR = '/home/lab4/scripts/documentos_judiciales/chunks_json'
 CHUNK_SIZE = 1200  # caracteres (ajustable)
 MIN_CHUNK_SIZE = 300  # para evitar chunks demasiado cortos
+# Cambiar la versión (o los parámetros) fuerza a rechunquear los documentos ya procesados
+CHUNKER_VERSION = f"juridico-1:{CHUNK_SIZE}:{MIN_CHUNK_SIZE}"
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -75,18 +80,10 @@ def process_document(json_path):
     }
 
 def main():
-    files = [f for f in os.listdir(INPUT_DIR) if f.endswith('.json')]
-    print(f"Procesando {len(files)} documentos...")
-    for fname in files:
-        in_path = os.path.join(INPUT_DIR, fname)
-        out_path = os.path.join(OUTPUT_DIR, fname)
-        try:
-            doc_chunks = process_document(in_path)
-            with open(out_path, 'w', encoding='utf-8') as out:
-                json.dump(doc_chunks, out, ensure_ascii=False, indent=2)
-            print(f"✅ {fname} → {len(doc_chunks['chunks'])} chunks")
-        except Exception as e:
-            print(f"❌ Error procesando {fname}: {e}")
+    parser = agregar_argumentos(argparse.ArgumentParser(description="Chunqueo jurídico por párrafos"))
+    args = parser.parse_args()
+    ejecutar_chunqueo(process_document, INPUT_DIR, OUTPUT_DIR, CHUNKER_VERSION,
+                      procesos=args.procesos, forzar=args.forzar, etiqueta='chunks')
 
 if __name__ == '__main__':
     main()
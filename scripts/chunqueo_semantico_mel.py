@@ -1,35 +1,137 @@
+"""
+Chunqueo semántico con embeddings MEL (IIC/MEL), por lotes y en CPU
+
+- spaCy solo con los componentes que segmentan oraciones (tok2vec + senter;
+  sin ner, lemmatizer ni morphologizer) y nlp.pipe sobre varios documentos.
+- Los chunks de un lote de documentos se ordenan por longitud y se codifican
+  en lotes con padding dinámico (cada lote se rellena solo hasta su chunk más
+  largo), en lugar de un forward pass por chunk.
+- torch.set_num_threads(MEL_NUM_THREADS).
+- Opcional: IIC/MEL exportado a ONNX y cuantizado a int8 (onnxruntime). Los
+  vectores int8 difieren levemente de los fp32 con que RecuperadorLocalMEL
+  codifica las preguntas; comprobar el recall antes de reindexar con él.
+
+Variables de entorno:
+    MEL_BATCH_SIZE      Chunks por forward pass (default 32)
+    MEL_DOCS_POR_LOTE   Documentos cuyos chunks se agrupan y ordenan (default 64)
+    MEL_NUM_THREADS     Hilos de torch / onnxruntime (default: núcleos de la máquina)
+    MEL_ONNX            Modelo .onnx generado con --exportar-onnx (si no, torch)
+
+Uso:
+    python scripts/chunqueo_semantico_mel.py
+    python scripts/chunqueo_semantico_mel.py --exportar-onnx modelos/mel_int8.onnx
+"""
 import os
+import sys
 import json
+import argparse
+from pathlib import Path
 from uuid import uuid4
+import numpy as np
 from transformers import AutoTokenizer, AutoModel
 import torch
 import spacy
 
+try:
+    import onnxruntime
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.core.almacen_embeddings import AlmacenEmbeddings
+from src.core.indice_vectorial_local import DIRECTORIO_EMBEDDINGS_MEL
+from ejecutor_chunqueo import MANIFIESTO, agregar_argumentos, ejecutar_chunqueo
+
 INPUT_DIR = '/home/lab4/scripts/documentos_judiciales/json_files'
 OUTPUT_DIR = '/home/lab4/scripts/documentos_judiciales/chunks_semanticos_mel_json'
 MODEL_NAME = 'IIC/MEL'
 MAX_CHUNK_SENTENCES = 5  # Máximo de oraciones por chunk
+BATCH_SIZE = int(os.getenv('MEL_BATCH_SIZE', '32'))
+DOCS_POR_LOTE = int(os.getenv('MEL_DOCS_POR_LOTE', '64'))
+NUM_THREADS = int(os.getenv('MEL_NUM_THREADS', str(os.cpu_count() or 1)))
+ONNX_PATH = os.getenv('MEL_ONNX')
+# Cambiar la versión (o los parámetros / el modelo) fuerza a rechunquear los documentos ya procesados
+CHUNKER_VERSION = f"mel-1:{MODEL_NAME}:{MAX_CHUNK_SENTENCES}:{os.path.basename(ONNX_PATH) if ONNX_PATH else 'torch'}"
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+torch.set_num_threads(NUM_THREADS)
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModel.from_pretrained(MODEL_NAME)
+model = None
+onnx_session = None
+almacen = None
+
 nlp = spacy.load('es_core_news_md')
+# Solo segmentación de oraciones: senter (mucho más rápido que el parser) sobre tok2vec
+if 'senter' in nlp.component_names:
+    nlp.select_pipes(enable=[p for p in ('tok2vec', 'senter') if p in nlp.component_names])
+    nlp.enable_pipe('senter')
+else:
+    nlp.select_pipes(enable=[p for p in ('tok2vec', 'parser') if p in nlp.component_names])
+
+def cargar_modelo():
+    """Sesión ONNX si MEL_ONNX está configurado (y onnxruntime instalado); si no, el modelo torch"""
+    global model, onnx_session
+    if ONNX_PATH and ONNXRUNTIME_AVAILABLE:
+        opciones = onnxruntime.SessionOptions()
+        opciones.intra_op_num_threads = NUM_THREADS
+        onnx_session = onnxruntime.InferenceSession(ONNX_PATH, opciones, providers=['CPUExecutionProvider'])
+        print(f"⚙️ Modelo ONNX: {ONNX_PATH} ({NUM_THREADS} hilos)")
+        return
+    if ONNX_PATH:
+        print("⚠️ onnxruntime no está instalado; se usa el modelo torch")
+    model = AutoModel.from_pretrained(MODEL_NAME).eval()
+    print(f"⚙️ Modelo torch: {MODEL_NAME} ({NUM_THREADS} hilos)")
+
+def exportar_onnx(destino, cuantizar=True):
+    """Exporta IIC/MEL a ONNX (ejes dinámicos de lote y secuencia) y lo cuantiza a int8"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    modelo = AutoModel.from_pretrained(MODEL_NAME).eval()
+    ejemplo = tokenizer(['texto de ejemplo'], return_tensors='pt')
+    nombres = list(ejemplo.keys())
+    ejes = {n: {0: 'lote', 1: 'secuencia'} for n in nombres}
+    ejes['last_hidden_state'] = {0: 'lote', 1: 'secuencia'}
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    ruta_fp32 = destino[:-len('.onnx')] + '.fp32.onnx' if cuantizar else destino
+    torch.onnx.export(modelo, (dict(ejemplo),), ruta_fp32, input_names=nombres,
+                      output_names=['last_hidden_state'], dynamic_axes=ejes, opset_version=17)
+    if cuantizar:
+        quantize_dynamic(ruta_fp32, destino, weight_type=QuantType.QInt8)
+    print(f"✅ Modelo exportado: {destino}")
 
 def clean_text(text):
     if not text:
         return ''
     return ' '.join(text.split())
 
-def get_sentence_embeddings(sentences):
-    inputs = tokenizer(sentences, padding=True, truncation=True, return_tensors="pt")
-    with torch.no_grad():
+def _codificar_lote(textos):
+    """Embedding [CLS] de un lote, rellenado solo hasta su texto más largo"""
+    if onnx_session is not None:
+        inputs = tokenizer(textos, padding=True, truncation=True, return_tensors="np")
+        nombres = {i.name for i in onnx_session.get_inputs()}
+        salida = onnx_session.run(None, {k: v.astype(np.int64) for k, v in inputs.items() if k in nombres})[0]
+        return salida[:, 0, :]
+    inputs = tokenizer(textos, padding=True, truncation=True, return_tensors="pt")
+    with torch.inference_mode():
         outputs = model(**inputs)
-        # Usar el embedding [CLS] de cada oración
-        embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()
-    return embeddings
+    return outputs.last_hidden_state[:, 0, :].cpu().numpy()
 
-def semantic_chunk_mel(text, max_sentences=MAX_CHUNK_SENTENCES):
-    doc = nlp(text)
+def get_sentence_embeddings(sentences, batch_size=BATCH_SIZE):
+    """Embeddings [CLS] de los textos (en su orden), en lotes ordenados por longitud"""
+    if model is None and onnx_session is None:
+        cargar_modelo()
+    orden = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+    embeddings = None
+    for inicio in range(0, len(orden), batch_size):
+        lote = orden[inicio:inicio + batch_size]
+        vectores = _codificar_lote([sentences[i] for i in lote])
+        if embeddings is None:
+            embeddings = np.empty((len(sentences), vectores.shape[1]), dtype=np.float32)
+        embeddings[lote] = vectores
+    return embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
+
+def agrupar_oraciones(doc, max_sentences=MAX_CHUNK_SENTENCES):
     sentences = [sent.text.strip() for sent in doc.sents if sent.text.strip()]
     chunks = []
     current = []
@@ -42,48 +144,117 @@ def semantic_chunk_mel(text, max_sentences=MAX_CHUNK_SENTENCES):
         chunks.append(list(current))
     return chunks
 
-def process_document(json_path):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        doc = json.load(f)
-    texto = clean_text(doc.get('texto_extraido', ''))
-    documento_id = doc.get('id', os.path.basename(json_path))
-    archivo = doc.get('archivo', os.path.basename(json_path))
-    chunks = semantic_chunk_mel(texto)
-    chunk_objs = []
-    for idx, chunk_sentences in enumerate(chunks):
-        chunk_text = ' '.join(chunk_sentences)
-        chunk_id = f"{documento_id}_melchunk_{idx+1}_{uuid4().hex[:8]}"
-        # Obtener embedding del chunk usando MEL
-        embedding = get_sentence_embeddings([chunk_text])[0].tolist()
-        chunk_objs.append({
-            'chunk_id': chunk_id,
-            'texto_chunk': chunk_text,
-            'documento_id': documento_id,
-            'archivo': archivo,
-            'posicion': idx+1,
-            'num_oraciones': len(chunk_sentences),
-            'longitud': len(chunk_text),
-            'mel_embedding': embedding
-        })
-    return {
-        'documento_id': documento_id,
-        'archivo': archivo,
-        'chunks': chunk_objs
-    }
+def semantic_chunk_mel(text, max_sentences=MAX_CHUNK_SENTENCES):
+    return agrupar_oraciones(nlp(text), max_sentences)
 
-def main():
-    files = [f for f in os.listdir(INPUT_DIR) if f.endswith('.json')]
-    print(f"Procesando {len(files)} documentos...")
-    for fname in files:
-        in_path = os.path.join(INPUT_DIR, fname)
-        out_path = os.path.join(OUTPUT_DIR, fname)
+def process_documents(json_paths, almacen):
+    """
+    Chunks de varios documentos con un solo nlp.pipe y los embeddings en
+    lotes compartidos. Devuelve {json_path: resultado o excepción}.
+    """
+    resultados = {}
+    documentos = []
+    for json_path in json_paths:
         try:
-            doc_chunks = process_document(in_path)
-            with open(out_path, 'w', encoding='utf-8') as out:
-                json.dump(doc_chunks, out, ensure_ascii=False, indent=2)
-            print(f"✅ {fname} → {len(doc_chunks['chunks'])} chunks MEL semánticos")
+            with open(json_path, 'r', encoding='utf-8') as f:
+                doc = json.load(f)
+            documentos.append((json_path, doc, clean_text(doc.get('texto_extraido', ''))))
         except Exception as e:
-            print(f"❌ Error procesando {fname}: {e}")
+            resultados[json_path] = e
+
+    chunk_objs, chunk_texts = [], []
+    for (json_path, doc, _), spacy_doc in zip(documentos, nlp.pipe((t for _, _, t in documentos), batch_size=8)):
+        documento_id = doc.get('id', os.path.basename(json_path))
+        archivo = doc.get('archivo', os.path.basename(json_path))
+        objs = []
+        for idx, chunk_sentences in enumerate(agrupar_oraciones(spacy_doc)):
+            chunk_text = ' '.join(chunk_sentences)
+            objs.append({
+                'chunk_id': f"{documento_id}_melchunk_{idx+1}_{uuid4().hex[:8]}",
+                'texto_chunk': chunk_text,
+                'documento_id': documento_id,
+                'archivo': archivo,
+                'posicion': idx+1,
+                'num_oraciones': len(chunk_sentences),
+                'longitud': len(chunk_text)
+            })
+            chunk_texts.append(chunk_text)
+        chunk_objs.extend(objs)
+        resultados[json_path] = {'documento_id': documento_id, 'archivo': archivo, 'chunks': objs}
+
+    # Embeddings de todos los chunks del lote (se guardan en el almacén, no en el JSON)
+    if chunk_objs:
+        embeddings = get_sentence_embeddings(chunk_texts)
+        almacen.agregar_lote([c['chunk_id'] for c in chunk_objs], embeddings,
+                             [{'documento_id': c['documento_id'], 'archivo': c['archivo'],
+                               'posicion': c['posicion']} for c in chunk_objs])
+    return resultados
+
+def process_document(json_path, almacen):
+    resultado = process_documents([json_path], almacen)[json_path]
+    if isinstance(resultado, Exception):
+        raise resultado
+    return resultado
+
+def procesar_lote(json_paths):
+    """
+    Lote para ejecutar_chunqueo: chunks y embeddings de los documentos (en el
+    almacén global).
+    """
+    try:
+        resultados = process_documents(json_paths, almacen)
+    except Exception:
+        # Un documento problemático no descarta el lote: se reintenta uno a uno
+        resultados = {}
+        for json_path in json_paths:
+            try:
+                resultados.update(process_documents([json_path], almacen))
+            except Exception as e:
+                resultados[json_path] = e
+    almacen.guardar()
+    return resultados
+
+def chunk_ids_vigentes(output_dir=OUTPUT_DIR):
+    """
+    chunk_ids de las salidas actuales. Se leen del disco (no de lo procesado
+    en esta corrida) para que una corrida interrumpida no deje embeddings
+    huérfanos: de documentos reprocesados o de lotes sin salida escrita.
+    None si alguna salida no se pudo leer (sus chunks no se pueden conservar).
+    """
+    vigentes = set()
+    for nombre in os.listdir(output_dir):
+        if not nombre.endswith('.json') or nombre == MANIFIESTO:
+            continue
+        try:
+            with open(os.path.join(output_dir, nombre), 'r', encoding='utf-8') as f:
+                vigentes.update(c['chunk_id'] for c in json.load(f).get('chunks', []))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No se pudo leer {nombre}, no se compacta el almacén: {e}")
+            return None
+    return vigentes
+
+def main():
+    global almacen
+    parser = argparse.ArgumentParser(description="Chunqueo semántico con embeddings MEL")
+    parser.add_argument('--exportar-onnx', metavar='RUTA', help="Exporta IIC/MEL a ONNX int8 y termina")
+    parser.add_argument('--sin-cuantizar', action='store_true', help="Con --exportar-onnx: mantener fp32")
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    if args.exportar_onnx:
+        exportar_onnx(args.exportar_onnx, cuantizar=not args.sin_cuantizar)
+        return
+
+    cargar_modelo()
+    almacen = AlmacenEmbeddings(os.path.join(OUTPUT_DIR, DIRECTORIO_EMBEDDINGS_MEL))
+    # El modelo ya usa todos los hilos: los lotes corren en este proceso
+    ejecutar_chunqueo(procesar_lote, INPUT_DIR, OUTPUT_DIR, CHUNKER_VERSION, por_lote=True,
+                      docs_por_lote=DOCS_POR_LOTE, forzar=args.forzar, etiqueta='chunks MEL semánticos')
+    # Un solo segmento final, solo con los chunks de las salidas vigentes
+    # (compactar no reescribe nada si no hay huérfanos ni segmentos de más)
+    vigentes = chunk_ids_vigentes()
+    if vigentes is not None:
+        almacen.compactar(conservar=vigentes)
+    print(f"💾 {len(almacen)} embeddings MEL en {almacen.directorio}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,233 @@
+"""
+Ejecutor compartido de los scripts de chunqueo (juridico, semantico, semantico_mel)
+
+Los main() recorrían os.listdir(INPUT_DIR) en serie y reescribían todas las
+salidas en cada corrida. Aquí:
+
+- Manifiesto (OUTPUT_DIR/manifiesto_chunqueo.json): por archivo de entrada,
+  hash del contenido, versión del chunker, salida y número de chunks.
+- Se omiten las entradas cuyo hash y versión coinciden con el manifiesto y
+  cuya salida existe; el hash solo se recalcula si cambian tamaño o mtime
+  (y si el contenido no cambió se guardan el tamaño y mtime nuevos).
+- Las entradas borradas salen del manifiesto junto con su salida.
+- Pool de procesos (multiprocessing) para los chunkers por documento; los
+  chunkers por lote (MEL) corren en el proceso principal.
+- Las salidas y el manifiesto se escriben de forma atómica (tmp + os.replace);
+  el manifiesto se guarda durante la corrida, así que una interrupción se
+  retoma donde quedó.
+- Progreso con documentos/s, chunks/s y ETA, y resumen final.
+
+Variables de entorno:
+    CHUNQUEO_PROCESOS   Procesos del pool (default: núcleos de la máquina)
+"""
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+from datetime import datetime
+
+MANIFIESTO = 'manifiesto_chunqueo.json'
+GUARDAR_MANIFIESTO_CADA = 50  # Documentos entre escrituras del manifiesto
+PROGRESO_CADA_SEGUNDOS = 10
+
+
+def escribir_json_atomico(ruta, datos, indent=2):
+    temporal = f"{ruta}.tmp.{os.getpid()}"
+    try:
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=indent)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def hash_archivo(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def agregar_argumentos(parser):
+    """--forzar y --procesos para los scripts de chunqueo"""
+    parser.add_argument('--forzar', action='store_true', help="Reprocesar aunque la entrada no haya cambiado")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos del pool (CHUNQUEO_PROCESOS)")
+    return parser
+
+
+def _cargar_manifiesto(output_dir):
+    ruta = os.path.join(output_dir, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {}
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f).get('documentos', {})
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Manifiesto ilegible, se reprocesa todo: {e}")
+        return {}
+
+
+def _guardar_manifiesto(output_dir, documentos):
+    escribir_json_atomico(os.path.join(output_dir, MANIFIESTO),
+                          {'actualizado': datetime.now().isoformat(), 'documentos': documentos}, indent=None)
+
+
+def _pendientes(input_dir, output_dir, version, manifiesto, forzar):
+    """(archivo, ruta, hash, tamaño, mtime) de las entradas nuevas o modificadas, y el total de entradas"""
+    pendientes = []
+    entradas = sorted(f for f in os.listdir(input_dir) if f.endswith('.json'))
+    for fname in entradas:
+        in_path = os.path.join(input_dir, fname)
+        estado = os.stat(in_path)
+        previo = manifiesto.get(fname, {})
+        if previo.get('tamano') == estado.st_size and previo.get('mtime') == estado.st_mtime_ns:
+            contenido = previo.get('hash')
+        else:
+            contenido = hash_archivo(in_path)
+            if previo.get('hash') == contenido:
+                # Mismo contenido (p. ej. solo se tocó el mtime): no volver a hashearlo
+                previo.update(tamano=estado.st_size, mtime=estado.st_mtime_ns)
+        vigente = (previo.get('hash') == contenido and previo.get('version') == version
+                   and os.path.exists(os.path.join(output_dir, previo.get('salida', fname))))
+        if forzar or not vigente:
+            pendientes.append((fname, in_path, contenido, estado.st_size, estado.st_mtime_ns))
+    return pendientes, len(entradas)
+
+
+def _podar(input_dir, output_dir, manifiesto):
+    """Quita del manifiesto las entradas borradas de input_dir y borra sus salidas; devuelve cuántas"""
+    borradas = [fname for fname in manifiesto if not os.path.exists(os.path.join(input_dir, fname))]
+    for fname in borradas:
+        salida = os.path.join(output_dir, manifiesto.pop(fname).get('salida', fname))
+        try:
+            os.remove(salida)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ No se pudo borrar la salida {salida}: {e}")
+    return len(borradas)
+
+
+def _procesar_tarea(tarea):
+    """Procesa una tarea (lista de entradas) y escribe sus salidas; corre en el pool o en el principal"""
+    procesar, por_lote, output_dir, entradas = tarea
+    if por_lote:
+        try:
+            resultados = procesar([in_path for _, in_path, *_ in entradas])
+        except Exception as e:
+            resultados = {in_path: e for _, in_path, *_ in entradas}
+    else:
+        resultados = {}
+        for _, in_path, *_ in entradas:
+            try:
+                resultados[in_path] = procesar(in_path)
+            except Exception as e:
+                resultados[in_path] = e
+
+    salida = []
+    for fname, in_path, contenido, tamano, mtime in entradas:
+        doc_chunks = resultados.get(in_path, RuntimeError("sin resultado"))
+        registro = {'archivo': fname, 'hash': contenido, 'tamano': tamano, 'mtime': mtime, 'chunks': 0, 'error': None}
+        try:
+            if isinstance(doc_chunks, Exception):
+                raise doc_chunks
+            escribir_json_atomico(os.path.join(output_dir, fname), doc_chunks)
+            registro['chunks'] = len(doc_chunks['chunks'])
+        except Exception as e:
+            registro['error'] = str(e) or type(e).__name__
+        salida.append(registro)
+    return salida
+
+
+def _formatear_duracion(segundos):
+    segundos = int(segundos)
+    if segundos >= 3600:
+        return f"{segundos // 3600}h{segundos % 3600 // 60:02d}m"
+    if segundos >= 60:
+        return f"{segundos // 60}m{segundos % 60:02d}s"
+    return f"{segundos}s"
+
+
+def ejecutar_chunqueo(procesar, input_dir, output_dir, version, procesos=None, por_lote=False,
+                      docs_por_lote=1, forzar=False, etiqueta='chunks'):
+    """
+    Ejecuta un chunker sobre las entradas nuevas o modificadas de input_dir.
+
+    Args:
+        procesar: Función de módulo (debe poder enviarse al pool). Por documento:
+            ruta -> {'documento_id', 'archivo', 'chunks': [...]}. Si por_lote:
+            [rutas] -> {ruta: resultado o excepción}
+        version: Versión del chunker (incluir los parámetros que cambian la salida)
+        procesos: Procesos del pool; 1 = en el proceso principal (siempre así si por_lote)
+
+    Returns:
+        Resumen con procesados, omitidos, eliminados, errores, chunks y duración
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifiesto = _cargar_manifiesto(output_dir)
+    eliminados = _podar(input_dir, output_dir, manifiesto)
+    pendientes, entradas = _pendientes(input_dir, output_dir, version, manifiesto, forzar)
+    total = len(pendientes)
+    omitidos = entradas - total
+    print(f"Procesando {total} documentos ({omitidos} sin cambios omitidos, {eliminados} borrados)...")
+
+    procesos = 1 if por_lote else (procesos or int(os.getenv('CHUNQUEO_PROCESOS', str(os.cpu_count() or 1))))
+    tamano_tarea = docs_por_lote if por_lote else max(1, min(16, total // (procesos * 4) or 1))
+    tareas = [(procesar, por_lote, output_dir, pendientes[i:i + tamano_tarea])
+              for i in range(0, total, tamano_tarea)]
+
+    resumen = {'procesados': 0, 'omitidos': omitidos, 'eliminados': eliminados, 'errores': 0, 'chunks': 0}
+    inicio = time.time()
+    ultimo_progreso = inicio
+    sin_guardar = 0
+
+    def _registrar(registros):
+        nonlocal ultimo_progreso, sin_guardar
+        for registro in registros:
+            fname = registro['archivo']
+            if registro['error']:
+                resumen['errores'] += 1
+                print(f"❌ Error procesando {fname}: {registro['error']}")
+                continue
+            resumen['procesados'] += 1
+            resumen['chunks'] += registro['chunks']
+            manifiesto[fname] = {
+                'hash': registro['hash'], 'tamano': registro['tamano'], 'mtime': registro['mtime'],
+                'version': version, 'salida': fname, 'chunks': registro['chunks'],
+                'fecha': datetime.now().isoformat(),
+            }
+            sin_guardar += 1
+            print(f"✅ {fname} → {registro['chunks']} {etiqueta}")
+        if sin_guardar >= GUARDAR_MANIFIESTO_CADA:
+            _guardar_manifiesto(output_dir, manifiesto)
+            sin_guardar = 0
+        ahora = time.time()
+        if ahora - ultimo_progreso >= PROGRESO_CADA_SEGUNDOS:
+            ultimo_progreso = ahora
+            hechos = resumen['procesados'] + resumen['errores']
+            ritmo = hechos / (ahora - inicio)
+            eta = (total - hechos) / ritmo if ritmo else 0
+            print(f"⏱️ {hechos}/{total} documentos · {ritmo:.1f} docs/s · "
+                  f"{resumen['chunks'] / (ahora - inicio):.1f} chunks/s · ETA {_formatear_duracion(eta)}")
+
+    try:
+        if procesos <= 1 or len(tareas) <= 1:
+            for tarea in tareas:
+                _registrar(_procesar_tarea(tarea))
+        else:
+            with multiprocessing.Pool(procesos) as pool:
+                for registros in pool.imap_unordered(_procesar_tarea, tareas):
+                    _registrar(registros)
+    finally:
+        _guardar_manifiesto(output_dir, manifiesto)
+
+    duracion = time.time() - inicio
+    resumen['duracion_s'] = round(duracion, 1)
+    print(f"📊 {resumen['procesados']} procesados, {resumen['omitidos']} sin cambios, {resumen['errores']} errores · "
+          f"{resumen['chunks']} {etiqueta} en {_formatear_duracion(duracion)} "
+          f"({resumen['procesados'] / max(duracion, 1e-9):.1f} docs/s, {resumen['chunks'] / max(duracion, 1e-9):.1f} chunks/s)")
+    return resumen
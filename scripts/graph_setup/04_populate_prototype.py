@@ -52,6 +52,17 @@ def main():
         default=None,
         help="Nombre del grafo (default: documentos_juridicos_graph)"
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Insertar nodos y relaciones por lotes con UNWIND (recomendado para el corpus completo)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos para parsear JSONs en paralelo (default: GRAPH_PARSE_WORKERS o 1)"
+    )
 
     args = parser.parse_args()
 
@@ -63,6 +74,7 @@ def main():
     print(f"   Documentos a procesar: {args.docs}")
     print(f"   Directorio JSON: {args.json_dir}")
     print(f"   Recrear grafo: {'Sí' if args.recrear else 'No'}")
+    print(f"   Carga masiva (bulk): {'Sí' if args.bulk else 'No'}")
     if args.graph_name:
         print(f"   Nombre del grafo: {args.graph_name}")
     print()
@@ -79,7 +91,7 @@ def main():
     if args.graph_name:
         config.graph_name = args.graph_name
 
-    builder = GraphBuilder(config)
+    builder = GraphBuilder(config, modo_bulk=args.bulk)
 
     # Verificar directorio
     json_dir = Path(args.json_dir)
@@ -104,7 +116,8 @@ def main():
         resultados = builder.construir_desde_directorio(
             json_dir=json_dir,
             limit=args.docs,
-            recrear_grafo=args.recrear
+            recrear_grafo=args.recrear,
+            workers=args.workers
         )
 
         # Éxito
@@ -4,12 +4,21 @@ Script de sincronización PostgreSQL → Apache AGE
 
 Puebla el grafo AGE con datos directamente desde las tablas de PostgreSQL.
 Crea nodos Persona desde la tabla 'personas' y relaciones MENCIONADO_EN con documentos.
+
+Con --incremental solo procesa los documentos agregados o modificados desde la
+última sincronización (marcas guardadas en la tabla graph_sync_estado). Los
+nombres ya sincronizados de cada documento quedan en graph_sync_personas_doc
+para recalcular también los pares que desaparecen de un documento modificado.
 """
 
 import sys
+import time
 import argparse
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2 import sql
+from psycopg2.extras import execute_values
 
 # Agregar path del proyecto
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
@@ -147,12 +156,15 @@ class PostgresAGESync:
 
         return results
 
-    def sync_relaciones_coocurrencia(self, dry_run: bool = False):
+    def sync_relaciones_coocurrencia(self, dry_run: bool = False, bulk: bool = True):
         """
         Crea relaciones CO_OCURRE_CON entre personas que aparecen en el mismo documento.
 
         Args:
             dry_run: Si True, solo simula sin escribir
+            bulk: Si True (default) calcula los pares en SQL, los deja en una tabla
+                  temporal y crea/actualiza todas las relaciones con sentencias de
+                  conjunto sobre la tabla de la etiqueta. Si False, un MERGE por par.
         """
         print("\n" + "="*60)
         print(f"🔗 SINCRONIZACIÓN DE RELACIONES CO-OCURRENCIA")
@@ -160,27 +172,16 @@ class PostgresAGESync:
             print("   [MODO DRY-RUN - NO SE ESCRIBIRÁ EN AGE]")
         print("="*60)
 
+        if bulk:
+            self._sync_coocurrencia_bulk(dry_run=dry_run)
+            return
+
         cur = self.pg_conn.cursor()
 
         # Obtener pares de personas que co-ocurren en documentos
         print(f"\n1️⃣  Obteniendo co-ocurrencias desde PostgreSQL...")
 
-        query = """
-            SELECT
-                p1.nombre as persona1,
-                p2.nombre as persona2,
-                COUNT(DISTINCT p1.documento_id) as documentos_compartidos
-            FROM personas p1
-            INNER JOIN personas p2 ON p1.documento_id = p2.documento_id
-            WHERE p1.nombre < p2.nombre  -- Evitar duplicados (A-B y B-A)
-              AND p1.nombre IS NOT NULL AND LENGTH(TRIM(p1.nombre)) > 2
-              AND p2.nombre IS NOT NULL AND LENGTH(TRIM(p2.nombre)) > 2
-              AND p1.nombre ~ '[A-Za-záéíóúñÁÉÍÓÚÑ]'
-              AND p2.nombre ~ '[A-Za-záéíóúñÁÉÍÓÚÑ]'
-            GROUP BY p1.nombre, p2.nombre
-            HAVING COUNT(DISTINCT p1.documento_id) >= 1
-            ORDER BY documentos_compartidos DESC
-        """
+        query = self.QUERY_COOCURRENCIAS + " ORDER BY documentos_compartidos DESC"
 
         cur.execute(query)
         coocurrencias = cur.fetchall()
@@ -205,22 +206,7 @@ class PostgresAGESync:
             try:
                 if not dry_run:
                     # Crear relación CO_OCURRE_CON
-                    cypher = f"""
-                    MATCH (p1:Persona {{nombre: '{self._escape_cypher(persona1)}'}}),
-                          (p2:Persona {{nombre: '{self._escape_cypher(persona2)}'}})
-                    MERGE (p1)-[r:CO_OCURRE_CON]->(p2)
-                    SET r.documentos_compartidos = {docs_compartidos}
-                    RETURN r
-                    """
-
-                    result = self.age_connector.execute_cypher(
-                        cypher,
-                        parameters=None,
-                        graph_name=self.config.graph_name,
-                        column_definitions=["r agtype"]
-                    )
-
-                    if result:
+                    if self._merge_coocurrencia(persona1, persona2, docs_compartidos):
                         relaciones_creadas += 1
                 else:
                     if i <= 10:  # Mostrar solo las primeras 10 en dry-run
@@ -238,13 +224,255 @@ class PostgresAGESync:
         print(f"  Errores:              {errores}")
         print("="*60)
 
-    def sync_relaciones_llm(self, limit: int = None, dry_run: bool = False):
+    # Pares (persona1 < persona2) con al menos un documento compartido
+    QUERY_COOCURRENCIAS = """
+        SELECT
+            p1.nombre as persona1,
+            p2.nombre as persona2,
+            COUNT(DISTINCT p1.documento_id) as documentos_compartidos
+        FROM personas p1
+        INNER JOIN personas p2 ON p1.documento_id = p2.documento_id
+        WHERE p1.nombre < p2.nombre  -- Evitar duplicados (A-B y B-A)
+          AND p1.nombre IS NOT NULL AND LENGTH(TRIM(p1.nombre)) > 2
+          AND p2.nombre IS NOT NULL AND LENGTH(TRIM(p2.nombre)) > 2
+          AND p1.nombre ~ '[A-Za-záéíóúñÁÉÍÓÚÑ]'
+          AND p2.nombre ~ '[A-Za-záéíóúñÁÉÍÓÚÑ]'
+        GROUP BY p1.nombre, p2.nombre
+    """
+
+    def _crear_staging_coocurrencia(self, cur):
+        """Crea (vacía) la tabla temporal de pares de co-ocurrencia"""
+        cur.execute("DROP TABLE IF EXISTS tmp_coocurrencia")
+        cur.execute("""
+            CREATE TEMP TABLE tmp_coocurrencia (
+                persona1 TEXT NOT NULL,
+                persona2 TEXT NOT NULL,
+                docs INTEGER NOT NULL
+            )
+        """)
+
+    def _sync_coocurrencia_bulk(self, dry_run: bool = False):
+        """Sincronización de co-ocurrencias completa basada en conjuntos"""
+        with self.age_connector.get_connection() as conn:
+            cur = conn.cursor()
+            try:
+                print(f"\n1️⃣  Calculando co-ocurrencias en PostgreSQL...")
+                inicio = time.time()
+                self._crear_staging_coocurrencia(cur)
+                cur.execute(
+                    "INSERT INTO tmp_coocurrencia (persona1, persona2, docs) "
+                    + self.QUERY_COOCURRENCIAS
+                )
+                total = cur.rowcount
+                print(f"   ✅ {total:,} co-ocurrencias en {time.time() - inicio:.1f}s")
+
+                if total == 0:
+                    print("   ⚠️  No hay co-ocurrencias para sincronizar")
+                    return
+
+                if dry_run:
+                    cur.execute("""
+                        SELECT persona1, persona2, docs FROM tmp_coocurrencia
+                        ORDER BY docs DESC LIMIT 10
+                    """)
+                    for persona1, persona2, docs in cur.fetchall():
+                        print(f"   [DRY-RUN] {persona1} <-> {persona2} ({docs} docs)")
+                    return
+
+                print(f"\n2️⃣  Volcando relaciones en AGE...")
+                resultado = self._volcar_coocurrencias_staging(conn, cur)
+            finally:
+                cur.close()
+                self._descartar_temporales(conn, 'tmp_coocurrencia')
+
+        self.stats['relaciones_creadas'] += resultado['creadas']
+
+        print(f"\n✅ Relaciones sincronizadas")
+        print(f"="*60)
+        print(f"  Relaciones creadas:       {resultado['creadas']:,}")
+        print(f"  Relaciones actualizadas:  {resultado['actualizadas']:,}")
+        print(f"  Pares sin nodo Persona:   {resultado['sin_nodo']:,}")
+        print("="*60)
+
+    def _descartar_temporales(self, conn, *tablas: str):
+        """
+        Borra tablas temporales al salir de un bloque, haya fallado o no.
+
+        Si el bloque falló la transacción está abortada y el DROP lanzaría
+        InFailedSqlTransaction: primero rollback (lo bueno ya tiene commit por
+        tramo). Un error aquí se informa sin ocultar la excepción original.
+        """
+        try:
+            conn.rollback()
+            cur = conn.cursor()
+            try:
+                for tabla in tablas:
+                    cur.execute(f"DROP TABLE IF EXISTS {tabla}")
+            finally:
+                cur.close()
+            conn.commit()
+        except Exception as e:
+            print(f"   ⚠️  No se pudieron borrar {', '.join(tablas)}: {e}")
+
+    def _volcar_coocurrencias_staging(self, conn, cur, lote: int = 50000) -> Dict:
+        """
+        Crea, actualiza o elimina las relaciones CO_OCURRE_CON de los pares en tmp_coocurrencia.
+
+        Trabaja directamente sobre la tabla de la etiqueta de AGE: resuelve los
+        nombres a ids de vértice una sola vez, luego DELETE de los pares con
+        docs = 0, UPDATE de las relaciones existentes e INSERT de las faltantes,
+        por tramos de `lote` pares. docs es siempre el valor absoluto, así que
+        repetir el volcado deja el mismo resultado.
+
+        Args:
+            conn: Conexión con AGE cargado (del pool de AGEConnector)
+            cur: Cursor de esa conexión
+            lote: Pares por tramo (commit y progreso por tramo)
+
+        Returns:
+            Dict con 'creadas', 'actualizadas', 'eliminadas' y 'sin_nodo'
+        """
+        graph = self.config.graph_name
+        grafo = sql.Identifier(graph)
+        etiqueta = sql.Identifier('CO_OCURRE_CON')
+
+        # La etiqueta de relación debe existir para insertar en su tabla
+        cur.execute("""
+            SELECT 1 FROM ag_catalog.ag_label l
+            JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+            WHERE g.name = %s AND l.name = 'CO_OCURRE_CON'
+        """, (graph,))
+        if cur.fetchone() is None:
+            cur.execute("SELECT ag_catalog.create_elabel(%s, 'CO_OCURRE_CON')", (graph,))
+        cur.execute(sql.SQL(
+            "CREATE INDEX IF NOT EXISTS idx_co_ocurre_con_extremos ON {}.{} (start_id, end_id)"
+        ).format(grafo, etiqueta))
+
+        # nombre -> id de vértice Persona
+        cur.execute("DROP TABLE IF EXISTS tmp_persona_ids")
+        cur.execute(sql.SQL("""
+            CREATE TEMP TABLE tmp_persona_ids AS
+            SELECT DISTINCT ON (nombre) nombre, id
+            FROM (
+                SELECT ag_catalog.agtype_access_operator(
+                           VARIADIC ARRAY[properties, '"nombre"'::ag_catalog.agtype]
+                       )::text::jsonb #>> '{{}}' AS nombre,
+                       id
+                FROM {}."Persona"
+            ) s
+            WHERE nombre IS NOT NULL
+            ORDER BY nombre, id
+        """).format(grafo))
+        cur.execute("CREATE INDEX ON tmp_persona_ids (nombre)")
+
+        cur.execute("DROP TABLE IF EXISTS tmp_pares_ids")
+        cur.execute("""
+            CREATE TEMP TABLE tmp_pares_ids AS
+            SELECT row_number() OVER () AS fila, a.id AS start_id, b.id AS end_id, t.docs
+            FROM tmp_coocurrencia t
+            JOIN tmp_persona_ids a ON a.nombre = t.persona1
+            JOIN tmp_persona_ids b ON b.nombre = t.persona2
+        """)
+        resueltos = cur.rowcount
+        cur.execute("SELECT COUNT(*) FROM tmp_coocurrencia")
+        sin_nodo = cur.fetchone()[0] - resueltos
+        cur.execute("CREATE INDEX ON tmp_pares_ids (fila)")
+        conn.commit()
+
+        delete = sql.SQL("""
+            DELETE FROM {}.{} e
+            USING tmp_pares_ids t
+            WHERE t.fila > %s AND t.fila <= %s AND t.docs = 0
+              AND e.start_id = t.start_id AND e.end_id = t.end_id
+        """).format(grafo, etiqueta)
+
+        update = sql.SQL("""
+            UPDATE {}.{} e
+            SET properties = ('{{"documentos_compartidos": ' || t.docs || '}}')::ag_catalog.agtype
+            FROM tmp_pares_ids t
+            WHERE t.fila > %s AND t.fila <= %s AND t.docs > 0
+              AND e.start_id = t.start_id AND e.end_id = t.end_id
+        """).format(grafo, etiqueta)
+
+        insert = sql.SQL("""
+            INSERT INTO {}.{} (start_id, end_id, properties)
+            SELECT t.start_id, t.end_id,
+                   ('{{"documentos_compartidos": ' || t.docs || '}}')::ag_catalog.agtype
+            FROM tmp_pares_ids t
+            WHERE t.fila > %s AND t.fila <= %s AND t.docs > 0
+              AND NOT EXISTS (
+                  SELECT 1 FROM {}.{} e
+                  WHERE e.start_id = t.start_id AND e.end_id = t.end_id
+              )
+        """).format(grafo, etiqueta, grafo, etiqueta)
+
+        creadas = actualizadas = eliminadas = 0
+        inicio = time.time()
+        try:
+            for desde in range(0, resueltos, lote):
+                hasta = desde + lote
+                cur.execute(delete, (desde, hasta))
+                eliminadas += cur.rowcount
+                cur.execute(update, (desde, hasta))
+                actualizadas += cur.rowcount
+                cur.execute(insert, (desde, hasta))
+                creadas += cur.rowcount
+                conn.commit()
+
+                hechos = min(hasta, resueltos)
+                transcurrido = time.time() - inicio
+                print(f"   {hechos:,}/{resueltos:,} pares "
+                      f"({hechos * 100 // resueltos}%) - {transcurrido:.1f}s")
+        finally:
+            self._descartar_temporales(conn, 'tmp_pares_ids', 'tmp_persona_ids')
+
+        return {'creadas': creadas, 'actualizadas': actualizadas, 'eliminadas': eliminadas, 'sin_nodo': sin_nodo}
+
+    def _merge_coocurrencia(self, persona1: str, persona2: str, docs: int, acumular: bool = False) -> bool:
+        """
+        Crea o actualiza una relación CO_OCURRE_CON.
+
+        Args:
+            persona1, persona2: Nombres de las personas
+            docs: Documentos compartidos (valor absoluto, o delta si acumular=True)
+            acumular: Si True suma docs al peso existente en lugar de reemplazarlo
+        """
+        if acumular:
+            peso = f"coalesce(r.documentos_compartidos, 0) + {docs}"
+        else:
+            peso = f"{docs}"
+
+        cypher = f"""
+        MATCH (p1:Persona {{nombre: '{self._escape_cypher(persona1)}'}}),
+              (p2:Persona {{nombre: '{self._escape_cypher(persona2)}'}})
+        MERGE (p1)-[r:CO_OCURRE_CON]->(p2)
+        SET r.documentos_compartidos = {peso}
+        RETURN r
+        """
+
+        result = self.age_connector.execute_cypher(
+            cypher,
+            parameters=None,
+            graph_name=self.config.graph_name,
+            column_definitions=["r agtype"]
+        )
+        return bool(result)
+
+    def sync_relaciones_llm(
+        self,
+        limit: int = None,
+        dry_run: bool = False,
+        id_desde: Optional[int] = None,
+        id_hasta: Optional[int] = None
+    ):
         """
         Sincroniza relaciones extraídas por LLM desde la tabla relaciones_extraidas.
 
         Args:
             limit: Límite de relaciones a procesar (None = todas)
             dry_run: Si True, solo simula sin escribir
+            id_desde: Solo relaciones con id > id_desde (sincronización incremental)
+            id_hasta: Solo relaciones con id <= id_hasta
         """
         print("\n" + "="*60)
         print(f"🤖 SINCRONIZACIÓN DE RELACIONES LLM")
@@ -288,13 +516,14 @@ class PostgresAGESync:
               AND entidad_destino IS NOT NULL
               AND LENGTH(TRIM(entidad_origen)) > 2
               AND LENGTH(TRIM(entidad_destino)) > 2
+              AND id > %s AND id <= %s
             ORDER BY id
         """
 
         if limit:
             query += f" LIMIT {limit}"
 
-        cur.execute(query)
+        cur.execute(query, (id_desde or 0, id_hasta if id_hasta is not None else 2**31 - 1))
         relaciones = cur.fetchall()
         cur.close()
 
@@ -396,22 +625,7 @@ class PostgresAGESync:
 
             try:
                 if not dry_run:
-                    # Crear nodo Persona (MERGE para evitar duplicados)
-                    # AGE no soporta ON CREATE/ON MATCH, así que usamos MERGE simple
-                    cypher_create_persona = f"""
-                    MERGE (p:Persona {{nombre: '{self._escape_cypher(nombre)}'}})
-                    SET p.menciones = {menciones}
-                    RETURN id(p) as persona_id
-                    """
-
-                    result = self.age_connector.execute_cypher(
-                        cypher_create_persona,
-                        parameters=None,
-                        graph_name=self.config.graph_name,
-                        column_definitions=["persona_id agtype"]
-                    )
-
-                    if result:
+                    if self._merge_persona(nombre, menciones):
                         self.stats['personas_procesadas'] += 1
                         self.stats['personas_nuevas'] += 1
                     else:
@@ -428,6 +642,285 @@ class PostgresAGESync:
         print(f"\n✅ Sincronización completada")
         self._print_stats()
 
+    def _merge_persona(self, nombre: str, menciones: int) -> bool:
+        """Crea el nodo Persona si no existe y actualiza sus menciones."""
+        # AGE no soporta ON CREATE/ON MATCH, así que usamos MERGE simple
+        cypher_create_persona = f"""
+        MERGE (p:Persona {{nombre: '{self._escape_cypher(nombre)}'}})
+        SET p.menciones = {menciones}
+        RETURN id(p) as persona_id
+        """
+
+        result = self.age_connector.execute_cypher(
+            cypher_create_persona,
+            parameters=None,
+            graph_name=self.config.graph_name,
+            column_definitions=["persona_id agtype"]
+        )
+        return bool(result)
+
+    # =========================================================
+    # SINCRONIZACIÓN INCREMENTAL
+    # =========================================================
+
+    # Nombres válidos para pares de co-ocurrencia (mismo criterio que QUERY_COOCURRENCIAS)
+    FILTRO_NOMBRE_PAR = """
+        nombre IS NOT NULL AND LENGTH(TRIM(nombre)) > 2
+        AND nombre ~ '[A-Za-záéíóúñÁÉÍÓÚÑ]'
+    """
+
+    def _asegurar_tabla_estado(self):
+        """Crea las tablas de marcas y de nombres sincronizados si no existen"""
+        cur = self.pg_conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS graph_sync_estado (
+                proceso VARCHAR(50) PRIMARY KEY,
+                ultimo_id INTEGER NOT NULL DEFAULT 0,
+                marca_tiempo TIMESTAMP,
+                actualizado TIMESTAMP DEFAULT NOW()
+            );
+        """)
+        # Nombres de cada documento tal como quedaron en el grafo: al modificarse
+        # el documento, sus pares anteriores también se recalculan
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS graph_sync_personas_doc (
+                documento_id INTEGER NOT NULL,
+                nombre TEXT NOT NULL,
+                PRIMARY KEY (documento_id, nombre)
+            );
+        """)
+        self.pg_conn.commit()
+        cur.close()
+
+    def _leer_marca(self, proceso: str) -> Optional[Tuple]:
+        """Retorna (ultimo_id, marca_tiempo) del proceso o None si nunca se sincronizó"""
+        cur = self.pg_conn.cursor()
+        cur.execute(
+            "SELECT ultimo_id, marca_tiempo FROM graph_sync_estado WHERE proceso = %s",
+            (proceso,)
+        )
+        row = cur.fetchone()
+        cur.close()
+        return row
+
+    def _guardar_marca(self, cur, proceso: str, ultimo_id: int, marca_tiempo=None):
+        """Registra hasta dónde se sincronizó un proceso (sin commit: lo hace _registrar_estado)"""
+        cur.execute("""
+            INSERT INTO graph_sync_estado (proceso, ultimo_id, marca_tiempo, actualizado)
+            VALUES (%s, %s, %s, NOW())
+            ON CONFLICT (proceso) DO UPDATE
+            SET ultimo_id = EXCLUDED.ultimo_id,
+                marca_tiempo = EXCLUDED.marca_tiempo,
+                actualizado = NOW()
+        """, (proceso, ultimo_id, marca_tiempo))
+
+    def _registrar_estado(self, marcas: Dict, desde_doc: Optional[int] = None,
+                          docs_modificados: Optional[List[int]] = None):
+        """
+        Guarda las marcas y los nombres sincronizados en una sola transacción.
+
+        Args:
+            marcas: Resultado de _marcas_actuales() tomado ANTES de sincronizar
+            desde_doc: Marca anterior de documentos; None = sincronización completa
+                       (se reemplazan los nombres de todos los documentos)
+            docs_modificados: Documentos ya sincronizados que se volvieron a procesar
+        """
+        cur = self.pg_conn.cursor()
+        try:
+            if desde_doc is None:
+                cur.execute("TRUNCATE graph_sync_personas_doc")
+                cur.execute(f"""
+                    INSERT INTO graph_sync_personas_doc (documento_id, nombre)
+                    SELECT DISTINCT documento_id, nombre FROM personas
+                    WHERE documento_id <= %s AND {self.FILTRO_NOMBRE_PAR}
+                """, (marcas['documentos'],))
+            else:
+                docs_modificados = docs_modificados or []
+                cur.execute("""
+                    DELETE FROM graph_sync_personas_doc
+                    WHERE (documento_id > %s AND documento_id <= %s) OR documento_id = ANY(%s)
+                """, (desde_doc, marcas['documentos'], docs_modificados))
+                cur.execute(f"""
+                    INSERT INTO graph_sync_personas_doc (documento_id, nombre)
+                    SELECT DISTINCT documento_id, nombre FROM personas
+                    WHERE ((documento_id > %s AND documento_id <= %s) OR documento_id = ANY(%s))
+                      AND {self.FILTRO_NOMBRE_PAR}
+                """, (desde_doc, marcas['documentos'], docs_modificados))
+            self._guardar_marca(cur, 'documentos', marcas['documentos'], marcas['updated_at'])
+            self._guardar_marca(cur, 'relaciones_llm', marcas['relaciones_llm'])
+            self.pg_conn.commit()
+        except Exception:
+            self.pg_conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def _marcas_actuales(self) -> Dict:
+        """Máximos actuales de las tablas fuente (límite superior de esta corrida)"""
+        cur = self.pg_conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(id), 0), MAX(updated_at) FROM documentos")
+        max_doc, max_updated = cur.fetchone()
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM relaciones_extraidas")
+        max_rel = cur.fetchone()[0]
+        cur.close()
+        return {'documentos': max_doc, 'updated_at': max_updated, 'relaciones_llm': max_rel}
+
+    def registrar_sync_completo(self, marcas: Optional[Dict] = None):
+        """
+        Tras una sincronización completa, fija las marcas.
+
+        Args:
+            marcas: _marcas_actuales() tomadas antes de empezar la corrida; lo
+                    insertado mientras corría queda para la próxima incremental
+        """
+        self._asegurar_tabla_estado()
+        self._registrar_estado(marcas or self._marcas_actuales())
+
+    def sync_incremental(self, dry_run: bool = False):
+        """
+        Sincroniza solo lo agregado o modificado desde la última corrida.
+
+        - Pares de co-ocurrencia afectados: los de documentos nuevos (id > marca),
+          los actuales de documentos modificados (updated_at > marca, id <= marca)
+          y los que esos documentos tenían en la corrida anterior
+          (graph_sync_personas_doc). Todos se recalculan en valor absoluto; los
+          que quedan en 0 se eliminan. Repetir una corrida interrumpida no
+          cuenta dos veces.
+        - Personas de esos documentos: MERGE con menciones recalculadas.
+        - relaciones_extraidas con id > marca.
+
+        Las marcas se toman antes de leer nada y se guardan al final, junto con
+        los nombres sincronizados, en una sola transacción.
+        Si no hay marcas previas hace una sincronización completa.
+        """
+        print("\n" + "="*60)
+        print(f"⏩ SINCRONIZACIÓN INCREMENTAL")
+        if dry_run:
+            print("   [MODO DRY-RUN - NO SE ESCRIBIRÁ EN AGE]")
+        print("="*60)
+
+        self._asegurar_tabla_estado()
+        marca_docs = self._leer_marca('documentos')
+        marca_rel = self._leer_marca('relaciones_llm')
+        actuales = self._marcas_actuales()
+
+        if marca_docs is None:
+            print("   ⚠️  Sin marcas previas: se ejecuta sincronización completa")
+            self.sync_personas_to_age(dry_run=dry_run)
+            self.sync_relaciones_coocurrencia(dry_run=dry_run)
+            self.sync_relaciones_llm(dry_run=dry_run)
+            if not dry_run:
+                self.registrar_sync_completo(actuales)
+            return
+
+        ultimo_doc, ultima_fecha = marca_docs
+        hasta_doc = actuales['documentos']
+        if actuales['updated_at'] is None:
+            actuales['updated_at'] = ultima_fecha
+
+        cur = self.pg_conn.cursor()
+
+        # Documentos modificados ya sincronizados antes
+        docs_modificados = []
+        if ultima_fecha is not None:
+            cur.execute(
+                "SELECT id FROM documentos WHERE id <= %s AND updated_at > %s",
+                (ultimo_doc, ultima_fecha)
+            )
+            docs_modificados = [row[0] for row in cur.fetchall()]
+
+        print(f"\n📄 Documentos nuevos:      {max(0, hasta_doc - ultimo_doc)} (id {ultimo_doc} → {hasta_doc})")
+        print(f"📝 Documentos modificados: {len(docs_modificados)}")
+
+        # 1. Pares afectados (nuevos, actuales y anteriores) recalculados en valor absoluto
+        cur.execute(f"""
+            WITH nombres AS (
+                SELECT documento_id, nombre FROM personas
+                WHERE ((documento_id > %s AND documento_id <= %s) OR documento_id = ANY(%s))
+                  AND {self.FILTRO_NOMBRE_PAR}
+                UNION
+                SELECT documento_id, nombre FROM graph_sync_personas_doc
+                WHERE documento_id = ANY(%s)
+            ),
+            pares AS (
+                SELECT DISTINCT n1.nombre AS a, n2.nombre AS b
+                FROM nombres n1
+                INNER JOIN nombres n2 ON n1.documento_id = n2.documento_id
+                WHERE n1.nombre < n2.nombre
+            )
+            SELECT pa.a, pa.b, COUNT(DISTINCT y.documento_id)
+            FROM pares pa
+            LEFT JOIN personas x ON x.nombre = pa.a AND x.documento_id <= %s
+            LEFT JOIN personas y ON y.documento_id = x.documento_id AND y.nombre = pa.b
+            GROUP BY pa.a, pa.b
+        """, (ultimo_doc, hasta_doc, docs_modificados, docs_modificados, hasta_doc))
+        pares = {(a, b): n for a, b, n in cur.fetchall()}
+
+        # 2. Personas afectadas (menciones recalculadas solo para esos nombres)
+        cur.execute("""
+            SELECT p.nombre, COUNT(*) AS menciones
+            FROM personas p
+            WHERE p.nombre IN (
+                SELECT DISTINCT nombre FROM personas
+                WHERE (documento_id > %s AND documento_id <= %s) OR documento_id = ANY(%s)
+            )
+              AND LENGTH(TRIM(p.nombre)) > 2
+              AND p.nombre ~ '[A-Za-záéíóúñÁÉÍÓÚÑ]'
+              AND NOT (p.nombre ~ '^[0-9]+$')
+              AND NOT (p.nombre ~ '^[^A-Za-z]')
+            GROUP BY p.nombre
+        """, (ultimo_doc, hasta_doc, docs_modificados))
+        personas = cur.fetchall()
+        cur.close()
+
+        print(f"👥 Personas afectadas:     {len(personas)}")
+        print(f"🔗 Pares recalculados:     {len(pares)}")
+        print(f"✂️  Pares que desaparecen:  {sum(1 for n in pares.values() if n == 0)}")
+
+        if dry_run:
+            for (a, b), n in list(pares.items())[:10]:
+                print(f"   [DRY-RUN] {a} <-> {b} ({n} docs)")
+        else:
+            for nombre, menciones in personas:
+                try:
+                    if self._merge_persona(nombre, menciones):
+                        self.stats['personas_procesadas'] += 1
+                except Exception as e:
+                    print(f"   ❌ Error procesando '{nombre}': {e}")
+                    self.stats['errores'] += 1
+
+            if pares:
+                with self.age_connector.get_connection() as conn:
+                    cur = conn.cursor()
+                    try:
+                        self._crear_staging_coocurrencia(cur)
+                        execute_values(
+                            cur,
+                            "INSERT INTO tmp_coocurrencia (persona1, persona2, docs) VALUES %s",
+                            [(a, b, n) for (a, b), n in pares.items()],
+                            page_size=5000
+                        )
+                        resultado = self._volcar_coocurrencias_staging(conn, cur)
+                        self.stats['relaciones_creadas'] += resultado['creadas']
+                    finally:
+                        cur.close()
+                        self._descartar_temporales(conn, 'tmp_coocurrencia')
+
+        # 3. Relaciones LLM nuevas
+        ultimo_rel = marca_rel[0] if marca_rel else 0
+        if actuales['relaciones_llm'] > ultimo_rel:
+            self.sync_relaciones_llm(
+                dry_run=dry_run,
+                id_desde=ultimo_rel,
+                id_hasta=actuales['relaciones_llm']
+            )
+
+        if not dry_run:
+            self._registrar_estado(actuales, desde_doc=ultimo_doc, docs_modificados=docs_modificados)
+
+        print(f"\n✅ Sincronización incremental completada")
+        self._print_stats()
+
     def _escape_cypher(self, text: str) -> str:
         """Escapa comillas simples para Cypher"""
         if not text:
@@ -487,6 +980,11 @@ def main():
         action="store_true",
         help="Sincronizar relaciones extraídas por LLM"
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Sincronizar solo documentos/relaciones nuevos o modificados desde la última corrida"
+    )
 
     args = parser.parse_args()
 
@@ -513,6 +1011,18 @@ def main():
                 print("❌ Operación cancelada")
                 return 1
 
+        if args.incremental:
+            syncer.sync_incremental(dry_run=args.dry_run)
+            syncer.close()
+            return 0
+
+        # Marcas tomadas antes de sincronizar: lo que se inserte durante la
+        # corrida queda para la próxima incremental
+        registrar_marcas = args.relaciones and args.llm and not args.limit and not args.dry_run
+        if registrar_marcas:
+            syncer._asegurar_tabla_estado()
+            marcas = syncer._marcas_actuales()
+
         # Sincronizar personas
         syncer.sync_personas_to_age(limit=args.limit, dry_run=args.dry_run)
 
@@ -524,6 +1034,10 @@ def main():
         if args.llm:
             syncer.sync_relaciones_llm(limit=args.limit, dry_run=args.dry_run)
 
+        # Una corrida completa deja las marcas al día para las incrementales
+        if registrar_marcas:
+            syncer.registrar_sync_completo(marcas)
+
         syncer.close()
         return 0
 
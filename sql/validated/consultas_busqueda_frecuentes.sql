@@ -99,6 +99,229 @@ SELECT
         )
     ) as estadisticas;
 
+-- Vista materializada: Matriz de co-ocurrencia persona-persona
+-- Ambas direcciones (A->B y B->A) para que la vecindad de una persona sea
+-- un único barrido de índice por persona_a (botón 🌐 del listado de víctimas)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_personas_coocurrencia AS
+SELECT
+    p1.nombre as persona_a,
+    COALESCE(p1.tipo, '') as tipo_a,
+    p2.nombre as persona_b,
+    COALESCE(p2.tipo, '') as tipo_b,
+    COUNT(DISTINCT p1.documento_id) as n_docs
+FROM personas p1
+JOIN personas p2 ON p1.documento_id = p2.documento_id
+WHERE p1.nombre != p2.nombre
+  AND p1.nombre IS NOT NULL AND trim(p1.nombre) != ''
+  AND p2.nombre IS NOT NULL AND trim(p2.nombre) != ''
+GROUP BY p1.nombre, COALESCE(p1.tipo, ''), p2.nombre, COALESCE(p2.tipo, '');
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_personas_coocurrencia
+ON mv_personas_coocurrencia (persona_a, tipo_a, persona_b, tipo_b);
+CREATE INDEX IF NOT EXISTS idx_mv_personas_coocurrencia_vecindad
+ON mv_personas_coocurrencia (persona_a, n_docs DESC);
+CREATE INDEX IF NOT EXISTS idx_mv_personas_coocurrencia_trgm
+ON mv_personas_coocurrencia USING gin (LOWER(persona_a) gin_trgm_ops);
+
+-- =====================================================================
+-- RESOLUCIÓN DE NOMBRES (NameIndex, core/name_index.py)
+-- =====================================================================
+
+-- unaccent() es STABLE y no puede usarse en un índice; este envoltorio fija
+-- el diccionario y se declara IMMUTABLE para indexar la forma normalizada
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+CREATE OR REPLACE FUNCTION normalizar_nombre(texto text)
+RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, lower(texto))
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+-- Filtros "normalizar_nombre(col) LIKE normalizar_nombre('%x%')" servidos por índice
+CREATE INDEX IF NOT EXISTS idx_personas_nombre_norm_trgm
+ON personas USING gin (normalizar_nombre(nombre) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_relaciones_origen_norm_trgm
+ON relaciones_extraidas USING gin (normalizar_nombre(entidad_origen) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_relaciones_destino_norm_trgm
+ON relaciones_extraidas USING gin (normalizar_nombre(entidad_destino) gin_trgm_ops);
+
+-- Vista materializada: Nombres canónicos (un registro por nombre y tipo)
+-- Candidatos con puntaje para NameIndex.resolver() sin recorrer personas
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_nombres_personas AS
+SELECT
+    p.nombre,
+    normalizar_nombre(p.nombre) as nombre_norm,
+    COALESCE(p.tipo, '') as tipo,
+    COUNT(*) as menciones,
+    COUNT(DISTINCT p.documento_id) as documentos
+FROM personas p
+WHERE p.nombre IS NOT NULL AND trim(p.nombre) != ''
+GROUP BY p.nombre, COALESCE(p.tipo, '');
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_nombres_personas
+ON mv_nombres_personas (nombre, tipo);
+CREATE INDEX IF NOT EXISTS idx_mv_nombres_personas_trgm
+ON mv_nombres_personas USING gin (nombre_norm gin_trgm_ops);
+
+-- Vista materializada: Listado paginado de víctimas (obtener_pagina_victimas)
+-- posicion permite saltar a la página N con un rango de índice y
+-- (menciones, nombre) sirve de clave para paginación por cursor (keyset).
+-- El total es MAX(posicion): se recalcula solo al refrescar tras una ingesta.
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_victimas_menciones AS
+SELECT
+    v.nombre,
+    v.menciones,
+    ROW_NUMBER() OVER (ORDER BY v.menciones DESC, v.nombre DESC) as posicion
+FROM (
+    SELECT nombre, COUNT(*) as menciones
+    FROM personas
+    WHERE tipo ILIKE '%victim%' AND tipo NOT ILIKE '%victimario%'
+      AND nombre IS NOT NULL
+    GROUP BY nombre
+) v;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_victimas_menciones
+ON mv_victimas_menciones (nombre);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_victimas_menciones_posicion
+ON mv_victimas_menciones (posicion);
+CREATE INDEX IF NOT EXISTS idx_mv_victimas_menciones_keyset
+ON mv_victimas_menciones (menciones DESC, nombre DESC);
+
+-- Vista materializada: Opciones de filtros (GET /api/v1/opciones/filtros)
+-- Una sola fila con todas las listas; misma lógica que las funciones
+-- obtener_opciones_* de core/consultas.py. generado identifica la versión
+-- (ETag) para la caché en memoria de obtener_snapshot_opciones().
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_opciones_filtros AS
+SELECT
+    1 as id,
+    now() as generado,
+    COALESCE((
+        SELECT jsonb_agg(nuc ORDER BY docs DESC, nuc)
+        FROM (
+            SELECT COALESCE(m.nuc, d.nuc) as nuc, COUNT(*) as docs
+            FROM documentos d
+            LEFT JOIN metadatos m ON d.id = m.documento_id
+            WHERE COALESCE(m.nuc, d.nuc) IS NOT NULL
+              AND LENGTH(COALESCE(m.nuc, d.nuc)) BETWEEN 21 AND 23
+              AND COALESCE(m.nuc, d.nuc) ~ '^[0-9]+$'
+            GROUP BY COALESCE(m.nuc, d.nuc)
+            ORDER BY docs DESC, nuc
+            LIMIT 50
+        ) x
+    ), '[]'::jsonb) as nucs,
+    COALESCE((
+        SELECT jsonb_agg(departamento_norm ORDER BY departamento_norm)
+        FROM (
+            SELECT departamento_norm
+            FROM (
+                SELECT
+                    CASE
+                        -- Normalizar Antioquia
+                        WHEN departamento ILIKE '%Antioqu%' THEN 'Antioquia'
+
+                        -- Normalizar Bogotá (todas las variantes)
+                        WHEN departamento ILIKE '%Bogot%'
+                          OR departamento ILIKE '%D.C%'
+                          OR departamento = 'D.E.'
+                          OR departamento = 'Distrito Capital'
+                          OR departamento = 'Distrito de Columbia' THEN 'Bogotá D.C.'
+
+                        -- Normalizar Cesar
+                        WHEN departamento ILIKE '%Ces%r%' THEN 'Cesar'
+
+                        -- Normalizar Valle del Cauca
+                        WHEN departamento ILIKE '%Valle del Cauca%'
+                          OR departamento = 'Valle' THEN 'Valle del Cauca'
+
+                        -- Normalizar La Guajira
+                        WHEN departamento = 'Guajira'
+                          OR departamento = 'La Guajira' THEN 'La Guajira'
+
+                        -- Normalizar Norte de Santander
+                        WHEN departamento = 'Norte de Santander' THEN 'Norte de Santander'
+
+                        -- EXCLUIR datos inválidos
+                        -- Códigos y no disponibles
+                        WHEN departamento IN ('00', '00 - TODOS', 'No disponible', 'No especificado', 'CES', 'TCO008', 'S') THEN NULL
+
+                        -- Países/estados extranjeros
+                        WHEN departamento IN ('A Coruña', 'Columbia', 'Maryland', 'Nueva York', 'Jalisco', 'La Libertad') THEN NULL
+
+                        -- Regiones inventadas o composiciones
+                        WHEN departamento ILIKE '%Orinoquía%' THEN NULL
+                        WHEN departamento ILIKE '%Santander del Sur%' THEN NULL
+                        WHEN departamento ILIKE '%Santander-Cauca%' THEN NULL
+                        WHEN departamento ILIKE '%Valle de Aburrá%' THEN NULL
+
+                        -- Múltiples departamentos (contienen comas o "y")
+                        WHEN departamento LIKE '%,%' OR departamento LIKE '% y %' THEN NULL
+
+                        -- Ciudades específicas (no son departamentos)
+                        WHEN departamento IN ('San Gil', 'Cali', 'Bucaramanga', 'Medellín', 'Mampuján', 'Cartagena') THEN NULL
+
+                        -- Mantener departamentos válidos
+                        ELSE departamento
+                    END as departamento_norm,
+                    COUNT(*) as docs
+                FROM analisis_lugares
+                WHERE departamento IS NOT NULL AND departamento != ''
+                GROUP BY departamento, departamento_norm
+            ) subq
+            WHERE departamento_norm IS NOT NULL
+            GROUP BY departamento_norm
+            HAVING SUM(docs) >= 2
+        ) x
+    ), '[]'::jsonb) as departamentos,
+    COALESCE((
+        SELECT jsonb_agg(municipio_norm ORDER BY municipio_norm)
+        FROM (
+            SELECT municipio_norm
+            FROM (
+                SELECT
+                    CASE
+                        WHEN municipio ILIKE '%santa%f%bogot%' OR municipio ILIKE '%bogot%' THEN 'Bogotá'
+                        WHEN municipio ILIKE '%santiago%cali%' OR municipio ILIKE '%cali%' THEN 'Cali'
+                        WHEN municipio ILIKE '%medellin%' OR municipio ILIKE '%medell%n%' THEN 'Medellín'
+                        WHEN municipio ILIKE '%cartagena%' THEN 'Cartagena'
+                        WHEN municipio ILIKE '%barranquilla%' THEN 'Barranquilla'
+                        WHEN municipio IN ('000 - TODOS', '00 - TODOS') THEN NULL
+                        ELSE municipio
+                    END as municipio_norm,
+                    COUNT(*) as docs
+                FROM analisis_lugares
+                WHERE municipio IS NOT NULL AND municipio != ''
+                GROUP BY municipio, municipio_norm
+            ) subq
+            WHERE municipio_norm IS NOT NULL
+            GROUP BY municipio_norm
+            ORDER BY municipio_norm
+            LIMIT 100
+        ) x
+    ), '[]'::jsonb) as municipios,
+    COALESCE((
+        SELECT jsonb_agg(detalle ORDER BY detalle)
+        FROM (SELECT DISTINCT detalle FROM metadatos WHERE detalle IS NOT NULL) x
+    ), '[]'::jsonb) as tipos_documento,
+    COALESCE((
+        SELECT jsonb_agg(despacho ORDER BY despacho)
+        FROM (
+            SELECT DISTINCT COALESCE(m.despacho, d.despacho) as despacho
+            FROM documentos d
+            LEFT JOIN metadatos m ON d.id = m.documento_id
+            WHERE COALESCE(m.despacho, d.despacho) IS NOT NULL
+              AND LENGTH(COALESCE(m.despacho, d.despacho)) < 15
+              AND COALESCE(m.despacho, d.despacho) NOT LIKE '110016%'
+            ORDER BY despacho
+            LIMIT 20
+        ) x
+    ), '[]'::jsonb) as despachos,
+    (SELECT MIN(fecha_creacion) FROM metadatos WHERE fecha_creacion IS NOT NULL) as fecha_min,
+    (SELECT MAX(fecha_creacion) FROM metadatos WHERE fecha_creacion IS NOT NULL) as fecha_max;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_opciones_filtros
+ON mv_opciones_filtros (id);
+
 -- =====================================================================
 -- CONSULTAS FRECUENTES OPTIMIZADAS (Usan las vistas materializadas)
 -- =====================================================================
@@ -187,8 +410,17 @@ BEGIN
     REFRESH MATERIALIZED VIEW CONCURRENTLY mv_personas_frecuentes;
     REFRESH MATERIALIZED VIEW CONCURRENTLY mv_organizaciones_frecuentes;
     REFRESH MATERIALIZED VIEW CONCURRENTLY mv_lugares_frecuentes;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_personas_coocurrencia;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_nombres_personas;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_victimas_menciones;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_opciones_filtros;
     REFRESH MATERIALIZED VIEW mv_estadisticas_caso;
     
+    -- Las respuestas cacheadas del RAG quedan obsoletas con los nuevos datos
+    IF to_regprocedure('invalidar_cache_rag()') IS NOT NULL THEN
+        PERFORM invalidar_cache_rag();
+    END IF;
+    
     -- Log del refresh
     INSERT INTO mv_refresh_log (refresh_time, status) 
     VALUES (NOW(), 'success');
@@ -78,6 +78,19 @@ CREATE TABLE IF NOT EXISTS rag_cache (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Versión del cache: la capa LRU en memoria de cada proceso la consulta
+-- periódicamente y se vacía cuando cambia (ver invalidar_cache_rag)
+CREATE TABLE IF NOT EXISTS rag_cache_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    actualizado TIMESTAMP DEFAULT NOW()
+);
+INSERT INTO rag_cache_version (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+-- Embedding de la pregunta cacheada, para el cache semántico (preguntas
+-- parafraseadas). NULL en respuestas guardadas solo por hash exacto
+ALTER TABLE rag_cache ADD COLUMN IF NOT EXISTS pregunta_embedding REAL[];
+
 -- Índices para performance
 CREATE INDEX IF NOT EXISTS idx_rag_consultas_timestamp ON rag_consultas (timestamp_consulta);
 CREATE INDEX IF NOT EXISTS idx_rag_consultas_usuario ON rag_consultas (usuario_id);
@@ -96,17 +109,24 @@ CREATE INDEX IF NOT EXISTS idx_rag_feedback_aspectos ON rag_feedback USING GIN (
 -- =====================================================================
 
 -- Función para normalizar preguntas (eliminar acentos, minúsculas, etc.)
+-- Todo espacio en blanco (saltos de línea, tabs, repetidos) queda como un solo
+-- espacio, igual que normalizar_pregunta() en src/core/cache_respuestas.py
 CREATE OR REPLACE FUNCTION normalizar_pregunta(pregunta TEXT)
 RETURNS TEXT AS $$
 BEGIN
-    RETURN lower(
+    RETURN btrim(
         regexp_replace(
-            translate(
-                trim(pregunta),
-                'áéíóúñÁÉÍÓÚÑ',
-                'aeiounAEIOUN'
+            lower(
+                regexp_replace(
+                    translate(
+                        pregunta,
+                        'áéíóúñÁÉÍÓÚÑ',
+                        'aeiounAEIOUN'
+                    ),
+                    '[^\w\s]', ' ', 'g'
+                )
             ),
-            '[^\w\s]', ' ', 'g'
+            '\s+', ' ', 'g'
         )
     );
 END;
@@ -241,6 +261,24 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Función para invalidar el cache tras una ingesta de documentos
+CREATE OR REPLACE FUNCTION invalidar_cache_rag()
+RETURNS BIGINT AS $$
+DECLARE
+    nueva_version BIGINT;
+BEGIN
+    UPDATE rag_cache SET expires_at = NOW() WHERE expires_at > NOW();
+    
+    UPDATE rag_cache_version
+    SET version = version + 1,
+        actualizado = NOW()
+    WHERE id = 1
+    RETURNING version INTO nueva_version;
+    
+    RETURN nueva_version;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Función para registrar respuesta
 CREATE OR REPLACE FUNCTION registrar_respuesta_rag(
     p_consulta_id INTEGER,
@@ -5,9 +5,11 @@ Proporciona endpoints para consultas RAG con máxima trazabilidad legal
 
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import asyncio
+import json
 import logging
 import os
 import sys
@@ -16,7 +18,7 @@ from datetime import datetime
 # Agregar directorio padre al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.sistema_rag_completo import SistemaRAGTrazable, ConsultaRAG
+from core.sistema_rag_completo import ConsultaRAG, obtener_sistema_rag
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -79,11 +81,11 @@ class EstadoSistemaResponse(BaseModel):
 rag_system = None
 
 async def get_rag_system():
-    """Dependency para obtener el sistema RAG (singleton)"""
+    """Dependency para obtener el sistema RAG (instancia compartida del proceso)"""
     global rag_system
     if rag_system is None:
         try:
-            rag_system = SistemaRAGTrazable()
+            rag_system = obtener_sistema_rag()
             logger.info("Sistema RAG inicializado correctamente")
         except Exception as e:
             logger.error(f"Error inicializando sistema RAG: {e}")
@@ -97,6 +99,12 @@ async def startup_event():
     await get_rag_system()
     logger.info("API RAG iniciada correctamente")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Evento de cierre - liberar clientes async de Azure"""
+    if rag_system is not None:
+        await rag_system.cerrar()
+
 @app.get("/", tags=["General"])
 async def root():
     """Endpoint raíz - información básica de la API"""
@@ -106,6 +114,7 @@ async def root():
         "docs": "/docs",
         "endpoints": {
             "consulta": "/rag/consulta",
+            "consulta_stream": "/rag/consulta/stream",
             "estado": "/rag/estado",
             "salud": "/health"
         }
@@ -185,6 +194,46 @@ async def procesar_consulta_rag(
             detail=f"Error procesando consulta: {str(e)}"
         )
 
+def _evento_sse(evento: str, datos: Any) -> str:
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+@app.post("/rag/consulta/stream", tags=["RAG"])
+async def procesar_consulta_rag_stream(
+    request: ConsultaRAGRequest,
+    rag_system = Depends(get_rag_system)
+):
+    """
+    Procesar consulta RAG en streaming (text/event-stream)
+    
+    Eventos, en orden:
+    - **fuentes**: fuentes citables, en cuanto termina la recuperación
+    - **token**: fragmentos de la respuesta a medida que el LLM los genera
+    - **fin**: respuesta completa (texto, fuentes, confianza, metodo, consulta_id)
+    - **error**: si la consulta falla a mitad del stream
+    """
+    logger.info(f"Procesando consulta RAG en streaming: {request.pregunta[:100]}...")
+    
+    consulta = ConsultaRAG(
+        usuario_id=request.usuario_id,
+        pregunta=request.pregunta,
+        ip_cliente=request.ip_cliente
+    )
+    
+    async def eventos():
+        try:
+            async for evento in rag_system.procesar_consulta_stream(consulta):
+                yield _evento_sse(evento['evento'], evento['datos'])
+        except Exception as e:
+            logger.error(f"Error en streaming de consulta RAG: {str(e)}")
+            yield _evento_sse('error', {'detail': f"Error procesando consulta: {str(e)}"})
+    
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/rag/estado", response_model=EstadoSistemaResponse, tags=["RAG"])
 async def obtener_estado_sistema(rag_system = Depends(get_rag_system)):
     """
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Almacén binario de embeddings en segmentos .npy (mmap) + tabla de ids
+
+Los chunks MEL guardaban `mel_embedding` como listas JSON de 1024 floats y
+los vectorizadores persistían embeddings_cache.pkl: un pickle que se carga
+entero en memoria (listas de floats de Python) y se reescribe completo en
+cada _guardar_cache_local. Aquí:
+
+- Los vectores van en segmentos .npy (float16 por defecto) que se abren con
+  mmap: cargar el almacén no copia los vectores a memoria.
+- Cada segmento tiene su tabla lateral .jsonl (una fila por vector: id y
+  metadatos).
+- Solo se añade: guardar() escribe lo pendiente como un segmento nuevo y
+  actualiza el manifiesto de forma atómica. Si un id se vuelve a escribir,
+  gana la versión más reciente.
+- compactar() fusiona los segmentos en uno solo y descarta las versiones
+  reemplazadas; se lanza sola al superar RAG_EMBEDDINGS_MAX_SEGMENTOS.
+
+Estructura del directorio:
+    manifiesto.json        {"version", "dim", "dtype", "segmentos": [...]}
+    seg_000001.npy         (n, dim) vectores
+    seg_000001.jsonl       {"id": ..., <metadatos>} por fila
+
+Variables de entorno:
+    RAG_EMBEDDINGS_MAX_SEGMENTOS  Segmentos antes de compactar (default 32)
+"""
+
+import json
+import logging
+import os
+import pickle
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VERSION_FORMATO = 1
+
+
+def _escribir_atomico(ruta: str, contenido: str):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class AlmacenEmbeddings:
+    """Vectores en segmentos .npy de solo-añadir, con ids y metadatos por fila"""
+
+    def __init__(self, directorio: str, dtype: str = 'float16', max_segmentos: Optional[int] = None):
+        self.directorio = directorio
+        self.max_segmentos = max_segmentos or int(os.getenv('RAG_EMBEDDINGS_MAX_SEGMENTOS', '32'))
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.RLock()
+
+        self.dim: Optional[int] = None
+        self.dtype = np.dtype(dtype)
+        self._segmentos: List[str] = []
+        self._vectores: Dict[str, np.ndarray] = {}          # segmento -> memmap
+        self._metadatos: Dict[str, List[Dict[str, Any]]] = {}
+        self._ubicacion: Dict[str, Tuple[str, int]] = {}    # id -> (segmento, fila) vigente
+        self._pendientes: Dict[str, Tuple[np.ndarray, Dict[str, Any]]] = {}
+        self._cargar()
+
+    # --- Carga ---
+
+    @property
+    def _ruta_manifiesto(self) -> str:
+        return os.path.join(self.directorio, 'manifiesto.json')
+
+    def _cargar(self):
+        if not os.path.exists(self._ruta_manifiesto):
+            return
+        with open(self._ruta_manifiesto, encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        if manifiesto.get('version') != VERSION_FORMATO:
+            raise ValueError(f"Versión de almacén no soportada: {manifiesto.get('version')}")
+        self.dim = manifiesto['dim']
+        self.dtype = np.dtype(manifiesto['dtype'])
+        for segmento in manifiesto['segmentos']:
+            self._abrir_segmento(segmento)
+        logger.info(f"Almacén de embeddings cargado: {len(self._ubicacion)} vectores en {len(self._segmentos)} segmentos")
+
+    def _abrir_segmento(self, segmento: str):
+        vectores = np.load(os.path.join(self.directorio, f"{segmento}.npy"), mmap_mode='r')
+        with open(os.path.join(self.directorio, f"{segmento}.jsonl"), encoding='utf-8') as f:
+            metadatos = [json.loads(linea) for linea in f if linea.strip()]
+        if len(metadatos) != len(vectores):
+            raise ValueError(f"Segmento {segmento} inconsistente: {len(vectores)} vectores, {len(metadatos)} ids")
+        self._segmentos.append(segmento)
+        self._vectores[segmento] = vectores
+        self._metadatos[segmento] = metadatos
+        for fila, meta in enumerate(metadatos):
+            self._ubicacion[meta['id']] = (segmento, fila)
+
+    # --- Lectura ---
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ubicacion) + sum(1 for i in self._pendientes if i not in self._ubicacion)
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._pendientes or id_ in self._ubicacion
+
+    def obtener(self, id_: str) -> Optional[np.ndarray]:
+        """Vector (float32) de un id, o None"""
+        with self._lock:
+            if id_ in self._pendientes:
+                return self._pendientes[id_][0].astype(np.float32)
+            ubicacion = self._ubicacion.get(id_)
+            if ubicacion is None:
+                return None
+            segmento, fila = ubicacion
+            return np.asarray(self._vectores[segmento][fila], dtype=np.float32)
+
+    def metadatos(self, id_: str) -> Optional[Dict[str, Any]]:
+        """Metadatos guardados con el vector (incluye 'id')"""
+        with self._lock:
+            if id_ in self._pendientes:
+                return self._pendientes[id_][1]
+            ubicacion = self._ubicacion.get(id_)
+            return None if ubicacion is None else self._metadatos[ubicacion[0]][ubicacion[1]]
+
+    def segmentos(self) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        """
+        (ids, vectores, metadatos) de las filas vigentes de cada segmento
+        guardado. `vectores` es el memmap si todas las filas siguen vigentes.
+        La instantánea se arma bajo el lock: un guardar() o compactar()
+        concurrente no la altera.
+        """
+        partes = []
+        with self._lock:
+            for segmento in self._segmentos:
+                metadatos = self._metadatos[segmento]
+                vigentes = [fila for fila, meta in enumerate(metadatos)
+                            if self._ubicacion.get(meta['id']) == (segmento, fila)]
+                if not vigentes:
+                    continue
+                vectores = self._vectores[segmento]
+                if len(vigentes) < len(metadatos):
+                    vectores = vectores[vigentes]
+                    metadatos = [metadatos[fila] for fila in vigentes]
+                partes.append(([meta['id'] for meta in metadatos], vectores, metadatos))
+        yield from partes
+
+    # --- Escritura ---
+
+    def agregar(self, id_: str, vector: Sequence[float], metadatos: Optional[Dict[str, Any]] = None):
+        """Añade (o reemplaza) un vector; queda pendiente hasta guardar()"""
+        self.agregar_lote([id_], [vector], [metadatos] if metadatos else None)
+
+    def agregar_lote(self, ids: Sequence[str], vectores, metadatos: Optional[Sequence[Dict[str, Any]]] = None):
+        """Añade varios vectores; quedan pendientes hasta guardar()"""
+        vectores = np.asarray(vectores, dtype=self.dtype)
+        if vectores.ndim != 2 or len(vectores) != len(ids):
+            raise ValueError(f"Se esperaban {len(ids)} vectores, forma recibida {vectores.shape}")
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectores.shape[1])
+            elif vectores.shape[1] != self.dim:
+                raise ValueError(f"Dimensión {vectores.shape[1]} distinta a la del almacén ({self.dim})")
+            for i, id_ in enumerate(ids):
+                meta = dict(metadatos[i]) if metadatos else {}
+                meta['id'] = id_
+                self._pendientes[id_] = (vectores[i], meta)
+
+    def _escribir_segmento(self, segmento: str, vectores: np.ndarray, metadatos: List[Dict[str, Any]]):
+        ruta = os.path.join(self.directorio, segmento)
+        with open(f"{ruta}.npy.tmp", 'wb') as f:
+            np.save(f, np.ascontiguousarray(vectores, dtype=self.dtype))
+        _escribir_atomico(f"{ruta}.jsonl", ''.join(json.dumps(m, ensure_ascii=False) + '\n' for m in metadatos))
+        os.replace(f"{ruta}.npy.tmp", f"{ruta}.npy")
+
+    def _escribir_manifiesto(self, segmentos: List[str]):
+        _escribir_atomico(self._ruta_manifiesto, json.dumps({
+            'version': VERSION_FORMATO, 'dim': self.dim, 'dtype': self.dtype.name, 'segmentos': segmentos
+        }, indent=2))
+
+    def _nuevo_nombre(self) -> str:
+        numeros = [int(s.split('_')[1]) for s in self._segmentos]
+        return f"seg_{(max(numeros) + 1 if numeros else 1):06d}"
+
+    def guardar(self) -> int:
+        """Escribe los vectores pendientes como un segmento nuevo; devuelve cuántos"""
+        with self._lock:
+            if not self._pendientes:
+                return 0
+            ids = list(self._pendientes)
+            vectores = np.vstack([self._pendientes[i][0] for i in ids])
+            metadatos = [self._pendientes[i][1] for i in ids]
+            segmento = self._nuevo_nombre()
+            self._escribir_segmento(segmento, vectores, metadatos)
+            self._escribir_manifiesto(self._segmentos + [segmento])
+            self._abrir_segmento(segmento)
+            self._pendientes.clear()
+            logger.info(f"Almacén de embeddings: +{len(ids)} vectores ({segmento})")
+            if len(self._segmentos) > self.max_segmentos:
+                self.compactar()
+            return len(ids)
+
+    def compactar(self, conservar: Optional[Set[str]] = None, descartar: Optional[Iterable[str]] = None):
+        """
+        Fusiona los segmentos en uno, sin las versiones reemplazadas.
+        Descarta además los ids fuera de `conservar` o dentro de `descartar`
+        (p. ej. chunks de documentos que se volvieron a procesar).
+        """
+        with self._lock:
+            if self._pendientes:
+                self.guardar()
+            if conservar is not None:
+                for id_ in [i for i in self._ubicacion if i not in conservar]:
+                    del self._ubicacion[id_]
+            for id_ in descartar or ():
+                self._ubicacion.pop(id_, None)
+            if len(self._segmentos) <= 1 and len(self._ubicacion) == sum(len(m) for m in self._metadatos.values()):
+                return
+            partes = list(self.segmentos())
+            anteriores = list(self._segmentos)
+            segmento = self._nuevo_nombre()
+            if partes:
+                vectores = np.concatenate([np.asarray(v) for _, v, _ in partes])
+                metadatos = [m for _, _, ms in partes for m in ms]
+                self._escribir_segmento(segmento, vectores, metadatos)
+                nuevos = [segmento]
+            else:
+                nuevos = []
+            self._escribir_manifiesto(nuevos)
+
+            self._segmentos, self._vectores, self._metadatos, self._ubicacion = [], {}, {}, {}
+            for nuevo in nuevos:
+                self._abrir_segmento(nuevo)
+            for anterior in anteriores:
+                for extension in ('npy', 'jsonl'):
+                    try:
+                        os.remove(os.path.join(self.directorio, f"{anterior}.{extension}"))
+                    except OSError as e:
+                        # En Windows un memmap abierto impide borrar; se limpia en la próxima compactación
+                        logger.warning(f"No se pudo borrar {anterior}.{extension}: {e}")
+            logger.info(f"Almacén de embeddings compactado: {len(self._ubicacion)} vectores en 1 segmento")
+
+    # --- Migración ---
+
+    def importar_pickle(self, ruta: str, clave_vector: str = 'vector') -> int:
+        """
+        Importa un embeddings_cache.pkl ({hash: {'vector': [...], ...}}) de los
+        vectorizadores; los demás campos quedan como metadatos.
+        """
+        with open(ruta, 'rb') as f:
+            cache = pickle.load(f)
+        por_dimension: Dict[int, List[str]] = {}
+        for id_, item in cache.items():
+            if item.get(clave_vector):
+                por_dimension.setdefault(len(item[clave_vector]), []).append(id_)
+        importados = 0
+        for dim, ids in por_dimension.items():
+            if self.dim is not None and dim != self.dim:
+                logger.warning(f"{len(ids)} embeddings de dimensión {dim} no importados (almacén: {self.dim})")
+                continue
+            self.agregar_lote(ids, [cache[i][clave_vector] for i in ids],
+                              [{k: v for k, v in cache[i].items() if k != clave_vector} for i in ids])
+            importados += len(ids)
+        self.guardar()
+        logger.info(f"Importados {importados} embeddings desde {ruta}")
+        return importados
@@ -12,6 +12,13 @@ from azure.search.documents.models import Vector
 from azure.core.credentials import AzureKeyCredential
 from openai import AzureOpenAI
 
+try:
+    from .servicio_embeddings import obtener_servicio_embeddings
+    from .empaquetador_contexto import EmpaquetadorContexto
+except ImportError:
+    from servicio_embeddings import obtener_servicio_embeddings
+    from empaquetador_contexto import EmpaquetadorContexto
+
 class AzureSearchClient:
     """Cliente para realizar búsquedas vectoriales en Azure Cognitive Search"""
     
@@ -51,15 +58,18 @@ class AzureSearchClient:
     def generar_embedding(self, texto: str) -> List[float]:
         """Generar embedding para un texto usando Azure OpenAI"""
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",  # Modelo de embeddings
-                input=texto
-            )
-            return response.data[0].embedding
+            return obtener_servicio_embeddings().embedding(texto, self._llamar_embeddings)
         except Exception as e:
             logging.error(f"Error generando embedding: {e}")
             raise
     
+    def _llamar_embeddings(self, textos: List[str]) -> List[List[float]]:
+        response = self.openai_client.embeddings.create(
+            model="text-embedding-ada-002",  # Modelo de embeddings
+            input=textos
+        )
+        return [d.embedding for d in response.data]
+
     def buscar_chunks_relevantes(self, consulta: str, top_k: int = 10) -> List[Dict[str, Any]]:
         """Buscar chunks más relevantes usando búsqueda vectorial"""
         try:
@@ -173,49 +183,46 @@ class AzureSearchClient:
             return {"chunks": [], "documentos": [], "total_chunks": 0, "total_documentos": 0}
     
     def construir_contexto_rag(self, resultados: Dict[str, Any], max_tokens: int = 3000) -> str:
-        """Construir contexto optimizado para el LLM"""
+        """Construir contexto optimizado para el LLM dentro de max_tokens (tokens reales)"""
         try:
             contexto_partes = []
             token_count = 0
             
-            # Agregar chunks más relevantes
+            # Agregar chunks más relevantes (hasta 70% del presupuesto)
             if resultados.get("chunks"):
-                contexto_partes.append("=== FRAGMENTOS RELEVANTES ===\n")
-                for i, chunk in enumerate(resultados["chunks"][:6], 1):
-                    contenido = chunk.get("content", "")[:500]  # Limitar tamaño
-                    expediente = chunk.get("expediente_nuc", "N/A")
-                    tipo = chunk.get("tipo_documental", "N/A")
-                    
-                    fragmento = f"\n[{i}] Expediente: {expediente} | Tipo: {tipo}\n{contenido}...\n"
-                    
-                    # Estimar tokens (aproximadamente 4 caracteres por token)
-                    tokens_fragmento = len(fragmento) // 4
-                    if token_count + tokens_fragmento > max_tokens * 0.7:  # 70% para chunks
-                        break
-                    
-                    contexto_partes.append(fragmento)
-                    token_count += tokens_fragmento
-            
-            # Agregar análisis de documentos completos
-            if resultados.get("documentos"):
-                contexto_partes.append("\n=== ANÁLISIS DOCUMENTALES ===\n")
-                for i, doc in enumerate(resultados["documentos"][:3], 1):
-                    analisis = doc.get("analisis", "")[:300]  # Limitar análisis
-                    expediente = doc.get("expediente_nuc", "N/A")
-                    
-                    if analisis:
-                        analisis_parte = f"\n[A{i}] Expediente: {expediente}\nAnálisis: {analisis}...\n"
-                        
-                        tokens_analisis = len(analisis_parte) // 4
-                        if token_count + tokens_analisis > max_tokens:
-                            break
-                        
-                        contexto_partes.append(analisis_parte)
-                        token_count += tokens_analisis
+                encabezado = "=== FRAGMENTOS RELEVANTES ===\n"
+                empaquetador = EmpaquetadorContexto(presupuesto=max_tokens, max_items=6)
+                token_count += empaquetador.contar(encabezado)
+                chunks = empaquetador.empaquetar(
+                    resultados["chunks"],
+                    lambda i, chunk: (f"\n[{i}] Expediente: {chunk.get('expediente_nuc', 'N/A')} | "
+                                      f"Tipo: {chunk.get('tipo_documental', 'N/A')}\n{chunk.get('content', '')}\n"),
+                    presupuesto=int(max_tokens * 0.7) - token_count,
+                    clave_texto="content", clave_documento="document_id", clave_relevancia="score"
+                )
+                contexto_partes.append(encabezado)
+                contexto_partes.extend(chunks.bloques)
+                token_count += chunks.tokens
+            
+            # Agregar análisis de documentos completos con el resto del presupuesto
+            documentos = [d for d in resultados.get("documentos") or [] if d.get("analisis")]
+            if documentos:
+                encabezado = "\n=== ANÁLISIS DOCUMENTALES ===\n"
+                empaquetador = EmpaquetadorContexto(presupuesto=max_tokens, max_items=3)
+                token_count += empaquetador.contar(encabezado)
+                analisis = empaquetador.empaquetar(
+                    documentos,
+                    lambda i, doc: f"\n[A{i}] Expediente: {doc.get('expediente_nuc', 'N/A')}\nAnálisis: {doc['analisis']}\n",
+                    presupuesto=max_tokens - token_count,
+                    clave_texto="analisis", clave_documento="document_id", clave_relevancia="score"
+                )
+                contexto_partes.append(encabezado)
+                contexto_partes.extend(analisis.bloques)
+                token_count += analisis.tokens
             
             contexto_final = "".join(contexto_partes)
             
-            logging.info(f"Contexto RAG construido: ~{token_count} tokens estimados")
+            logging.info(f"Contexto RAG construido: {token_count} tokens")
             return contexto_final
             
         except Exception as e:
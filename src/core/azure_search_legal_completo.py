@@ -18,12 +18,14 @@ from dotenv import load_dotenv
 # Importar el enriquecedor de metadatos
 try:
     from .enriquecedor_metadatos import get_enriquecedor
+    from .servicio_embeddings import obtener_servicio_embeddings
 except ImportError:
     # Fallback para importación directa
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from enriquecedor_metadatos import get_enriquecedor
+    from servicio_embeddings import obtener_servicio_embeddings
 
 # Cargar variables de entorno
 load_dotenv('.env.gpt41')
@@ -62,14 +64,17 @@ class AzureSearchLegalCompleto:
     def generar_embedding(self, texto: str) -> List[float]:
         """Genera embedding para un texto usando Azure OpenAI"""
         try:
-            response = self.openai_client.embeddings.create(
-                input=texto,
-                model="text-embedding-ada-002"
-            )
-            return response.data[0].embedding
+            return obtener_servicio_embeddings().embedding(texto, self._llamar_embeddings)
         except Exception as e:
             logging.error(f"❌ Error generando embedding: {e}")
             raise
+
+    def _llamar_embeddings(self, textos: List[str]) -> List[List[float]]:
+        response = self.openai_client.embeddings.create(
+            input=textos,
+            model="text-embedding-ada-002"
+        )
+        return [d.embedding for d in response.data]
     
     def buscar_chunks_con_trazabilidad(self, query: str, top_k: int = 8) -> List[Dict]:
         """
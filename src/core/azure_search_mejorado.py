@@ -8,6 +8,11 @@ import logging
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
+try:
+    from .servicio_embeddings import obtener_servicio_embeddings
+except ImportError:
+    from servicio_embeddings import obtener_servicio_embeddings
+
 # Cargar variables de entorno
 load_dotenv('.env.gpt41')
 
@@ -172,15 +177,18 @@ class AzureSearchClientMejorado:
             return None
         
         try:
-            response = self.openai_client.embeddings.create(
-                input=texto,
-                model="text-embedding-ada-002"
-            )
-            return response.data[0].embedding
+            return obtener_servicio_embeddings().embedding(texto, self._llamar_embeddings)
             
         except Exception as e:
             logging.error(f"Error generando embedding: {e}")
             return None
+
+    def _llamar_embeddings(self, textos: List[str]) -> List[List[float]]:
+        response = self.openai_client.embeddings.create(
+            input=textos,
+            model="text-embedding-ada-002"
+        )
+        return [d.embedding for d in response.data]
     
     def busqueda_vectorial_avanzada(self, consulta: str, chunks_count: int = 5) -> List[Dict]:
         """Búsqueda vectorial avanzada (solo si está disponible)"""
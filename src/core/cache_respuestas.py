@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Cache de respuestas RAG en dos niveles: LRU en memoria + tabla rag_cache
+
+_buscar_cache llamaba a buscar_respuesta_cache() en PostgreSQL para cada
+consulta (también en los fallos), y esa función además hace un UPDATE del
+contador de uso. Aquí:
+
+- Nivel 1: OrderedDict LRU con TTL, indexado por el mismo hash que
+  generar_hash_pregunta() (md5 de normalizar_pregunta()). Un acierto no toca
+  la base de datos. Los fallos también se recuerdan unos segundos.
+- Nivel 2: SELECT directo sobre rag_cache por pregunta_hash (índice único),
+  sin UPDATE; el resultado sube al nivel 1.
+- Los contadores veces_utilizada/ultima_utilizacion se acumulan en memoria y
+  un hilo de fondo los escribe con un único UPDATE por lote.
+- Invalidación: invalidar() vacía el LRU (y opcionalmente expira rag_cache).
+  invalidar_cache_rag() en SQL, llamada por refresh_all_mv() tras cada
+  ingesta, incrementa rag_cache_version; el hilo de fondo detecta el cambio y
+  vacía el LRU de cada proceso.
+
+Variables de entorno:
+    RAG_CACHE_LRU_MAX         Entradas máximas en memoria (default 1000)
+    RAG_CACHE_LRU_TTL         Segundos de vida de un acierto (default 300)
+    RAG_CACHE_LRU_TTL_FALLO   Segundos de vida de un fallo (default 30)
+    RAG_CACHE_INTERVALO       Segundos entre escrituras de contadores y
+                              verificaciones de versión (default 5)
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+_TRADUCCION_TILDES = str.maketrans('áéíóúñÁÉÍÓÚÑ', 'aeiounAEIOUN')
+_NO_PALABRA = re.compile(r'[^\w\s]')
+
+# Marca de "no está en rag_cache" dentro del LRU
+_FALLO = object()
+
+
+def normalizar_pregunta(pregunta: str) -> str:
+    """
+    Equivalente Python de la función SQL normalizar_pregunta(): sin tildes,
+    puntuación como espacio, minúsculas y los espacios en blanco colapsados
+    (str.strip() y trim() de SQL no coinciden con saltos de línea y tabs)
+    """
+    return ' '.join(_NO_PALABRA.sub(' ', (pregunta or '').translate(_TRADUCCION_TILDES)).lower().split())
+
+
+def generar_hash_pregunta(pregunta: str) -> str:
+    """Equivalente Python de la función SQL generar_hash_pregunta()"""
+    return hashlib.md5(normalizar_pregunta(pregunta).encode('utf-8')).hexdigest()
+
+
+class CacheRespuestas:
+    """LRU con TTL delante de la tabla rag_cache"""
+
+    def __init__(self, conectar: Callable[[], Any], max_entradas: Optional[int] = None,
+                 ttl: Optional[float] = None, ttl_fallo: Optional[float] = None,
+                 intervalo: Optional[float] = None):
+        self.conectar = conectar
+        self.max_entradas = max_entradas or int(os.getenv('RAG_CACHE_LRU_MAX', '1000'))
+        self.ttl = ttl or float(os.getenv('RAG_CACHE_LRU_TTL', '300'))
+        self.ttl_fallo = ttl_fallo if ttl_fallo is not None else float(os.getenv('RAG_CACHE_LRU_TTL_FALLO', '30'))
+        self.intervalo = intervalo or float(os.getenv('RAG_CACHE_INTERVALO', '5'))
+
+        self._entradas: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._usos: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._al_invalidar: List[Callable[[], None]] = []
+        self.metricas = {
+            'aciertos_memoria': 0,
+            'aciertos_bd': 0,
+            'fallos': 0,
+            'expulsiones': 0,
+            'invalidaciones': 0,
+        }
+
+    @contextmanager
+    def _conexion(self):
+        conn = self.conectar()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # --- Nivel 1 ---
+
+    def _leer_memoria(self, clave: str):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira <= time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return valor
+
+    def _escribir_memoria(self, clave: str, valor, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entradas[clave] = (valor, time.monotonic() + ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.metricas['expulsiones'] += 1
+
+    # --- API ---
+
+    def obtener_memoria(self, pregunta: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Consulta solo el nivel en memoria (sin E/S, apto para el event loop).
+
+        Returns:
+            (encontrado, entrada): encontrado=False si hay que ir a la BD;
+            entrada=None con encontrado=True es un fallo recordado.
+        """
+        clave = generar_hash_pregunta(pregunta)
+        valor = self._leer_memoria(clave)
+        if valor is None:
+            return False, None
+        if valor is _FALLO:
+            with self._lock:
+                self.metricas['fallos'] += 1
+            return True, None
+        self._registrar_uso(clave)
+        with self._lock:
+            self.metricas['aciertos_memoria'] += 1
+        return True, valor
+
+    def obtener_bd(self, pregunta: str) -> Optional[Dict[str, Any]]:
+        """Consulta rag_cache (bloqueante) y guarda el resultado en memoria"""
+        self._asegurar_hilo()
+        clave = generar_hash_pregunta(pregunta)
+        with self._conexion() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT respuesta_cacheada, fuentes_cache,
+                           EXTRACT(EPOCH FROM expires_at - NOW()) as vigencia
+                    FROM rag_cache
+                    WHERE pregunta_hash = %s AND expires_at > NOW()
+                """, (clave,))
+                fila = cur.fetchone()
+
+        if fila is None:
+            self._escribir_memoria(clave, _FALLO, self.ttl_fallo)
+            with self._lock:
+                self.metricas['fallos'] += 1
+            return None
+
+        entrada = {'respuesta': fila['respuesta_cacheada'], 'fuentes': fila['fuentes_cache']}
+        self._escribir_memoria(clave, entrada, min(self.ttl, float(fila['vigencia'])))
+        self._registrar_uso(clave)
+        with self._lock:
+            self.metricas['aciertos_bd'] += 1
+        return entrada
+
+    def obtener(self, pregunta: str) -> Optional[Dict[str, Any]]:
+        """Busca en memoria y, si no está, en rag_cache"""
+        encontrado, entrada = self.obtener_memoria(pregunta)
+        if encontrado:
+            return entrada
+        return self.obtener_bd(pregunta)
+
+    def guardar(self, pregunta: str, respuesta: str, fuentes):
+        """Escribe en rag_cache (bloqueante) y en memoria; fuentes debe ser serializable a JSON"""
+        self._asegurar_hilo()
+        with self._conexion() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT guardar_respuesta_cache(%s, %s, %s)",
+                            (pregunta, respuesta, json.dumps(fuentes)))
+        self._escribir_memoria(generar_hash_pregunta(pregunta),
+                               {'respuesta': respuesta, 'fuentes': fuentes}, self.ttl)
+
+    def invalidar(self, expirar_bd: bool = False):
+        """
+        Vacía el nivel en memoria. Con expirar_bd=True llama además a
+        invalidar_cache_rag(), que expira rag_cache y avisa a los demás procesos.
+        """
+        if expirar_bd:
+            with self._conexion() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT invalidar_cache_rag()")
+                    self._version = cur.fetchone()[0]
+        with self._lock:
+            self._entradas.clear()
+            self.metricas['invalidaciones'] += 1
+        for funcion in self._al_invalidar:
+            funcion()
+        logger.info("Cache de respuestas RAG invalidado")
+
+    def al_invalidar(self, funcion: Callable[[], None]):
+        """Registra una función a llamar cada vez que se invalida el cache (p. ej. el cache semántico)"""
+        self._al_invalidar.append(funcion)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Métricas de aciertos/fallos y ocupación del LRU"""
+        with self._lock:
+            datos = dict(self.metricas)
+            datos['entradas'] = len(self._entradas)
+            datos['usos_pendientes'] = sum(self._usos.values())
+        consultas = datos['aciertos_memoria'] + datos['aciertos_bd'] + datos['fallos']
+        datos['tasa_aciertos'] = (datos['aciertos_memoria'] + datos['aciertos_bd']) / consultas if consultas else 0.0
+        return datos
+
+    # --- Contadores y versión (hilo de fondo) ---
+
+    def _registrar_uso(self, clave: str):
+        with self._lock:
+            self._usos[clave] = self._usos.get(clave, 0) + 1
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._detener.clear()
+                self._hilo = threading.Thread(target=self._bucle, name='rag-cache', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            self.sincronizar()
+
+    def sincronizar(self):
+        """Escribe los contadores de uso acumulados y verifica la versión del cache"""
+        with self._lock:
+            usos, self._usos = self._usos, {}
+        try:
+            with self._conexion() as conn:
+                with conn.cursor() as cur:
+                    if usos:
+                        psycopg2.extras.execute_values(cur, """
+                            UPDATE rag_cache rc
+                            SET veces_utilizada = rc.veces_utilizada + v.usos,
+                                ultima_utilizacion = NOW()
+                            FROM (VALUES %s) AS v(pregunta_hash, usos)
+                            WHERE rc.pregunta_hash = v.pregunta_hash
+                        """, list(usos.items()))
+                    cur.execute("SELECT to_regclass('rag_cache_version') IS NOT NULL")
+                    version = None
+                    if cur.fetchone()[0]:
+                        cur.execute("SELECT version FROM rag_cache_version WHERE id = 1")
+                        fila = cur.fetchone()
+                        version = fila[0] if fila else None
+        except psycopg2.Error as e:
+            logger.warning(f"Error sincronizando cache de respuestas: {e}")
+            with self._lock:
+                for clave, n in usos.items():
+                    self._usos[clave] = self._usos.get(clave, 0) + n
+            return
+
+        if version is not None and self._version is not None and version != self._version:
+            self.invalidar()
+        self._version = version
+
+    def cerrar(self):
+        """Detiene el hilo de fondo y escribe los contadores pendientes"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(self.intervalo + 5)
+        if self._usos:
+            self.sincronizar()
+
+
+_cache: Optional[CacheRespuestas] = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_respuestas(conectar: Callable[[], Any]) -> CacheRespuestas:
+    """Cache global del proceso (escribe los contadores pendientes al salir)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheRespuestas(conectar)
+                atexit.register(_cache.cerrar)
+    return _cache
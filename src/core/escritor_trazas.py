@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Escritor por lotes de las trazas RAG (rag_consultas / rag_respuestas)
+
+procesar_consulta abría tres conexiones por consulta en el camino de la
+respuesta (registrar_consulta_rag, registrar_respuesta_rag y el UPDATE de
+métricas). Aquí las trazas se encolan y un hilo de fondo las inserta por
+lotes (INSERT multi-fila) en una sola transacción:
+
+- Los IDs se reservan por bloques de la secuencia SERIAL, de modo que
+  consulta_id/respuesta_id se devuelven al usuario antes de escribir.
+- La consulta se inserta ya con tiempo_respuesta_ms y metodo_resolucion,
+  sin UPDATE posterior.
+- La cola es acotada: si se llena, encolar() espera (backpressure) en lugar
+  de descartar trazas.
+- Si el INSERT del lote falla, se reintenta traza por traza (SAVEPOINT por
+  fila): una traza inválida no pierde el lote entero.
+- cerrar() (y atexit) vacía la cola antes de terminar el proceso.
+
+Variables de entorno:
+    RAG_TRAZAS_MAX_COLA    Trazas pendientes máximas (default 10000)
+    RAG_TRAZAS_LOTE        Trazas por INSERT (default 200)
+    RAG_TRAZAS_INTERVALO   Segundos máximos entre escrituras (default 1.0)
+    RAG_TRAZAS_BLOQUE_IDS  IDs reservados por viaje a la secuencia (default 50)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+class EscritorTrazas:
+    """Cola acotada + hilo escritor para las trazas del sistema RAG"""
+
+    def __init__(self, conectar: Callable[[], Any], max_cola: Optional[int] = None,
+                 lote: Optional[int] = None, intervalo: Optional[float] = None,
+                 bloque_ids: Optional[int] = None):
+        self.conectar = conectar
+        self.lote = lote or int(os.getenv('RAG_TRAZAS_LOTE', '200'))
+        self.intervalo = intervalo or float(os.getenv('RAG_TRAZAS_INTERVALO', '1.0'))
+        self.bloque_ids = bloque_ids or int(os.getenv('RAG_TRAZAS_BLOQUE_IDS', '50'))
+        self._cola: queue.Queue = queue.Queue(
+            maxsize=max_cola or int(os.getenv('RAG_TRAZAS_MAX_COLA', '10000'))
+        )
+        self._ids: Dict[str, List[int]] = {'rag_consultas': [], 'rag_respuestas': []}
+        self._ids_lock = threading.Lock()
+        self._escritura_lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._hilo_lock = threading.Lock()
+        self._cerrado = False
+
+    # --- IDs ---
+
+    def reservar_id(self, tabla: str) -> int:
+        """Siguiente ID de la tabla; consulta la secuencia una vez por bloque"""
+        with self._ids_lock:
+            libres = self._ids[tabla]
+            if not libres:
+                conn = self.conectar()
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            SELECT nextval(pg_get_serial_sequence(%s, 'id'))
+                            FROM generate_series(1, %s)
+                        """, (tabla, self.bloque_ids))
+                        libres.extend(row[0] for row in cur.fetchall())
+                    conn.commit()
+                finally:
+                    conn.close()
+            return libres.pop(0)
+
+    # --- Encolado ---
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._hilo_lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='rag-trazas', daemon=True)
+                self._hilo.start()
+
+    def encolar(self, consulta: Dict[str, Any], respuesta: Optional[Dict[str, Any]] = None):
+        """
+        Encola la traza de una consulta (y su respuesta, si la hubo).
+
+        Bloquea solo si la cola está llena. Desde código async llamar vía
+        executor (SistemaRAGTrazable._en_bd) para no detener el event loop.
+        """
+        if self.intentar_encolar(consulta, respuesta):
+            return
+        if self._cerrado:
+            self._escribir([(consulta, respuesta)])
+            return
+        logger.warning("Cola de trazas RAG llena; esperando al escritor")
+        self._cola.put((consulta, respuesta))
+
+    def intentar_encolar(self, consulta: Dict[str, Any], respuesta: Optional[Dict[str, Any]] = None) -> bool:
+        """Encola sin bloquear; False si la cola está llena o el escritor cerrado"""
+        if self._cerrado:
+            return False
+        self._asegurar_hilo()
+        try:
+            self._cola.put_nowait((consulta, respuesta))
+            return True
+        except queue.Full:
+            return False
+
+    # --- Escritura ---
+
+    def _bucle(self):
+        while True:
+            try:
+                item = self._cola.get(timeout=self.intervalo)
+            except queue.Empty:
+                continue
+            if item is _FIN:
+                return
+            pendientes = [item]
+            fin = False
+            while len(pendientes) < self.lote:
+                try:
+                    item = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _FIN:
+                    fin = True
+                    break
+                pendientes.append(item)
+            self._escribir(pendientes)
+            if fin:
+                return
+
+    def vaciar(self):
+        """Escribe de inmediato lo que haya en la cola (p. ej. antes de un feedback)"""
+        pendientes = []
+        while True:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is _FIN:
+                self._cola.put(_FIN)
+                break
+            pendientes.append(item)
+        for i in range(0, len(pendientes), self.lote):
+            self._escribir(pendientes[i:i + self.lote])
+        # Esperar un lote que el hilo ya haya tomado
+        with self._escritura_lock:
+            pass
+
+    def _insertar(self, cur, consultas: List[Dict[str, Any]], respuestas: List[Dict[str, Any]]):
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO rag_consultas (
+                id, usuario_id, pregunta_original, pregunta_normalizada,
+                tipo_consulta, ip_cliente, user_agent,
+                tiempo_respuesta_ms, metodo_resolucion
+            ) VALUES %s
+        """, [(
+            c['id'], c['usuario_id'], c['pregunta'], c['pregunta'], c['pregunta'],
+            c.get('ip_cliente'), c.get('user_agent'),
+            c.get('tiempo_respuesta_ms'), c.get('metodo_resolucion')
+        ) for c in consultas],
+            template="(%s, %s, %s, normalizar_pregunta(%s), clasificar_tipo_consulta(%s), %s, %s, %s, %s)",
+            page_size=self.lote)
+        if respuestas:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO rag_respuestas (
+                    id, consulta_id, respuesta_texto, fuentes_utilizadas,
+                    confianza_score, metodo_generacion, datos_estructurados, metadatos_llm
+                ) VALUES %s
+            """, [(
+                r['id'], r['consulta_id'], r['texto'], r['fuentes'],
+                r['confianza'], r['metodo'], r['datos_estructurados'], r['metadatos_llm']
+            ) for r in respuestas], page_size=self.lote)
+
+    def _escribir_por_fila(self, conn, pendientes) -> int:
+        """
+        Reintenta un lote fallido traza por traza, cada una en su SAVEPOINT:
+        una fila inválida ya no descarta las demás. Devuelve las fallidas.
+        """
+        fallidas = 0
+        with conn.cursor() as cur:
+            for consulta, respuesta in pendientes:
+                cur.execute("SAVEPOINT traza")
+                try:
+                    self._insertar(cur, [consulta], [respuesta] if respuesta is not None else [])
+                    cur.execute("RELEASE SAVEPOINT traza")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT traza")
+                    fallidas += 1
+                    logger.error(f"Traza RAG descartada (consulta {consulta.get('id')}): {e}")
+        conn.commit()
+        return fallidas
+
+    def _escribir(self, pendientes):
+        if not pendientes:
+            return
+        consultas = [c for c, _ in pendientes]
+        respuestas = [r for _, r in pendientes if r is not None]
+        with self._escritura_lock:
+            try:
+                conn = self.conectar()
+            except Exception as e:
+                logger.error(f"Sin conexión para escribir {len(pendientes)} trazas RAG: {e}")
+                return
+            try:
+                with conn.cursor() as cur:
+                    self._insertar(cur, consultas, respuestas)
+                conn.commit()
+                logger.info(f"Trazas RAG escritas: {len(consultas)} consultas, {len(respuestas)} respuestas")
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"Lote de {len(pendientes)} trazas RAG rechazado ({e}); reintentando por fila")
+                try:
+                    fallidas = self._escribir_por_fila(conn, pendientes)
+                    logger.info(f"Trazas RAG escritas por fila: {len(pendientes) - fallidas} de {len(pendientes)}")
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Error escribiendo {len(pendientes)} trazas RAG: {e}")
+            finally:
+                conn.close()
+
+    def cerrar(self, timeout: float = 30.0):
+        """Vacía la cola y detiene el hilo escritor"""
+        if self._cerrado:
+            return
+        self._cerrado = True
+        if self._hilo is not None and self._hilo.is_alive():
+            self._cola.put(_FIN)
+            self._hilo.join(timeout)
+        # Lo que quede (hilo no iniciado o encolado tras el fin)
+        self.vaciar()
+
+
+_escritor: Optional[EscritorTrazas] = None
+_escritor_lock = threading.Lock()
+
+
+def obtener_escritor_trazas(conectar: Callable[[], Any]) -> EscritorTrazas:
+    """Escritor global del proceso (se vacía automáticamente al salir)"""
+    global _escritor
+    if _escritor is None:
+        with _escritor_lock:
+            if _escritor is None:
+                _escritor = EscritorTrazas(conectar)
+                atexit.register(_escritor.cerrar)
+    return _escritor
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Índice vectorial local (IVF) sobre los embeddings MEL de los chunks
+
+scripts/chunqueo_semantico_mel.py genera un `mel_embedding` de 1024
+dimensiones por chunk en chunks_semanticos_mel_json/, pero toda la búsqueda
+semántica iba a Azure. Este módulo construye offline un índice IVF-Flat con
+numpy:
+
+- Cuantizador grueso: k-means esférico (similitud coseno) con `nlist`
+  centroides; cada vector normalizado se guarda en la lista de su centroide,
+  contiguo en una matriz float32.
+- Búsqueda: se eligen las `nprobe` listas más cercanas a la consulta y se
+  puntúan sus vectores con un único producto matriz-vector + argpartition.
+- Filtros por documento_id / archivo; si el filtro deja pocos vectores se
+  busca de forma exacta sobre ellos.
+- guardar()/cargar() en un directorio (.npy + JSON); los vectores se abren
+  con mmap, sin copiarlos a memoria.
+- benchmark_recall() mide recall@k y latencia contra la búsqueda exacta.
+
+Además RecuperadorLocalMEL (modelo IIC/MEL + índice) sirve como recuperador
+de baja latencia y como respaldo cuando Azure Search falla o no responde
+(RAG_INDICE_MEL_DIR).
+
+Uso:
+    python -m src.core.indice_vectorial_local construir --entrada chunks_semanticos_mel_json --salida indices/mel
+    python -m src.core.indice_vectorial_local benchmark --indice indices/mel -k 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .almacen_embeddings import AlmacenEmbeddings
+except ImportError:
+    from almacen_embeddings import AlmacenEmbeddings
+
+logger = logging.getLogger(__name__)
+
+VERSION_FORMATO = 1
+
+# Si un filtro deja como máximo esta cantidad de vectores se buscan todos (exacto)
+_MAX_FILTRADOS_EXACTO = 20000
+
+
+# Subdirectorio (dentro de chunks_semanticos_mel_json) con el AlmacenEmbeddings de los chunks
+DIRECTORIO_EMBEDDINGS_MEL = 'embeddings_mel'
+
+
+def _normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    matriz = np.asarray(matriz, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def _top_k(puntajes: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k mayores puntajes, ordenados de mayor a menor"""
+    if k >= len(puntajes):
+        return np.argsort(-puntajes)
+    candidatos = np.argpartition(-puntajes, k - 1)[:k]
+    return candidatos[np.argsort(-puntajes[candidatos])]
+
+
+def _asignar(vectores: np.ndarray, centroides: np.ndarray, bloque: int = 16384) -> np.ndarray:
+    """Centroide más cercano de cada vector, por bloques (sin la matriz n x nlist completa)"""
+    asignacion = np.empty(len(vectores), dtype=np.int32)
+    for i in range(0, len(vectores), bloque):
+        asignacion[i:i + bloque] = np.argmax(vectores[i:i + bloque] @ centroides.T, axis=1)
+    return asignacion
+
+
+def _kmeans_esferico(vectores: np.ndarray, nlist: int, iteraciones: int = 15,
+                     muestra: int = 100000, semilla: int = 42) -> np.ndarray:
+    """Centroides normalizados (k-means con similitud coseno) sobre una muestra"""
+    rng = np.random.default_rng(semilla)
+    if len(vectores) > muestra:
+        vectores = vectores[np.sort(rng.choice(len(vectores), muestra, replace=False))]
+    centroides = vectores[rng.choice(len(vectores), nlist, replace=False)].copy()
+    for _ in range(iteraciones):
+        asignacion = _asignar(vectores, centroides)
+        conteos = np.bincount(asignacion, minlength=nlist)
+        orden = np.argsort(asignacion, kind='stable')
+        inicios = np.concatenate([[0], np.cumsum(conteos)[:-1]])
+        no_vacios = conteos > 0
+        centroides[no_vacios] = np.add.reduceat(vectores[orden], inicios[no_vacios], axis=0)
+        # Centroides vacíos: se reinician en vectores al azar
+        vacios = np.flatnonzero(~no_vacios)
+        if len(vacios):
+            centroides[vacios] = vectores[rng.choice(len(vectores), len(vacios), replace=False)]
+        centroides = _normalizar_filas(centroides)
+    return centroides
+
+
+class IndiceVectorialLocal:
+    """Índice IVF-Flat (coseno) con ids de chunk y documento por fila"""
+
+    def __init__(self, centroides: np.ndarray, vectores: np.ndarray, inicios: np.ndarray,
+                 chunk_ids: List[str], documentos: np.ndarray, nombres_documentos: List[str],
+                 archivos: List[str], nprobe: Optional[int] = None, metadatos: Optional[Dict] = None,
+                 fuentes: Optional[List[str]] = None):
+        self.centroides = centroides           # (nlist, dim) normalizados
+        self.vectores = vectores               # (n, dim) normalizados, agrupados por lista
+        self.inicios = inicios                 # (nlist + 1,) fila inicial de cada lista
+        self.chunk_ids = chunk_ids             # id de chunk por fila
+        self.documentos = documentos           # (n,) código de documento por fila
+        self.nombres_documentos = nombres_documentos  # código -> documento_id
+        self.archivos = archivos               # código -> archivo
+        self.fuentes = fuentes or archivos     # código -> JSON de chunks de origen
+        self.nprobe = nprobe or int(os.getenv('RAG_INDICE_NPROBE', '16'))
+        self.metadatos = metadatos or {}
+        self._codigo_documento = {d: i for i, d in enumerate(nombres_documentos)}
+        self._fila_chunk: Optional[Dict[str, int]] = None
+
+    # --- Construcción ---
+
+    @classmethod
+    def construir(cls, chunks: Iterable[Dict[str, Any]], nlist: Optional[int] = None,
+                  clave_embedding: str = 'mel_embedding', **metadatos) -> "IndiceVectorialLocal":
+        """
+        Construye el índice a partir de dicts con chunk_id, documento_id,
+        archivo, json_origen y el embedding (ver leer_chunks_mel).
+        """
+        inicio = time.time()
+        chunk_ids, codigos, vectores = [], [], []
+        nombres_documentos: List[str] = []
+        archivos: List[str] = []
+        fuentes: List[str] = []
+        codigo_documento: Dict[str, int] = {}
+        for chunk in chunks:
+            documento_id = str(chunk.get('documento_id', ''))
+            if documento_id not in codigo_documento:
+                codigo_documento[documento_id] = len(nombres_documentos)
+                nombres_documentos.append(documento_id)
+                archivos.append(chunk.get('archivo', ''))
+                fuentes.append(chunk.get('json_origen', chunk.get('archivo', '')))
+            chunk_ids.append(chunk['chunk_id'])
+            codigos.append(codigo_documento[documento_id])
+            vectores.append(np.asarray(chunk[clave_embedding], dtype=np.float32))
+        if not vectores:
+            raise ValueError("No hay chunks con embedding para indexar")
+
+        matriz = _normalizar_filas(np.vstack(vectores))
+        n = len(matriz)
+        nlist = nlist or max(1, min(int(4 * np.sqrt(n)), n // 39 or 1))
+        centroides = _kmeans_esferico(matriz, nlist) if nlist > 1 else _normalizar_filas(matriz.mean(axis=0)[None, :])
+
+        asignacion = _asignar(matriz, centroides)
+        orden = np.argsort(asignacion, kind='stable')
+        inicios = np.searchsorted(asignacion[orden], np.arange(nlist + 1)).astype(np.int64)
+
+        metadatos.update({'dim': int(matriz.shape[1]), 'n': n, 'nlist': nlist})
+        indice = cls(centroides, matriz[orden], inicios, [chunk_ids[i] for i in orden],
+                     np.asarray(codigos, dtype=np.int32)[orden], nombres_documentos, archivos,
+                     metadatos=metadatos, fuentes=fuentes)
+        logger.info(f"Índice local construido: {n} vectores, {nlist} listas en {time.time() - inicio:.1f}s")
+        return indice
+
+    # --- Búsqueda ---
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def _mascara_filtros(self, filtros: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Filas permitidas por los filtros (None = todas)"""
+        if not filtros:
+            return None
+        codigos = set(range(len(self.nombres_documentos)))
+        for campo, valores in filtros.items():
+            if valores is None:
+                continue
+            valores = {valores} if isinstance(valores, str) else set(valores)
+            if campo == 'documento_id':
+                permitidos = {self._codigo_documento[v] for v in valores if v in self._codigo_documento}
+            elif campo == 'archivo':
+                permitidos = {i for i, a in enumerate(self.archivos) if a in valores}
+            else:
+                raise ValueError(f"Filtro no soportado: {campo}")
+            codigos &= permitidos
+        return np.isin(self.documentos, np.fromiter(codigos, dtype=np.int32, count=len(codigos)))
+
+    def _resultados(self, filas: np.ndarray, puntajes: np.ndarray) -> List[Dict[str, Any]]:
+        resultados = []
+        for fila, puntaje in zip(filas, puntajes):
+            codigo = int(self.documentos[fila])
+            resultados.append({
+                'chunk_id': self.chunk_ids[fila],
+                'documento_id': self.nombres_documentos[codigo],
+                'archivo': self.archivos[codigo],
+                'similitud': float(puntaje),
+            })
+        return resultados
+
+    def buscar_exacto(self, vector: Sequence[float], k: int = 10,
+                      filtros: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Búsqueda exacta (fuerza bruta); referencia para el benchmark"""
+        consulta = _normalizar_filas(np.asarray(vector)[None, :])[0]
+        mascara = self._mascara_filtros(filtros)
+        filas = np.arange(len(self)) if mascara is None else np.flatnonzero(mascara)
+        if not len(filas):
+            return []
+        puntajes = np.asarray(self.vectores[filas] @ consulta if mascara is not None else self.vectores @ consulta)
+        mejores = _top_k(puntajes, k)
+        return self._resultados(filas[mejores], puntajes[mejores])
+
+    def buscar(self, vector: Sequence[float], k: int = 10, filtros: Optional[Dict[str, Any]] = None,
+               nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Los k chunks más similares (coseno) al vector de consulta.
+
+        Args:
+            filtros: {'documento_id': id o lista, 'archivo': nombre o lista}
+            nprobe: Listas a recorrer (más = mejor recall, más lento)
+
+        Returns:
+            [{'chunk_id', 'documento_id', 'archivo', 'similitud'}] de mayor a menor similitud
+        """
+        mascara = self._mascara_filtros(filtros)
+        if mascara is not None and mascara.sum() <= _MAX_FILTRADOS_EXACTO:
+            return self.buscar_exacto(vector, k, filtros)
+
+        consulta = _normalizar_filas(np.asarray(vector)[None, :])[0]
+        nprobe = min(nprobe or self.nprobe, len(self.centroides))
+        listas = _top_k(self.centroides @ consulta, nprobe)
+        filas = np.concatenate([np.arange(self.inicios[l], self.inicios[l + 1]) for l in listas])
+        if mascara is not None:
+            filas = filas[mascara[filas]]
+        if not len(filas):
+            return []
+        # Las filas de cada lista son contiguas: se leen por rangos del memmap
+        bloques = [self.vectores[self.inicios[l]:self.inicios[l + 1]] for l in listas]
+        puntajes = np.concatenate([b @ consulta for b in bloques]) if mascara is None else self.vectores[filas] @ consulta
+        mejores = _top_k(np.asarray(puntajes), k)
+        return self._resultados(filas[mejores], np.asarray(puntajes)[mejores])
+
+    def fuente_de(self, documento_id: str) -> Optional[str]:
+        """Nombre del JSON de chunks del que salió un documento"""
+        codigo = self._codigo_documento.get(documento_id)
+        return None if codigo is None else self.fuentes[codigo]
+
+    def vector_de(self, chunk_id: str) -> Optional[np.ndarray]:
+        """Vector normalizado de un chunk indexado"""
+        if self._fila_chunk is None:
+            self._fila_chunk = {c: i for i, c in enumerate(self.chunk_ids)}
+        fila = self._fila_chunk.get(chunk_id)
+        return None if fila is None else np.asarray(self.vectores[fila])
+
+    # --- Persistencia ---
+
+    def guardar(self, directorio: str):
+        """Guarda el índice (vectores y centroides en .npy, ids en JSON)"""
+        os.makedirs(directorio, exist_ok=True)
+        np.save(os.path.join(directorio, 'vectores.npy'), np.asarray(self.vectores, dtype=np.float32))
+        np.save(os.path.join(directorio, 'centroides.npy'), self.centroides)
+        np.save(os.path.join(directorio, 'inicios.npy'), self.inicios)
+        np.save(os.path.join(directorio, 'documentos.npy'), self.documentos)
+        with open(os.path.join(directorio, 'ids.json'), 'w', encoding='utf-8') as f:
+            json.dump({'chunk_ids': self.chunk_ids, 'documentos': self.nombres_documentos,
+                       'archivos': self.archivos, 'fuentes': self.fuentes}, f, ensure_ascii=False)
+        with open(os.path.join(directorio, 'indice.json'), 'w', encoding='utf-8') as f:
+            json.dump(dict(self.metadatos, version=VERSION_FORMATO, nprobe=self.nprobe), f, indent=2)
+        logger.info(f"Índice local guardado en {directorio}")
+
+    @classmethod
+    def cargar(cls, directorio: str, mmap: bool = True) -> "IndiceVectorialLocal":
+        """Carga un índice guardado; con mmap=True los vectores no se copian a memoria"""
+        with open(os.path.join(directorio, 'indice.json'), encoding='utf-8') as f:
+            metadatos = json.load(f)
+        if metadatos.get('version') != VERSION_FORMATO:
+            raise ValueError(f"Versión de índice no soportada: {metadatos.get('version')}")
+        with open(os.path.join(directorio, 'ids.json'), encoding='utf-8') as f:
+            ids = json.load(f)
+        return cls(
+            centroides=np.load(os.path.join(directorio, 'centroides.npy')),
+            vectores=np.load(os.path.join(directorio, 'vectores.npy'), mmap_mode='r' if mmap else None),
+            inicios=np.load(os.path.join(directorio, 'inicios.npy')),
+            chunk_ids=ids['chunk_ids'],
+            documentos=np.load(os.path.join(directorio, 'documentos.npy')),
+            nombres_documentos=ids['documentos'],
+            archivos=ids['archivos'],
+            fuentes=ids.get('fuentes'),
+            nprobe=metadatos.pop('nprobe', None),
+            metadatos=metadatos,
+        )
+
+
+# --- Datos MEL ---
+
+def leer_chunks_mel(directorio: str) -> Iterable[Dict[str, Any]]:
+    """
+    Chunks con mel_embedding de los JSON de chunqueo_semantico_mel.py, con el
+    nombre de su JSON en 'json_origen'. Los embeddings se toman del almacén
+    `embeddings_mel/` del directorio si existe; los JSON antiguos los traen
+    en línea.
+    """
+    almacen = None
+    if os.path.exists(os.path.join(directorio, DIRECTORIO_EMBEDDINGS_MEL, 'manifiesto.json')):
+        almacen = AlmacenEmbeddings(os.path.join(directorio, DIRECTORIO_EMBEDDINGS_MEL))
+    for nombre in sorted(os.listdir(directorio)):
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, nombre), encoding='utf-8') as f:
+                documento = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"No se pudo leer {nombre}: {e}")
+            continue
+        for chunk in documento.get('chunks', []):
+            if not chunk.get('mel_embedding') and almacen is not None:
+                chunk['mel_embedding'] = almacen.obtener(chunk.get('chunk_id'))
+            if chunk.get('mel_embedding') is not None:
+                chunk['json_origen'] = nombre
+                yield chunk
+
+
+def benchmark_recall(indice: IndiceVectorialLocal, k: int = 10, consultas: int = 200,
+                     nprobes: Sequence[int] = (1, 4, 8, 16, 32, 64), semilla: int = 7) -> List[Dict[str, float]]:
+    """
+    Recall@k del índice frente a la búsqueda exacta, usando como consultas
+    vectores del propio índice con ruido gaussiano.
+    """
+    rng = np.random.default_rng(semilla)
+    filas = rng.choice(len(indice), min(consultas, len(indice)), replace=False)
+    base = np.asarray(indice.vectores[np.sort(filas)])
+    # Ruido con norma ~0.1 (los vectores están normalizados)
+    vectores = base + rng.normal(0, 0.1 / np.sqrt(base.shape[1]), base.shape).astype(np.float32)
+
+    inicio = time.time()
+    exactos = [{r['chunk_id'] for r in indice.buscar_exacto(v, k)} for v in vectores]
+    ms_exacto = (time.time() - inicio) * 1000 / len(vectores)
+
+    reporte = []
+    for nprobe in nprobes:
+        if nprobe > len(indice.centroides):
+            break
+        inicio = time.time()
+        aproximados = [{r['chunk_id'] for r in indice.buscar(v, k, nprobe=nprobe)} for v in vectores]
+        ms = (time.time() - inicio) * 1000 / len(vectores)
+        recall = float(np.mean([len(a & e) / max(len(e), 1) for a, e in zip(aproximados, exactos)]))
+        reporte.append({'nprobe': nprobe, 'recall': recall, 'ms_consulta': ms, 'ms_exacto': ms_exacto})
+    return reporte
+
+
+class RecuperadorLocalMEL:
+    """Codifica la pregunta con IIC/MEL y busca en el índice local"""
+
+    def __init__(self, directorio_indice: str, directorio_chunks: Optional[str] = None,
+                 modelo: str = 'IIC/MEL'):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self._torch = torch
+        self.indice = IndiceVectorialLocal.cargar(directorio_indice)
+        self.directorio_chunks = directorio_chunks or self.indice.metadatos.get('origen')
+        self.tokenizer = AutoTokenizer.from_pretrained(modelo)
+        self.modelo = AutoModel.from_pretrained(modelo).eval()
+        self._lock = threading.Lock()
+
+    def codificar(self, texto: str) -> np.ndarray:
+        """Embedding [CLS], igual que chunqueo_semantico_mel.get_sentence_embeddings"""
+        entradas = self.tokenizer([texto], padding=True, truncation=True, return_tensors='pt')
+        with self._lock, self._torch.no_grad():
+            salida = self.modelo(**entradas)
+        return salida.last_hidden_state[:, 0, :].cpu().numpy()[0]
+
+    def _textos(self, resultados: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Chunks completos de los resultados, leídos de sus JSON de origen"""
+        chunks = {}
+        if not self.directorio_chunks:
+            return chunks
+        buscados = {r['chunk_id'] for r in resultados}
+        # El JSON de salida se nombra como la entrada, no por documento_id
+        fuentes = {self.indice.fuente_de(r['documento_id']) or r['archivo'] for r in resultados}
+        for fuente in fuentes:
+            try:
+                with open(os.path.join(self.directorio_chunks, fuente), encoding='utf-8') as f:
+                    for chunk in json.load(f).get('chunks', []):
+                        if chunk.get('chunk_id') in buscados:
+                            chunks[chunk['chunk_id']] = chunk
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"No se pudo leer el chunk de {fuente}: {e}")
+        return chunks
+
+    def buscar(self, pregunta: str, k: int = 5, filtros: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Resultados del índice con el texto del chunk ('texto_chunk', 'posicion')"""
+        resultados = self.indice.buscar(self.codificar(pregunta), k, filtros)
+        chunks = self._textos(resultados)
+        for resultado in resultados:
+            chunk = chunks.get(resultado['chunk_id'], {})
+            resultado['texto_chunk'] = chunk.get('texto_chunk', '')
+            resultado['posicion'] = chunk.get('posicion')
+        return resultados
+
+
+_recuperador: Optional[RecuperadorLocalMEL] = None
+_recuperador_cargado = False
+_recuperador_lock = threading.Lock()
+
+
+def obtener_recuperador_local() -> Optional[RecuperadorLocalMEL]:
+    """Recuperador del proceso si RAG_INDICE_MEL_DIR está configurado (None si no)"""
+    global _recuperador, _recuperador_cargado
+    if not _recuperador_cargado:
+        with _recuperador_lock:
+            if not _recuperador_cargado:
+                directorio = os.getenv('RAG_INDICE_MEL_DIR')
+                if directorio:
+                    try:
+                        _recuperador = RecuperadorLocalMEL(directorio, os.getenv('RAG_CHUNKS_MEL_DIR'))
+                        logger.info(f"Índice MEL local cargado: {len(_recuperador.indice)} vectores")
+                    except Exception as e:
+                        logger.warning(f"Índice MEL local no disponible: {e}")
+                _recuperador_cargado = True
+    return _recuperador
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice vectorial local sobre los embeddings MEL")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    construir = sub.add_parser('construir', help="Construye el índice desde los JSON de chunks MEL")
+    construir.add_argument('--entrada', required=True, help="Directorio chunks_semanticos_mel_json")
+    construir.add_argument('--salida', required=True, help="Directorio del índice")
+    construir.add_argument('--nlist', type=int, default=None, help="Listas IVF (default 4·√n)")
+
+    benchmark = sub.add_parser('benchmark', help="Recall@k y latencia frente a búsqueda exacta")
+    benchmark.add_argument('--indice', required=True)
+    benchmark.add_argument('-k', type=int, default=10)
+    benchmark.add_argument('--consultas', type=int, default=200)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.comando == 'construir':
+        indice = IndiceVectorialLocal.construir(leer_chunks_mel(args.entrada), nlist=args.nlist,
+                                                origen=os.path.abspath(args.entrada), modelo='IIC/MEL')
+        indice.guardar(args.salida)
+        print(f"✅ Índice construido: {len(indice)} vectores, {indice.metadatos['nlist']} listas → {args.salida}")
+    else:
+        indice = IndiceVectorialLocal.cargar(args.indice)
+        print(f"📊 Recall@{args.k} ({len(indice)} vectores, {len(indice.centroides)} listas)")
+        for fila in benchmark_recall(indice, args.k, args.consultas):
+            print(f"   nprobe={fila['nprobe']:>3}  recall={fila['recall']:.3f}  "
+                  f"{fila['ms_consulta']:.2f} ms/consulta (exacto {fila['ms_exacto']:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Registro de clientes compartidos por proceso (SistemaRAGTrazable,
+AzureSearchVectorizado, cliente de chat de Azure OpenAI)
+
+core/consultas.py creaba un SistemaRAGTrazable por llamada y lo ejecutaba con
+asyncio.run(): cada consulta pagaba la construcción de los clientes httpx /
+AzureOpenAI / SearchClient y nuevos handshakes TLS, porque los clientes async
+quedan ligados al event loop que muere al terminar asyncio.run(). Aquí:
+
+- obtener(nombre, fabrica) construye cada instancia una sola vez (perezoso,
+  seguro entre hilos) y la reutiliza con sus conexiones keep-alive.
+- ejecutar(corutina) corre la corutina en un event loop de fondo que vive
+  todo el proceso, de modo que los clientes async también se reutilizan
+  entre llamadas síncronas (Dash, core/consultas.py).
+- cerrar() (y atexit) cierra las instancias en orden inverso de creación;
+  las funciones de cierre async se ejecutan en el loop de fondo.
+- ClientesPorLoop: clientes async (AsyncAzureOpenAI, SearchClient aio) uno
+  por event loop, sin reemplazar el de un loop por el de otro sin cerrarlo.
+"""
+
+import asyncio
+import atexit
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RegistroClientes:
+    """Instancias compartidas + event loop de fondo para llamadores síncronos"""
+
+    def __init__(self):
+        self._instancias: Dict[str, Any] = {}
+        self._cierres: List[Tuple[str, Callable[[Any], Any]]] = []
+        self._lock = threading.RLock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._cerrado = False
+
+    # --- Instancias ---
+
+    def obtener(self, nombre: str, fabrica: Callable[[], Any],
+                cerrar: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        Instancia registrada con `nombre`; se construye con `fabrica` la primera vez.
+        `cerrar(instancia)` se llama en el shutdown (puede devolver una corutina).
+        """
+        instancia = self._instancias.get(nombre)
+        if instancia is not None:
+            return instancia
+        with self._lock:
+            instancia = self._instancias.get(nombre)
+            if instancia is None:
+                instancia = fabrica()
+                self._instancias[nombre] = instancia
+                if cerrar is not None:
+                    self._cierres.append((nombre, cerrar))
+                logger.info(f"Cliente compartido creado: {nombre}")
+        return instancia
+
+    # --- Event loop de fondo ---
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop de fondo (se arranca al primer uso)"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    listo = threading.Event()
+
+                    def _correr():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(listo.set)
+                        loop.run_forever()
+
+                    self._hilo = threading.Thread(target=_correr, name='rag-clientes', daemon=True)
+                    self._hilo.start()
+                    listo.wait()
+                    self._loop = loop
+        return self._loop
+
+    def ejecutar(self, corutina: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        Ejecuta la corutina en el loop de fondo y espera su resultado.
+        Sustituye a asyncio.run() en código síncrono; no llamar desde el propio loop.
+        """
+        loop = self.loop
+        if threading.current_thread() is self._hilo:
+            raise RuntimeError("ejecutar() no puede llamarse desde el event loop de fondo")
+        return asyncio.run_coroutine_threadsafe(corutina, loop).result(timeout)
+
+    # --- Cierre ---
+
+    def cerrar(self, timeout: float = 30.0):
+        """Cierra las instancias (orden inverso de creación) y detiene el loop de fondo"""
+        with self._lock:
+            if self._cerrado:
+                return
+            self._cerrado = True
+            cierres, self._cierres = self._cierres, []
+        for nombre, cerrar in reversed(cierres):
+            try:
+                resultado = cerrar(self._instancias[nombre])
+                if asyncio.iscoroutine(resultado):
+                    self.ejecutar(resultado, timeout)
+            except Exception as e:
+                logger.warning(f"Error cerrando cliente compartido {nombre}: {e}")
+        self._instancias.clear()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._hilo.join(timeout)
+            self._loop.close()
+            self._loop = None
+
+
+class ClientesPorLoop:
+    """
+    Un cliente async por event loop vivo (sus sesiones HTTP quedan ligadas al
+    loop en que se crean). cerrar() cierra el del loop actual y programa el
+    cierre de los de otros loops que siguen corriendo. Los de loops ya cerrados
+    no tienen dónde cerrarse: se sueltan para que el GC libere sus sockets.
+    """
+
+    def __init__(self, fabrica: Callable[[], Any], cerrar: Callable[[Any], Awaitable], nombre: str = 'cliente'):
+        self._fabrica = fabrica
+        self._cerrar = cerrar
+        self._nombre = nombre
+        self._por_loop: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._lock = threading.Lock()
+
+    def obtener(self) -> Any:
+        """Cliente del event loop actual (se crea al primer uso en ese loop)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for anterior in [l for l in self._por_loop if l.is_closed()]:
+                del self._por_loop[anterior]
+                logger.info(f"{self._nombre}: descartado el cliente de un event loop cerrado")
+            cliente = self._por_loop.get(loop)
+            if cliente is None:
+                cliente = self._por_loop[loop] = self._fabrica()
+        return cliente
+
+    async def _cerrar_seguro(self, cliente: Any):
+        try:
+            await self._cerrar(cliente)
+        except Exception as e:
+            logger.warning(f"Error cerrando {self._nombre}: {e}")
+
+    async def cerrar(self):
+        """Cierra los clientes de todos los loops que todavía pueden cerrarlos"""
+        actual = asyncio.get_running_loop()
+        with self._lock:
+            clientes, self._por_loop = list(self._por_loop.items()), {}
+        for loop, cliente in clientes:
+            if loop is actual:
+                await self._cerrar_seguro(cliente)
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(self._cerrar_seguro(cliente), loop)
+
+
+_registro: Optional[RegistroClientes] = None
+_registro_lock = threading.Lock()
+
+
+def obtener_registro_clientes() -> RegistroClientes:
+    """Registro global del proceso (se cierra automáticamente al salir)"""
+    global _registro
+    if _registro is None:
+        with _registro_lock:
+            if _registro is None:
+                _registro = RegistroClientes()
+                atexit.register(_registro.cerrar)
+    return _registro
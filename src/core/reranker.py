@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Etapa de reranking local entre Azure Search y el LLM
+
+_resolver_consulta_rag enviaba al LLM los 5 primeros chunks de
+buscar_semanticamente tal como los ordenaba Azure. Aquí se recupera un
+conjunto más amplio de candidatos (RAG_RERANKER_CANDIDATOS) y se vuelve a
+puntuar en CPU antes del empaquetado:
+
+- RerankerBM25 (por defecto): BM25 sobre texto + análisis de los candidatos,
+  sin dependencias.
+- RerankerCrossEncoder: cross-encoder de sentence-transformers (opcional,
+  RAG_RERANKER=cross-encoder); si la librería o el modelo no están
+  disponibles se usa BM25.
+
+El puntaje final fusiona por rango (RRF) el orden de Azure y el del reranker.
+La etapa tiene un tope de latencia: si el reranker no termina a tiempo o
+falla, se devuelve el orden original de Azure. Al vencer el tope se marca la
+tarea como cancelada y el cross-encoder se detiene en el siguiente lote; los
+rerankings corren en un executor propio con cupo acotado (si está lleno se
+usa directamente el orden de Azure, sin encolar).
+
+Variables de entorno:
+    RAG_RERANKER              bm25 | cross-encoder | ninguno (default bm25)
+    RAG_RERANKER_MODELO       Modelo del cross-encoder
+    RAG_RERANKER_CANDIDATOS   Candidatos a recuperar de Azure (default 50)
+    RAG_RERANKER_TOP          Items que pasan al LLM (default 5)
+    RAG_RERANKER_TIMEOUT      Segundos máximos del reranking (default 0.5 con
+                              BM25, 3 con cross-encoder: ~50 pares en CPU)
+    RAG_RERANKER_LOTE         Pares por predict del cross-encoder (default 16)
+    RAG_RERANKER_HILOS        Hilos del executor de reranking (default 2); admite
+                              el doble de rerankings en curso o en espera
+    RAG_RERANKER_PESO_BUSQUEDA  Peso del orden de Azure en la fusión (default 0.5)
+"""
+
+import asyncio
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    from sentence_transformers import CrossEncoder
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_TRADUCCION_TILDES = str.maketrans('áéíóúüñÁÉÍÓÚÜÑ', 'aeiouunAEIOUUN')
+_PALABRA = re.compile(r'\w+')
+_STOPWORDS = frozenset("""
+    de la que el en y a los del se las por un para con no una su al lo como mas pero sus le ya o
+    fue este ha si porque esta son entre cuando muy sin sobre ser tiene tambien me hasta hay donde
+    quien desde todo nos durante todos uno les ni contra otros ese eso ante ellos e esto mi antes
+    algunos unos yo otro otras otra el tanto esa estos mucho quienes nada muchos cual sea poco
+    ella estar estas algunas algo nosotros cuales sabes dime cual
+""".split())
+
+# Constante de la fusión por rango recíproco
+_K_RRF = 60
+
+
+class RerankingCancelado(Exception):
+    """El reranking se abandonó (venció el tope de latencia)"""
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Palabras en minúscula, sin tildes ni stopwords"""
+    palabras = _PALABRA.findall((texto or '').translate(_TRADUCCION_TILDES).lower())
+    return [p for p in palabras if len(p) > 2 and p not in _STOPWORDS]
+
+
+class RerankerBM25:
+    """BM25 calculado sobre el propio conjunto de candidatos"""
+
+    nombre = 'bm25'
+    timeout_por_defecto = 0.5
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def puntuar(self, pregunta: str, textos: Sequence[str],
+                cancelado: Optional[threading.Event] = None) -> List[float]:
+        terminos = set(tokenizar(pregunta))
+        documentos = [Counter(tokenizar(t)) for t in textos]
+        if not terminos or not documentos:
+            return [0.0] * len(textos)
+
+        n = len(documentos)
+        longitud_media = sum(sum(d.values()) for d in documentos) / n or 1.0
+        idf = {}
+        for termino in terminos:
+            df = sum(1 for d in documentos if termino in d)
+            idf[termino] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+        puntajes = []
+        for documento in documentos:
+            longitud = sum(documento.values())
+            puntaje = 0.0
+            for termino in terminos:
+                tf = documento.get(termino, 0)
+                if tf:
+                    puntaje += idf[termino] * tf * (self.k1 + 1) / (
+                        tf + self.k1 * (1 - self.b + self.b * longitud / longitud_media))
+            puntajes.append(puntaje)
+        return puntajes
+
+
+class RerankerCrossEncoder:
+    """Cross-encoder (pregunta, fragmento) de sentence-transformers, en CPU"""
+
+    nombre = 'cross-encoder'
+    timeout_por_defecto = 3.0
+
+    def __init__(self, modelo: Optional[str] = None, lote: Optional[int] = None):
+        self.modelo = modelo or os.getenv('RAG_RERANKER_MODELO', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
+        self.lote = lote or int(os.getenv('RAG_RERANKER_LOTE', '16'))
+        self._modelo = CrossEncoder(self.modelo, device='cpu', max_length=512)
+
+    def puntuar(self, pregunta: str, textos: Sequence[str],
+                cancelado: Optional[threading.Event] = None) -> List[float]:
+        """Puntajes por lotes; entre lotes revisa `cancelado` y abandona si está activo"""
+        puntajes: List[float] = []
+        for inicio in range(0, len(textos), self.lote):
+            if cancelado is not None and cancelado.is_set():
+                raise RerankingCancelado()
+            pares = [(pregunta, t) for t in textos[inicio:inicio + self.lote]]
+            puntajes.extend(float(p) for p in self._modelo.predict(pares, batch_size=self.lote))
+        return puntajes
+
+
+class EtapaReranking:
+    """Reordena los candidatos de la búsqueda con un tope de latencia y fallback"""
+
+    def __init__(self, reranker=None, top: Optional[int] = None, candidatos: Optional[int] = None,
+                 timeout: Optional[float] = None, peso_busqueda: Optional[float] = None,
+                 hilos: Optional[int] = None):
+        self.reranker = reranker
+        self.top = top or int(os.getenv('RAG_RERANKER_TOP', '5'))
+        self.candidatos = candidatos or int(os.getenv('RAG_RERANKER_CANDIDATOS', '50'))
+        self.timeout = timeout or float(os.getenv(
+            'RAG_RERANKER_TIMEOUT', str(getattr(reranker, 'timeout_por_defecto', 0.5))))
+        self.peso_busqueda = (peso_busqueda if peso_busqueda is not None
+                              else float(os.getenv('RAG_RERANKER_PESO_BUSQUEDA', '0.5')))
+        hilos = hilos or int(os.getenv('RAG_RERANKER_HILOS', '2'))
+        self._executor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='rag-reranker')
+        # Rerankings en curso o en espera: sin este cupo la cola del executor crecería sin límite
+        self._cupo = threading.BoundedSemaphore(hilos * 2)
+        self._lock = threading.Lock()
+        self.metricas = {'reordenadas': 0, 'timeouts': 0, 'errores': 0, 'saturadas': 0,
+                         'tiempo_total_ms': 0}
+
+    @property
+    def activo(self) -> bool:
+        return self.reranker is not None
+
+    @property
+    def candidatos_busqueda(self) -> int:
+        """Cuántos resultados pedir a la búsqueda"""
+        return self.candidatos if self.activo else self.top
+
+    @staticmethod
+    def _texto(item: Dict[str, Any]) -> str:
+        return f"{item.get('texto', '')}\n{item.get('analisis', '')}"
+
+    def reordenar(self, pregunta: str, items: List[Dict[str, Any]],
+                  cancelado: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """
+        Los `top` items mejor puntuados (bloqueante, sin tope de latencia).
+        `items` debe venir en el orden de la búsqueda; cada item recibe
+        'puntaje_reranker' con el puntaje fusionado. Si `cancelado` se activa
+        el reranker puede abandonar con RerankingCancelado.
+        """
+        if not self.activo or len(items) <= 1:
+            return items[:self.top]
+
+        inicio = time.time()
+        puntajes = self.reranker.puntuar(pregunta, [self._texto(i) for i in items], cancelado)
+        orden_reranker = sorted(range(len(items)), key=lambda i: puntajes[i], reverse=True)
+        rango_reranker = {idx: rango for rango, idx in enumerate(orden_reranker, 1)}
+
+        fusion = []
+        for rango_busqueda, item in enumerate(items, 1):
+            idx = rango_busqueda - 1
+            puntaje = (self.peso_busqueda / (_K_RRF + rango_busqueda)
+                       + 1.0 / (_K_RRF + rango_reranker[idx]))
+            fusion.append((puntaje, idx))
+        fusion.sort(key=lambda x: x[0], reverse=True)
+
+        seleccion = []
+        for puntaje, idx in fusion[:self.top]:
+            item = dict(items[idx])
+            item['puntaje_reranker'] = round(puntaje, 6)
+            seleccion.append(item)
+
+        with self._lock:
+            self.metricas['reordenadas'] += 1
+            self.metricas['tiempo_total_ms'] += int((time.time() - inicio) * 1000)
+        return seleccion
+
+    async def reordenar_async(self, pregunta: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """reordenar() en un hilo; si excede el timeout o falla, el orden de la búsqueda"""
+        if not self.activo or len(items) <= 1:
+            return items[:self.top]
+        if not self._cupo.acquire(blocking=False):
+            logger.warning(f"Reranking ({self.reranker.nombre}) saturado; se usa el orden de Azure")
+            with self._lock:
+                self.metricas['saturadas'] += 1
+            return items[:self.top]
+        cancelado = threading.Event()
+        futuro = self._executor.submit(self.reordenar, pregunta, items, cancelado)
+        # El cupo se libera al terminar, aunque la espera ya haya vencido
+        futuro.add_done_callback(lambda _: self._cupo.release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+        except asyncio.TimeoutError:
+            cancelado.set()
+            logger.warning(f"Reranking ({self.reranker.nombre}) excedió {self.timeout}s; se usa el orden de Azure")
+            with self._lock:
+                self.metricas['timeouts'] += 1
+        except Exception as e:
+            logger.error(f"Error en reranking ({self.reranker.nombre}): {e}")
+            with self._lock:
+                self.metricas['errores'] += 1
+        return items[:self.top]
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Reordenamientos, timeouts, errores y tiempo medio"""
+        with self._lock:
+            datos = dict(self.metricas)
+        datos['reranker'] = self.reranker.nombre if self.activo else None
+        datos['tiempo_medio_ms'] = datos['tiempo_total_ms'] / datos['reordenadas'] if datos['reordenadas'] else 0.0
+        return datos
+
+
+def _crear_reranker(tipo: str):
+    if tipo in ('ninguno', 'none', ''):
+        return None
+    if tipo == 'cross-encoder':
+        if SENTENCE_TRANSFORMERS_AVAILABLE:
+            try:
+                return RerankerCrossEncoder()
+            except Exception as e:
+                logger.warning(f"No se pudo cargar el cross-encoder, se usa BM25: {e}")
+        else:
+            logger.warning("sentence-transformers no está instalado; se usa BM25 para el reranking")
+    return RerankerBM25()
+
+
+_etapa: Optional[EtapaReranking] = None
+_etapa_lock = threading.Lock()
+
+
+def obtener_etapa_reranking() -> EtapaReranking:
+    """Etapa de reranking global del proceso (el modelo se carga una sola vez)"""
+    global _etapa
+    if _etapa is None:
+        with _etapa_lock:
+            if _etapa is None:
+                _etapa = EtapaReranking(_crear_reranker(os.getenv('RAG_RERANKER', 'bm25').strip().lower()))
+    return _etapa
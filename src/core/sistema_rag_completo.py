@@ -9,8 +9,12 @@ import json
 import time
 import hashlib
 import asyncio
+import functools
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Any, AsyncIterator, Awaitable, Callable
 from datetime import datetime
 from dataclasses import dataclass
 from enum import Enum
@@ -18,7 +22,7 @@ from decimal import Decimal
 
 import psycopg2
 import psycopg2.extras
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
 from dotenv import load_dotenv
 
 # Importar Azure Search 
@@ -30,6 +34,32 @@ except ImportError:
     except ImportError:
         print("WARNING: Azure Search no disponible")
 
+try:
+    from .escritor_trazas import obtener_escritor_trazas
+    from .cache_respuestas import obtener_cache_respuestas, generar_hash_pregunta
+    from .cache_semantico import obtener_cache_semantico
+    from .empaquetador_contexto import EmpaquetadorContexto, ContextoEmpaquetado
+    from .reranker import obtener_etapa_reranking
+    from .registro_clientes import obtener_registro_clientes, ClientesPorLoop
+    from .indice_vectorial_local import obtener_recuperador_local
+except ImportError:
+    from escritor_trazas import obtener_escritor_trazas
+    from cache_respuestas import obtener_cache_respuestas, generar_hash_pregunta
+    from cache_semantico import obtener_cache_semantico
+    from empaquetador_contexto import EmpaquetadorContexto, ContextoEmpaquetado
+    from reranker import obtener_etapa_reranking
+    from registro_clientes import obtener_registro_clientes, ClientesPorLoop
+    from indice_vectorial_local import obtener_recuperador_local
+
+# Pool de conexiones PostgreSQL del proceso (src/core/db_pool.py en escriba-back, core/db_pool.py en la raíz)
+try:
+    from .db_pool import obtener_pool
+except ImportError:
+    try:
+        from core.db_pool import obtener_pool
+    except ImportError:
+        obtener_pool = None
+
 def convert_db_types(obj):
     """Convertir tipos de base de datos a tipos JSON-serializables"""
     if isinstance(obj, Decimal):
@@ -95,6 +125,17 @@ class FeedbackRAG:
     aspectos: Optional[Dict[str, int]] = None  # {precision: 4, relevancia: 5}
     respuesta_esperada: Optional[str] = None
 
+# Receptor de eventos de streaming: emisor(evento, datos), con evento 'fuentes' o 'token'
+EmisorEventos = Callable[[str, Any], Awaitable[None]]
+
+# Executor dedicado para psycopg2 (bloqueante): las consultas a PostgreSQL de
+# los métodos async se ejecutan aquí y no detienen el event loop
+_executor_bd = ThreadPoolExecutor(
+    max_workers=int(os.getenv('RAG_DB_WORKERS', '8')),
+    thread_name_prefix='rag-bd'
+)
+
+
 class SistemaRAGTrazable:
     """Sistema RAG con trazabilidad completa y mejora continua"""
     
@@ -123,6 +164,21 @@ class SistemaRAGTrazable:
         
         self.deployment_name = os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME', 'gpt-4o-mini')
         
+        # Trazas de consultas/respuestas: se escriben por lotes fuera del camino de la respuesta
+        self._trazas = obtener_escritor_trazas(self.get_db_connection)
+
+        # Cache de respuestas: LRU en memoria delante de rag_cache
+        self._cache = obtener_cache_respuestas(self.get_db_connection)
+        # Cache semántico: preguntas parafraseadas por similitud de embeddings
+        self._cache_semantico = obtener_cache_semantico(self.get_db_connection, self._cache)
+        self._empaquetador = EmpaquetadorContexto(modelo=self.deployment_name)
+        self._reranking = obtener_etapa_reranking()
+
+        # Clientes asíncronos: uno por event loop (quedan ligados al loop en que se crean)
+        self._clientes_llm = ClientesPorLoop(self._crear_cliente_llm_async, lambda cliente: cliente.close(),
+                                             nombre='cliente AsyncAzureOpenAI')
+        self._azure_search = None
+        
         # Templates para diferentes tipos de respuesta
         self.templates = {
             'estadisticas': """
@@ -167,73 +223,145 @@ Fuentes: {fuentes_detalle}
         }
 
     def get_db_connection(self):
-        """Obtener conexión a la base de datos"""
-        return psycopg2.connect(**self.db_config)
+        """Conexión prestada por el pool del proceso; close() la devuelve al pool"""
+        if obtener_pool is None:
+            return psycopg2.connect(**self.db_config)
+        return obtener_pool().obtener()
+
+    @contextmanager
+    def _conexion_bd(self):
+        """`with conn` de psycopg2 (commit/rollback) y devolución inmediata de la conexión al pool"""
+        conn = self.get_db_connection()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    async def _en_bd(self, funcion, *args):
+        """Ejecuta una función síncrona de BD en el executor dedicado"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor_bd, functools.partial(funcion, *args))
+
+    @staticmethod
+    def _crear_cliente_llm_async() -> AsyncAzureOpenAI:
+        import httpx
+        return AsyncAzureOpenAI(
+            api_key=os.getenv('AZURE_OPENAI_API_KEY'),
+            api_version=os.getenv('AZURE_OPENAI_API_VERSION', '2024-02-15-preview'),
+            azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
+            http_client=httpx.AsyncClient(
+                timeout=30.0,
+                headers={"User-Agent": "RAG-System/1.0"}
+            )
+        )
+
+    def _cliente_llm_async(self) -> AsyncAzureOpenAI:
+        """Cliente AsyncAzureOpenAI del event loop actual"""
+        return self._clientes_llm.obtener()
+
+    def _azure_search_async(self) -> "AzureSearchVectorizado":
+        """AzureSearchVectorizado compartido por el proceso (sus clientes aio son por event loop)"""
+        if self._azure_search is None:
+            self._azure_search = obtener_azure_search()
+        return self._azure_search
+
+    async def cerrar(self):
+        """Cierra los clientes async (los del loop actual y los de otros loops vivos)"""
+        await self._en_bd(self._trazas.vaciar)
+        if self._azure_search is not None:
+            await self._azure_search.cerrar()
+        await self._clientes_llm.cerrar()
+
+    async def _reservar_id(self, tabla: str) -> int:
+        """ID de rag_consultas/rag_respuestas reservado antes de escribir la traza"""
+        return await self._en_bd(self._trazas.reservar_id, tabla)
+
+    async def _registrar_traza(self, consulta: ConsultaRAG, consulta_id: int, tiempo_respuesta: int,
+                               metodo: Optional[str], respuesta: Optional[RespuestaRAG] = None):
+        """Encola la traza de la consulta (y su respuesta); solo espera si la cola está llena"""
+        traza_consulta = {
+            'id': consulta_id,
+            'usuario_id': consulta.usuario_id,
+            'pregunta': consulta.pregunta,
+            'ip_cliente': consulta.ip_cliente,
+            'user_agent': consulta.user_agent,
+            'tiempo_respuesta_ms': tiempo_respuesta,
+            'metodo_resolucion': metodo
+        }
+        traza_respuesta = None
+        if respuesta is not None:
+            traza_respuesta = {
+                'id': respuesta.id,
+                'consulta_id': consulta_id,
+                'texto': respuesta.texto,
+                'fuentes': json.dumps(convert_db_types(respuesta.fuentes)),
+                'confianza': respuesta.confianza,
+                'metodo': respuesta.metodo.value,
+                'datos_estructurados': json.dumps(convert_db_types(respuesta.datos_estructurados)) if respuesta.datos_estructurados else None,
+                'metadatos_llm': json.dumps(convert_db_types(respuesta.metadatos_llm)) if respuesta.metadatos_llm else None
+            }
+        if not self._trazas.intentar_encolar(traza_consulta, traza_respuesta):
+            await self._en_bd(self._trazas.encolar, traza_consulta, traza_respuesta)
 
-    async def procesar_consulta(self, consulta: ConsultaRAG) -> Tuple[RespuestaRAG, int]:
-        """Procesar consulta RAG con trazabilidad completa"""
+    async def procesar_consulta(self, consulta: ConsultaRAG,
+                                emisor: Optional[EmisorEventos] = None) -> Tuple[RespuestaRAG, int]:
+        """
+        Procesar consulta RAG con trazabilidad completa.
+        
+        Si se pasa emisor, las respuestas generadas por el LLM se emiten en
+        streaming: primero las fuentes y luego el texto token a token.
+        """
         start_time = time.time()
+        consulta_id = None
         
         try:
-            # 1. Registrar consulta
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT registrar_consulta_rag(%s, %s, %s, %s)
-                    """, (consulta.usuario_id, consulta.pregunta, consulta.ip_cliente, consulta.user_agent))
-                    
-                    consulta_id = cur.fetchone()[0]
-                    logger.info(f"Consulta registrada con ID: {consulta_id}")
+            # 1. Reservar ID de la consulta (la traza se escribe por lotes al final)
+            consulta_id = await self._reservar_id('rag_consultas')
 
             # 2. Buscar en cache
             respuesta_cache = await self._buscar_cache(consulta.pregunta)
             if respuesta_cache:
                 logger.info("Respuesta encontrada en cache")
                 tiempo_respuesta = int((time.time() - start_time) * 1000)
+                await self._registrar_traza(consulta, consulta_id, tiempo_respuesta, MetodoResolucion.CACHE.value)
                 return respuesta_cache, consulta_id
 
             # 3. Clasificar tipo de consulta
             tipo_consulta = await self._clasificar_consulta(consulta.pregunta)
             logger.info(f"Tipo de consulta detectado: {tipo_consulta}")
 
+            # 3b. Cache semántico para las consultas que irían al LLM
+            embedding_pregunta = None
+            if tipo_consulta != TipoConsulta.FRECUENTE:
+                embedding_pregunta = await self._embedding_pregunta(consulta.pregunta)
+                respuesta_cache = await self._buscar_cache_semantico(embedding_pregunta, consulta.pregunta)
+                if respuesta_cache:
+                    tiempo_respuesta = int((time.time() - start_time) * 1000)
+                    await self._registrar_traza(consulta, consulta_id, tiempo_respuesta, MetodoResolucion.CACHE.value)
+                    return respuesta_cache, consulta_id
+
             # 4. Resolver según tipo
             if tipo_consulta == TipoConsulta.FRECUENTE:
                 respuesta = await self._resolver_consulta_frecuente(consulta.pregunta)
             elif tipo_consulta == TipoConsulta.RAG:
-                respuesta = await self._resolver_consulta_rag(consulta.pregunta)
+                respuesta = await self._resolver_consulta_rag(consulta.pregunta, emisor)
             else:
-                respuesta = await self._resolver_consulta_hibrida(consulta.pregunta)
+                respuesta = await self._resolver_consulta_hibrida(consulta.pregunta, emisor)
 
             # 5. Calcular tiempo de respuesta
             tiempo_respuesta = int((time.time() - start_time) * 1000)
             respuesta.tiempo_respuesta = tiempo_respuesta
 
-            # 6. Registrar respuesta
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT registrar_respuesta_rag(%s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        consulta_id, respuesta.texto, json.dumps(convert_db_types(respuesta.fuentes)),
-                        respuesta.confianza, respuesta.metodo.value,
-                        json.dumps(convert_db_types(respuesta.datos_estructurados)) if respuesta.datos_estructurados else None,
-                        json.dumps(convert_db_types(respuesta.metadatos_llm)) if respuesta.metadatos_llm else None
-                    ))
-                    respuesta_id = cur.fetchone()[0]
-                    respuesta.id = respuesta_id
-
-            # 7. Actualizar métricas de consulta
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE rag_consultas 
-                        SET tiempo_respuesta_ms = %s, metodo_resolucion = %s 
-                        WHERE id = %s
-                    """, (tiempo_respuesta, respuesta.metodo.value, consulta_id))
+            # 6-7. Registrar consulta y respuesta (con métricas) en el escritor por lotes
+            respuesta.id = await self._reservar_id('rag_respuestas')
+            await self._registrar_traza(consulta, consulta_id, tiempo_respuesta, respuesta.metodo.value, respuesta)
 
-            # 8. Guardar en cache si es relevante
-            if respuesta.confianza >= 0.8 and tipo_consulta in [TipoConsulta.FRECUENTE, TipoConsulta.HIBRIDA]:
-                await self._guardar_cache(consulta.pregunta, respuesta)
+            # 8. Guardar en cache si es relevante (con embedding, también en el semántico)
+            if respuesta.confianza >= 0.8 and (
+                embedding_pregunta or tipo_consulta in [TipoConsulta.FRECUENTE, TipoConsulta.HIBRIDA]
+            ):
+                await self._guardar_cache(consulta.pregunta, respuesta, embedding_pregunta)
 
             logger.info(f"Consulta procesada exitosamente en {tiempo_respuesta}ms")
             return respuesta, consulta_id
@@ -251,29 +379,111 @@ Fuentes: {fuentes_detalle}
                 tiempo_respuesta=tiempo_respuesta
             )
             
-            return respuesta_error, consulta_id if 'consulta_id' in locals() else None
+            if consulta_id is not None:
+                try:
+                    await self._registrar_traza(consulta, consulta_id, tiempo_respuesta, None)
+                except Exception as e_traza:
+                    logger.warning(f"No se pudo registrar la traza de la consulta: {str(e_traza)}")
+            
+            return respuesta_error, consulta_id
+
+    async def procesar_consulta_stream(self, consulta: ConsultaRAG) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versión en streaming de procesar_consulta.
+        
+        Genera eventos {'evento': ..., 'datos': ...} en este orden:
+        'fuentes' (al terminar la recuperación), 'token' (fragmentos de texto)
+        y 'fin' (respuesta completa con consulta_id). Las respuestas que no
+        pasan por el LLM (cache, vistas materializadas) llegan como un único
+        'token'.
+        """
+        cola: asyncio.Queue = asyncio.Queue()
+        emitidos = set()
+        
+        async def emisor(evento: str, datos: Any):
+            emitidos.add(evento)
+            await cola.put({'evento': evento, 'datos': datos})
+        
+        tarea = asyncio.ensure_future(self.procesar_consulta(consulta, emisor))
+        try:
+            while not tarea.done() or not cola.empty():
+                siguiente = asyncio.ensure_future(cola.get())
+                await asyncio.wait({siguiente, tarea}, return_when=asyncio.FIRST_COMPLETED)
+                if siguiente.done():
+                    yield siguiente.result()
+                else:
+                    siguiente.cancel()
+            
+            respuesta, consulta_id = tarea.result()
+            fuentes = convert_db_types(respuesta.fuentes)
+            if 'fuentes' not in emitidos:
+                yield {'evento': 'fuentes', 'datos': fuentes}
+            if 'token' not in emitidos:
+                yield {'evento': 'token', 'datos': respuesta.texto}
+            yield {'evento': 'fin', 'datos': {
+                'texto': respuesta.texto,
+                'fuentes': fuentes,
+                'confianza': respuesta.confianza,
+                'metodo': respuesta.metodo.value,
+                'tiempo_respuesta': respuesta.tiempo_respuesta,
+                'consulta_id': consulta_id
+            }}
+        finally:
+            if not tarea.done():
+                tarea.cancel()
 
     async def _buscar_cache(self, pregunta: str) -> Optional[RespuestaRAG]:
-        """Buscar respuesta en cache"""
+        """Buscar respuesta en cache (memoria primero; rag_cache solo si no está)"""
+        encontrado, entrada = self._cache.obtener_memoria(pregunta)
+        if not encontrado:
+            entrada = await self._en_bd(self._buscar_cache_bd, pregunta)
+        if entrada:
+            return RespuestaRAG(
+                texto=entrada['respuesta'],
+                fuentes=entrada['fuentes'] or [],
+                confianza=0.9,  # Cache tiene alta confianza
+                metodo=MetodoResolucion.CACHE,
+                tiempo_respuesta=0
+            )
+        return None
+
+    def _buscar_cache_bd(self, pregunta: str) -> Optional[Dict[str, Any]]:
         try:
-            with self.get_db_connection() as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    cur.execute("SELECT * FROM buscar_respuesta_cache(%s)", (pregunta,))
-                    resultado = cur.fetchone()
-                    
-                    if resultado:
-                        return RespuestaRAG(
-                            texto=resultado['respuesta'],
-                            fuentes=resultado['fuentes'] or [],
-                            confianza=0.9,  # Cache tiene alta confianza
-                            metodo=MetodoResolucion.CACHE,
-                            tiempo_respuesta=0
-                        )
-            return None
+            return self._cache.obtener_bd(pregunta)
         except Exception as e:
             logger.warning(f"Error buscando en cache: {str(e)}")
             return None
 
+    async def _embedding_pregunta(self, pregunta: str) -> Optional[List[float]]:
+        """Embedding de la pregunta para el cache semántico (None si no se puede generar)"""
+        try:
+            return await self._azure_search_async().generar_embedding(pregunta)
+        except Exception as e:
+            logger.warning(f"Sin embedding para el cache semántico: {str(e)}")
+            return None
+
+    async def _buscar_cache_semantico(self, embedding: Optional[List[float]], pregunta: str) -> Optional[RespuestaRAG]:
+        """Buscar la respuesta de una pregunta equivalente ya cacheada"""
+        if not embedding:
+            return None
+        try:
+            resultado = await self._en_bd(self._cache_semantico.buscar, embedding, pregunta)
+        except Exception as e:
+            logger.warning(f"Error buscando en cache semántico: {str(e)}")
+            return None
+        if not resultado:
+            return None
+        entrada, similitud = resultado
+        logger.info(f"Respuesta encontrada en cache semántico (similitud {similitud:.3f})")
+        return RespuestaRAG(
+            texto=entrada['respuesta'],
+            fuentes=entrada['fuentes'] or [],
+            confianza=0.9,
+            metodo=MetodoResolucion.CACHE,
+            tiempo_respuesta=0,
+            metadatos_llm={'cache_semantico': {'similitud': similitud}}
+        )
+
     async def _clasificar_consulta(self, pregunta: str) -> TipoConsulta:
         """Clasificar tipo de consulta usando la función SQL"""
         # Detectar preguntas conceptuales complejas que deben ir directamente a RAG
@@ -295,8 +505,11 @@ Fuentes: {fuentes_detalle}
             logger.info("Pregunta conceptual compleja detectada - dirigiendo a RAG")
             return TipoConsulta.RAG
             
+        return await self._en_bd(self._clasificar_consulta_bd, pregunta)
+
+    def _clasificar_consulta_bd(self, pregunta: str) -> TipoConsulta:
         try:
-            with self.get_db_connection() as conn:
+            with self._conexion_bd() as conn:
                 with conn.cursor() as cur:
                     cur.execute("SELECT clasificar_tipo_consulta(%s)", (pregunta,))
                     tipo = cur.fetchone()[0]
@@ -330,8 +543,11 @@ Fuentes: {fuentes_detalle}
 
     async def _generar_dashboard(self) -> RespuestaRAG:
         """Generar respuesta del dashboard principal"""
+        return await self._en_bd(self._generar_dashboard_bd)
+
+    def _generar_dashboard_bd(self) -> RespuestaRAG:
         try:
-            with self.get_db_connection() as conn:
+            with self._conexion_bd() as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     cur.execute("SELECT get_dashboard_metricas() as metricas")
                     resultado = cur.fetchone()
@@ -377,6 +593,9 @@ Fuentes: {fuentes_detalle}
 
     async def _generar_analisis_geografico(self, pregunta: str) -> RespuestaRAG:
         """Generar análisis geográfico"""
+        return await self._en_bd(self._generar_analisis_geografico_bd, pregunta)
+
+    def _generar_analisis_geografico_bd(self, pregunta: str) -> RespuestaRAG:
         try:
             # Extraer departamento si se menciona
             departamento = None
@@ -385,7 +604,7 @@ Fuentes: {fuentes_detalle}
                     departamento = palabra
                     break
             
-            with self.get_db_connection() as conn:
+            with self._conexion_bd() as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     if departamento:
                         cur.execute("SELECT * FROM get_analisis_geografico(%s) LIMIT 5", (departamento,))
@@ -431,6 +650,9 @@ Fuentes: {fuentes_detalle}
 
     async def _generar_top_entidades(self, pregunta: str) -> RespuestaRAG:
         """Generar top de entidades"""
+        return await self._en_bd(self._generar_top_entidades_bd, pregunta)
+
+    def _generar_top_entidades_bd(self, pregunta: str) -> RespuestaRAG:
         try:
             # Detectar qué tipo de entidad busca
             pregunta_lower = pregunta.lower()
@@ -444,7 +666,7 @@ Fuentes: {fuentes_detalle}
             else:
                 tipo_filtro = None
             
-            with self.get_db_connection() as conn:
+            with self._conexion_bd() as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     if tipo_filtro:
                         cur.execute("""
@@ -511,6 +733,9 @@ Fuentes: {fuentes_detalle}
 
     async def _generar_conteo_entidades(self, pregunta: str) -> RespuestaRAG:
         """Generar conteo específico de entidades"""
+        return await self._en_bd(self._generar_conteo_entidades_bd, pregunta)
+
+    def _generar_conteo_entidades_bd(self, pregunta: str) -> RespuestaRAG:
         try:
             # Normalizar pregunta quitando acentos
             import unicodedata
@@ -518,7 +743,7 @@ Fuentes: {fuentes_detalle}
             pregunta_norm = unicodedata.normalize('NFD', pregunta_lower)
             pregunta_norm = ''.join(c for c in pregunta_norm if unicodedata.category(c) != 'Mn')
             
-            with self.get_db_connection() as conn:
+            with self._conexion_bd() as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     
                     # Detectar qué tipo de conteo se requiere
@@ -670,66 +895,62 @@ Fuentes: {fuentes_detalle}
             logger.error(f"Error generando conteo de entidades: {str(e)}")
             raise
 
-    async def _resolver_consulta_rag(self, pregunta: str) -> RespuestaRAG:
+    async def _resolver_consulta_rag(self, pregunta: str,
+                                     emisor: Optional[EmisorEventos] = None) -> RespuestaRAG:
         """Resolver consulta compleja usando RAG con Azure Search + LLM"""
         logger.info("Resolviendo consulta compleja con RAG + LLM")
         
         try:
-            # 1. Buscar primero en Azure Search (vectorizado/semántico)
-            contexto_azure = []
-            try:
-                azure_search = AzureSearchVectorizado()
-                chunks_azure = await azure_search.buscar_semanticamente(pregunta, top_k=5)
-                
-                if chunks_azure:
-                    logger.info(f"Azure Search encontró {len(chunks_azure)} chunks relevantes")
-                    for chunk in chunks_azure:
-                        # Extraer metadatos de ubicación
-                        pagina = chunk.metadata.get('pagina', 'N/A') if hasattr(chunk, 'metadata') else 'N/A'
-                        parrafo = chunk.metadata.get('parrafo', 'N/A') if hasattr(chunk, 'metadata') else 'N/A'
-                        
-                        contexto_azure.append({
-                            'texto': chunk.contenido if hasattr(chunk, 'contenido') else str(chunk),
-                            'fuente': f"Archivo: {chunk.nombre_archivo if hasattr(chunk, 'nombre_archivo') else 'N/A'} - {chunk.tipo_documental if hasattr(chunk, 'tipo_documental') else 'Documento'}",
-                            'relevancia': chunk.score if hasattr(chunk, 'score') else 0.0,
-                            'tipo': 'azure_search',
-                            'analisis': chunk.analisis if hasattr(chunk, 'analisis') else '',
-                            'pagina': pagina,
-                            'parrafo': parrafo,
-                            'nombre_archivo': chunk.nombre_archivo if hasattr(chunk, 'nombre_archivo') else 'N/A',
-                            'expediente_nuc': chunk.expediente_nuc if hasattr(chunk, 'expediente_nuc') else 'N/A',
-                            'tipo_documental': chunk.tipo_documental if hasattr(chunk, 'tipo_documental') else 'N/A'
-                        })
-                else:
-                    logger.warning("Azure Search no encontró chunks relevantes")
-            except Exception as e:
-                logger.warning(f"Error con Azure Search: {str(e)}")
+            # 1. Recuperación concurrente: Azure Search (vectorizado/semántico),
+            #    contexto SQL y el índice MEL local de respaldo arrancan a la vez;
+            #    cada fuente tiene su timeout y el conjunto un presupuesto de
+            #    latencia. Lo que no llegue se descarta.
+            terminos_clave = await self._extraer_terminos_clave(pregunta)
+            resultados = await self._recuperar_concurrente({
+                'azure_search': (self._recuperar_azure(pregunta),
+                                 float(os.getenv('RAG_TIMEOUT_AZURE', '8'))),
+                'sql': (self._buscar_contexto_sql(terminos_clave, pregunta),
+                        float(os.getenv('RAG_TIMEOUT_SQL', '3'))),
+                'local': (self._recuperar_local(pregunta),
+                          float(os.getenv('RAG_TIMEOUT_LOCAL', '5'))),
+            }, presupuesto=float(os.getenv('RAG_LATENCY_BUDGET', '10')))
+            
+            contexto_azure = resultados.get('azure_search') or []
+            if contexto_azure:
+                logger.info(f"Azure Search encontró {len(contexto_azure)} chunks relevantes")
+            else:
+                logger.warning("Azure Search no encontró chunks relevantes")
+                # Respaldo: índice vectorial local sobre los chunks MEL (si está configurado)
+                contexto_azure = resultados.get('local') or []
             
-            # 2. Si Azure Search no encuentra suficiente, buscar en PostgreSQL
+            # 2. Contexto SQL: siempre se suma (ya se pagó su consulta) detrás
+            #    de los documentos; _empaquetar_contexto no lo mezcla con ellos
             contexto_sql = []
-            if len(contexto_azure) < 3:
-                logger.info("Complementando con búsqueda SQL")
-                terminos_clave = await self._extraer_terminos_clave(pregunta)
-                resultado_sql = await self._buscar_contexto_sql(terminos_clave, pregunta)
-                
-                # Convertir resultado SQL a formato de lista
-                if resultado_sql and isinstance(resultado_sql, dict):
-                    # Extraer información relevante del resultado SQL
-                    for key, value in resultado_sql.items():
-                        if isinstance(value, list) and value:
-                            for item in value[:3]:  # Máximo 3 items por categoría
-                                contexto_sql.append({
-                                    'texto': str(item),
-                                    'fuente': f"PostgreSQL - {key}",
-                                    'relevancia': 0.5,
-                                    'tipo': 'sql_search'
-                                })
+            resultado_sql = resultados.get('sql')
+            if resultado_sql and isinstance(resultado_sql, dict):
+                # Extraer información relevante del resultado SQL
+                for key, value in resultado_sql.items():
+                    if isinstance(value, list) and value:
+                        for item in value[:3]:  # Máximo 3 items por categoría
+                            contexto_sql.append({
+                                'texto': self._texto_item_sql(item),
+                                'fuente': f"PostgreSQL - {key}",
+                                'tipo_documental': f"Contexto estructurado ({key})",
+                                'relevancia': item.get('score_relevancia', 0.0) if isinstance(item, dict) else 0.0,
+                                'tipo': 'sql_search'
+                            })
             
-            # 3. Combinar contextos
-            contexto_completo = contexto_azure + contexto_sql
+            # 3. Combinar contextos sin repetir textos
+            contexto_completo = []
+            vistos = set()
+            for item in contexto_azure + contexto_sql:
+                clave = ' '.join(str(item.get('texto', '')).lower().split())
+                if clave and clave not in vistos:
+                    vistos.add(clave)
+                    contexto_completo.append(item)
             
             # 4. Generar respuesta con LLM
-            respuesta_llm = await self._generar_respuesta_llm(pregunta, contexto_completo)
+            respuesta_llm = await self._generar_respuesta_llm(pregunta, contexto_completo, emisor)
             
             return respuesta_llm
             
@@ -737,6 +958,110 @@ Fuentes: {fuentes_detalle}
             logger.error(f"Error en consulta RAG: {str(e)}")
             raise
 
+    async def _recuperar_concurrente(self, fuentes: Dict[str, Tuple[Any, float]],
+                                     presupuesto: float) -> Dict[str, Any]:
+        """
+        Ejecuta varios recuperadores a la vez y devuelve lo que llegue a tiempo.
+        
+        Args:
+            fuentes: {nombre: (corrutina, timeout_segundos)}
+            presupuesto: Segundos máximos para el conjunto; las fuentes pendientes se cancelan
+        
+        Returns:
+            {nombre: resultado} solo para las fuentes que terminaron sin error
+        """
+        inicio = time.time()
+        tiempos = {}
+        
+        async def _medir(nombre, corrutina, timeout):
+            t0 = time.time()
+            try:
+                return await asyncio.wait_for(corrutina, timeout=timeout)
+            finally:
+                tiempos[nombre] = int((time.time() - t0) * 1000)
+        
+        tareas = {
+            asyncio.ensure_future(_medir(nombre, corrutina, timeout)): nombre
+            for nombre, (corrutina, timeout) in fuentes.items()
+        }
+        hechas, pendientes = await asyncio.wait(tareas, timeout=presupuesto)
+        for tarea in pendientes:
+            tarea.cancel()
+            logger.warning(f"Recuperación '{tareas[tarea]}' excedió el presupuesto de {presupuesto}s")
+        
+        resultados = {}
+        for tarea in hechas:
+            nombre = tareas[tarea]
+            if tarea.exception() is not None:
+                error = tarea.exception()
+                motivo = "timeout" if isinstance(error, asyncio.TimeoutError) else str(error)
+                logger.warning(f"Recuperación '{nombre}' falló ({tiempos.get(nombre)}ms): {motivo}")
+            else:
+                resultados[nombre] = tarea.result()
+        
+        detalle = ", ".join(f"{nombre}={ms}ms" for nombre, ms in sorted(tiempos.items()))
+        logger.info(f"Recuperación concurrente en {int((time.time() - inicio) * 1000)}ms ({detalle})")
+        return resultados
+
+    async def _recuperar_azure(self, pregunta: str) -> List[Dict[str, Any]]:
+        """Chunks de Azure Search en el formato de contexto para el LLM, ya reordenados"""
+        azure_search = self._azure_search_async()
+        # Con reranker se piden más candidatos y se vuelven a puntuar localmente
+        chunks_azure = await azure_search.buscar_semanticamente(
+            pregunta, top_k=self._reranking.candidatos_busqueda)
+        
+        contexto_azure = []
+        for chunk in chunks_azure or []:
+            # Extraer metadatos de ubicación
+            pagina = chunk.metadata.get('pagina', 'N/A') if hasattr(chunk, 'metadata') else 'N/A'
+            parrafo = chunk.metadata.get('parrafo', 'N/A') if hasattr(chunk, 'metadata') else 'N/A'
+            
+            contexto_azure.append({
+                'texto': chunk.contenido if hasattr(chunk, 'contenido') else str(chunk),
+                'fuente': f"Archivo: {chunk.nombre_archivo if hasattr(chunk, 'nombre_archivo') else 'N/A'} - {chunk.tipo_documental if hasattr(chunk, 'tipo_documental') else 'Documento'}",
+                'relevancia': chunk.score if hasattr(chunk, 'score') else 0.0,
+                'tipo': 'azure_search',
+                'analisis': chunk.analisis if hasattr(chunk, 'analisis') else '',
+                'pagina': pagina,
+                'parrafo': parrafo,
+                'nombre_archivo': chunk.nombre_archivo if hasattr(chunk, 'nombre_archivo') else 'N/A',
+                'expediente_nuc': chunk.expediente_nuc if hasattr(chunk, 'expediente_nuc') else 'N/A',
+                'tipo_documental': chunk.tipo_documental if hasattr(chunk, 'tipo_documental') else 'N/A'
+            })
+        return await self._reranking.reordenar_async(pregunta, contexto_azure)
+
+    async def _recuperar_local(self, pregunta: str) -> List[Dict[str, Any]]:
+        """
+        Chunks del índice MEL local (RAG_INDICE_MEL_DIR) en el formato de contexto
+        para el LLM. Corre junto a Azure Search (no después de su timeout) y solo
+        se usa si Azure no devuelve chunks; sin RAG_INDICE_MEL_DIR no hace nada.
+        """
+        def _buscar():
+            recuperador = obtener_recuperador_local()
+            return recuperador.buscar(pregunta, k=self._reranking.top) if recuperador else []
+        
+        # El timeout lo pone _recuperar_concurrente
+        try:
+            resultados = await asyncio.get_running_loop().run_in_executor(None, _buscar)
+        except Exception as e:
+            logger.warning(f"Índice MEL local no respondió: {e!r}")
+            return []
+        
+        if resultados:
+            logger.info(f"Índice MEL local encontró {len(resultados)} chunks")
+        return [{
+            'texto': r['texto_chunk'],
+            'fuente': f"Archivo: {r['archivo']} - Índice local MEL",
+            'relevancia': r['similitud'],
+            'tipo': 'indice_local',
+            'analisis': '',
+            'pagina': 'N/A',
+            'parrafo': r.get('posicion') or 'N/A',
+            'nombre_archivo': r['archivo'],
+            'expediente_nuc': 'N/A',
+            'tipo_documental': 'N/A'
+        } for r in resultados if r.get('texto_chunk')]
+
     async def _extraer_terminos_clave(self, pregunta: str) -> List[str]:
         """Extraer términos clave de la pregunta usando técnicas simples"""
         # Implementación simple - en producción se podría usar NLP más avanzado
@@ -765,7 +1090,7 @@ Fuentes: {fuentes_detalle}
         return list(set(palabras_clave))  # Eliminar duplicados
 
     async def _buscar_contexto_sql(self, terminos_clave: List[str], pregunta_original: str) -> Dict[str, Any]:
-        """Buscar contexto relevante usando las funciones RAG de SQL"""
+        """Buscar contexto relevante usando las funciones RAG de SQL (las tres en paralelo)"""
         contexto = {
             'personas': [],
             'organizaciones': [],
@@ -773,50 +1098,71 @@ Fuentes: {fuentes_detalle}
             'total_fuentes': 0
         }
         
-        try:
-            with self.get_db_connection() as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    
-                    # Buscar personas relevantes
-                    if terminos_clave:
-                        cur.execute("""
-                            SELECT * FROM rag_buscar_contexto_personas(%s::text[], 10)
-                        """, (terminos_clave,))
-                        contexto['personas'] = [dict(row) for row in cur.fetchall()]
-                    
-                    # Buscar organizaciones relevantes
-                    if terminos_clave:
-                        cur.execute("""
-                            SELECT * FROM rag_buscar_contexto_organizaciones(%s::text[], 10)
-                        """, (terminos_clave,))
-                        contexto['organizaciones'] = [dict(row) for row in cur.fetchall()]
-                    
-                    # Buscar lugares relevantes
-                    if terminos_clave:
-                        cur.execute("""
-                            SELECT * FROM rag_buscar_contexto_geografico(%s::text[], 10)
-                        """, (terminos_clave,))
-                        contexto['lugares'] = [dict(row) for row in cur.fetchall()]
-            
-            contexto['total_fuentes'] = (
-                len(contexto['personas']) + 
-                len(contexto['organizaciones']) + 
-                len(contexto['lugares'])
-            )
-            
-            logger.info(f"Contexto encontrado: {contexto['total_fuentes']} fuentes")
-            return contexto
-            
-        except Exception as e:
-            logger.warning(f"Error buscando contexto SQL: {str(e)}")
+        if not terminos_clave:
             return contexto
+        
+        categorias = {
+            'personas': 'rag_buscar_contexto_personas',
+            'organizaciones': 'rag_buscar_contexto_organizaciones',
+            'lugares': 'rag_buscar_contexto_geografico',
+        }
+        resultados = await asyncio.gather(*[
+            self._en_bd(self._buscar_contexto_categoria_bd, funcion, terminos_clave)
+            for funcion in categorias.values()
+        ], return_exceptions=True)
+        
+        for categoria, resultado in zip(categorias, resultados):
+            if isinstance(resultado, Exception):
+                logger.warning(f"Error buscando contexto SQL ({categoria}): {str(resultado)}")
+            else:
+                contexto[categoria] = resultado
+        
+        contexto['total_fuentes'] = (
+            len(contexto['personas']) + 
+            len(contexto['organizaciones']) + 
+            len(contexto['lugares'])
+        )
+        
+        logger.info(f"Contexto encontrado: {contexto['total_fuentes']} fuentes")
+        return contexto
+
+    @staticmethod
+    def _texto_item_sql(item: Any) -> str:
+        """Fila de rag_buscar_contexto_* como texto legible para el prompt"""
+        if not isinstance(item, dict):
+            return str(item)
+        nombre = item.get('persona') or item.get('organizacion') or item.get('lugar') or ''
+        detalle = item.get('tipo') or ', '.join(
+            str(v) for v in (item.get('municipio'), item.get('departamento')) if v)
+        texto = f"{nombre} ({detalle})" if detalle else str(nombre)
+        if item.get('contexto'):
+            texto += f": {item['contexto']}"
+        if item.get('casos_relacionados'):
+            texto += f" Casos relacionados: {', '.join(str(c) for c in item['casos_relacionados'][:5])}."
+        return texto.strip()
+
+    def _buscar_contexto_categoria_bd(self, funcion_sql: str, terminos_clave: List[str]) -> List[Dict[str, Any]]:
+        conn = self.get_db_connection()
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(f"""
+                    SELECT * FROM {funcion_sql}(%s::text[], 10)
+                """, (terminos_clave,))
+                return [dict(row) for row in cur.fetchall()]
+        finally:
+            conn.close()
 
-    async def _generar_respuesta_llm(self, pregunta: str, contexto) -> RespuestaRAG:
-        """Generar respuesta usando Azure OpenAI"""
+    async def _generar_respuesta_llm(self, pregunta: str, contexto,
+                                     emisor: Optional[EmisorEventos] = None) -> RespuestaRAG:
+        """Generar respuesta usando Azure OpenAI (en streaming si hay emisor)"""
         try:
             # Manejar tanto listas como diccionarios
+            empaquetado = None
             if isinstance(contexto, list):
-                contexto_str = self._formatear_contexto_lista_para_llm(contexto)
+                # Las citas CITA-X y las fuentes se numeran sobre la lista empaquetada
+                empaquetado = self._empaquetar_contexto(contexto)
+                contexto = empaquetado.items
+                contexto_str = self._formatear_contexto_lista_para_llm(contexto, empaquetado.bloques)
             else:
                 contexto_str = self._formatear_contexto_para_llm(contexto)
             
@@ -892,28 +1238,6 @@ REFERENCIAS:
 [CITA-1] Archivo: sentencia_123.pdf, Página XX, Párrafo XX
 [CITA-2] Archivo: auto_456.pdf, Página YY, Párrafo YY"""
 
-            # Llamada a Azure OpenAI
-            start_time = time.time()
-            
-            response = self.azure_client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1500
-            )
-            
-            tiempo_llm = int((time.time() - start_time) * 1000)
-            
-            respuesta_texto = response.choices[0].message.content
-            
-            # Calcular métricas
-            tokens_prompt = response.usage.prompt_tokens
-            tokens_respuesta = response.usage.completion_tokens
-            costo_estimado = (tokens_prompt * 0.000150 + tokens_respuesta * 0.000600) / 1000  # Precios GPT-4o-mini
-            
             # Calcular confianza basada en cantidad de contexto
             if isinstance(contexto, list):
                 total_fuentes = len(contexto)
@@ -934,7 +1258,7 @@ REFERENCIAS:
             
             # Manejar fuentes de lista (nuevo formato)
             if isinstance(contexto, list):
-                for i, item in enumerate(contexto[:5], 1):  # Máximo 5 fuentes
+                for i, item in enumerate(contexto, 1):  # Una fuente por cita del prompt
                     if isinstance(item, dict):
                         fuente_info = {
                             'cita': f'CITA-{i}',
@@ -970,6 +1294,53 @@ REFERENCIAS:
                                         'relevancia': item.get('score_relevancia', 0)
                                     })
             
+            # Llamada a Azure OpenAI
+            start_time = time.time()
+            mensajes = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            tiempo_primer_token = None
+            
+            if emisor is None:
+                response = await self._cliente_llm_async().chat.completions.create(
+                    model=self.deployment_name,
+                    messages=mensajes,
+                    temperature=0.3,
+                    max_tokens=1500
+                )
+                respuesta_texto = response.choices[0].message.content
+                tokens_prompt = response.usage.prompt_tokens
+                tokens_respuesta = response.usage.completion_tokens
+            else:
+                # Las fuentes ya se conocen: se envían antes del primer token
+                await emisor('fuentes', fuentes)
+                stream = await self._cliente_llm_async().chat.completions.create(
+                    model=self.deployment_name,
+                    messages=mensajes,
+                    temperature=0.3,
+                    max_tokens=1500,
+                    stream=True
+                )
+                partes = []
+                async for chunk in stream:
+                    # Azure envía un primer chunk sin choices (filtros de contenido)
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    if tiempo_primer_token is None:
+                        tiempo_primer_token = int((time.time() - start_time) * 1000)
+                    partes.append(chunk.choices[0].delta.content)
+                    await emisor('token', chunk.choices[0].delta.content)
+                respuesta_texto = ''.join(partes)
+                # El streaming no trae usage: se cuentan con el tokenizador
+                tokens_prompt = self._empaquetador.contar(system_prompt) + self._empaquetador.contar(user_prompt)
+                tokens_respuesta = self._empaquetador.contar(respuesta_texto)
+            
+            tiempo_llm = int((time.time() - start_time) * 1000)
+            
+            # Calcular métricas
+            costo_estimado = (tokens_prompt * 0.000150 + tokens_respuesta * 0.000600) / 1000  # Precios GPT-4o-mini
+            
             metadatos = {
                 'model': self.deployment_name,
                 'tokens_prompt': tokens_prompt,
@@ -978,6 +1349,11 @@ REFERENCIAS:
                 'tiempo_llm_ms': tiempo_llm,
                 'temperatura': 0.3
             }
+            if emisor is not None:
+                metadatos['streaming'] = True
+                metadatos['tiempo_primer_token_ms'] = tiempo_primer_token
+            if empaquetado is not None:
+                metadatos['contexto'] = empaquetado.resumen()
             
             return RespuestaRAG(
                 texto=respuesta_texto,
@@ -1034,54 +1410,69 @@ REFERENCIAS:
         
         return "\n".join(partes)
 
-    def _formatear_contexto_lista_para_llm(self, contexto_lista) -> str:
+    def _empaquetar_contexto(self, contexto_lista) -> ContextoEmpaquetado:
+        """Deduplicar, ordenar por relevancia y ajustar la lista al presupuesto de tokens"""
+        items = [item if isinstance(item, dict) else {'texto': str(item)} for item in contexto_lista]
+        # Si hubo reranking la lista ya viene ordenada (Azure reordenado + SQL).
+        # Si no, se ordena por relevancia dentro de cada fuente: los puntajes SQL
+        # no son comparables con los de Azure, así que el contexto SQL va detrás
+        if not self._reranking.activo:
+            items = sorted(items, key=lambda x: (x.get('tipo') == 'sql_search',
+                                                 -float(x.get('relevancia') or 0.0)))
+        return self._empaquetador.empaquetar(items, self._formatear_item_contexto, ordenar=False)
+
+    def _formatear_item_contexto(self, i: int, item: Dict[str, Any]) -> str:
+        """Bloque [CITA-i] de un item de contexto"""
+        partes = [f"[CITA-{i}]"]
+
+        # Extraer información de ubicación
+        pagina = item.get('pagina', 'N/A')
+        parrafo = item.get('parrafo', 'N/A')
+        nombre_archivo = item.get('nombre_archivo', 'N/A')
+        tipo_doc = item.get('tipo_documental', 'N/A')
+        expediente = item.get('expediente_nuc', 'N/A')
+
+        partes.append(f"ARCHIVO: {nombre_archivo}")
+        partes.append(f"TIPO DOCUMENTO: {tipo_doc}")
+        partes.append(f"EXPEDIENTE NUC: {expediente}")
+        partes.append(f"UBICACIÓN: Página {pagina}, Párrafo {parrafo}")
+        partes.append(f"RELEVANCIA: {item.get('relevancia', 0.0) or 0.0:.2f}")
+        partes.append(f"TEXTO EXACTO:")
+
+        texto = item.get('texto', '')
+        if texto:
+            # Mantener el texto completo para citas exactas
+            partes.append(f'"{texto}"')
+
+        analisis = item.get('analisis', '')
+        if analisis:
+            partes.append(f"RESUMEN DEL ANÁLISIS: {analisis}")
+
+        partes.append("")
+        return "\n".join(partes)
+
+    def _formatear_contexto_lista_para_llm(self, contexto_lista, bloques: Optional[List[str]] = None) -> str:
         """Formatear lista de contexto para enviar al LLM con citas detalladas"""
         partes = []
         
         if not contexto_lista:
             return "No se encontró información relevante en los documentos."
         
+        if bloques is None:
+            bloques = self._empaquetar_contexto(contexto_lista).bloques
+        
         partes.append("INFORMACIÓN ENCONTRADA EN LOS DOCUMENTOS JUDICIALES:")
         partes.append("INSTRUCCIONES PARA CITAS: Cada afirmación DEBE incluir la cita exacta con formato [CITA-X] donde X es el número de referencia.")
         partes.append("")
-        
-        for i, item in enumerate(contexto_lista[:10], 1):  # Máximo 10 items
-            if isinstance(item, dict):
-                # Extraer información de ubicación
-                pagina = item.get('pagina', 'N/A')
-                parrafo = item.get('parrafo', 'N/A')
-                nombre_archivo = item.get('nombre_archivo', 'N/A')
-                tipo_doc = item.get('tipo_documental', 'N/A')
-                expediente = item.get('expediente_nuc', 'N/A')
-                
-                partes.append(f"[CITA-{i}]")
-                partes.append(f"ARCHIVO: {nombre_archivo}")
-                partes.append(f"TIPO DOCUMENTO: {tipo_doc}")
-                partes.append(f"EXPEDIENTE NUC: {expediente}")
-                partes.append(f"UBICACIÓN: Página {pagina}, Párrafo {parrafo}")
-                partes.append(f"RELEVANCIA: {item.get('relevancia', 0.0):.2f}")
-                partes.append(f"TEXTO EXACTO:")
-                
-                texto = item.get('texto', '')
-                if texto:
-                    # Mantener el texto completo para citas exactas
-                    partes.append(f'"{texto}"')
-                
-                analisis = item.get('analisis', '')
-                if analisis:
-                    partes.append(f"RESUMEN DEL ANÁLISIS: {analisis}")
-                
-                partes.append("")
-            else:
-                partes.append(f"[CITA-{i}] {str(item)[:500]}...")
-                partes.append("")
+        partes.extend(bloques)
         
         partes.append("IMPORTANTE: En tu respuesta, SIEMPRE incluye las citas usando el formato [CITA-X] después de cada afirmación.")
         partes.append("Ejemplo: 'La Unión Patriótica fue perseguida sistemáticamente [CITA-1] y esto constituye genocidio según la jurisprudencia [CITA-2].'")
         
         return "\n".join(partes)
 
-    async def _resolver_consulta_hibrida(self, pregunta: str) -> RespuestaRAG:
+    async def _resolver_consulta_hibrida(self, pregunta: str,
+                                         emisor: Optional[EmisorEventos] = None) -> RespuestaRAG:
         """Resolver consulta híbrida combinando vistas materializadas y RAG"""
         logger.info("Resolviendo consulta híbrida")
         
@@ -1112,44 +1503,73 @@ REFERENCIAS:
                 logger.warning(f"Error en vistas materializadas híbrida: {str(e)}")
         
         # Si no funciona o no es del tipo apropiado, usar RAG
-        return await self._resolver_consulta_rag(pregunta)
+        return await self._resolver_consulta_rag(pregunta, emisor)
+
+    async def _guardar_cache(self, pregunta: str, respuesta: RespuestaRAG,
+                             embedding: Optional[List[float]] = None):
+        """Guardar respuesta en cache (y en el cache semántico si hay embedding)"""
+        return await self._en_bd(self._guardar_cache_bd, pregunta, respuesta, embedding)
 
-    async def _guardar_cache(self, pregunta: str, respuesta: RespuestaRAG):
-        """Guardar respuesta en cache"""
+    def _guardar_cache_bd(self, pregunta: str, respuesta: RespuestaRAG,
+                          embedding: Optional[List[float]] = None):
         try:
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT guardar_respuesta_cache(%s, %s, %s)
-                    """, (pregunta, respuesta.texto, json.dumps(convert_db_types(respuesta.fuentes))))
-                    logger.info("Respuesta guardada en cache")
+            fuentes = convert_db_types(respuesta.fuentes)
+            self._cache.guardar(pregunta, respuesta.texto, fuentes)
+            if embedding:
+                self._cache_semantico.agregar(generar_hash_pregunta(pregunta), pregunta, embedding,
+                                             respuesta.texto, fuentes)
+            logger.info("Respuesta guardada en cache")
         except Exception as e:
             logger.warning(f"Error guardando en cache: {str(e)}")
 
+    async def invalidar_cache(self, expirar_bd: bool = True):
+        """Invalida el cache de respuestas (p. ej. tras ingerir documentos nuevos)"""
+        return await self._en_bd(self._cache.invalidar, expirar_bd)
+
     async def registrar_feedback(self, consulta_id: int, respuesta_id: int, feedback: FeedbackRAG):
         """Registrar feedback del usuario"""
-        try:
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT registrar_feedback_rag(%s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        consulta_id, respuesta_id, feedback.calificacion,
-                        feedback.comentario, json.dumps(convert_db_types(feedback.aspectos)) if feedback.aspectos else None,
-                        feedback.respuesta_esperada, None
-                    ))
-                    
-                    feedback_id = cur.fetchone()[0]
-                    logger.info(f"Feedback registrado con ID: {feedback_id}")
-                    return feedback_id
-        except Exception as e:
-            logger.error(f"Error registrando feedback: {str(e)}")
-            raise
+        return await self._en_bd(self._registrar_feedback_bd, consulta_id, respuesta_id, feedback)
+
+    def _registrar_feedback_bd(self, consulta_id: int, respuesta_id: int, feedback: FeedbackRAG):
+        # La consulta/respuesta referenciadas pueden seguir en la cola de trazas de
+        # este proceso (vaciar) o de otro worker, que las escribe en su próximo
+        # lote: ante la violación de FK se reintenta dándole tiempo a ese escritor
+        self._trazas.vaciar()
+        reintentos = int(os.getenv('RAG_FEEDBACK_REINTENTOS', '4'))
+        espera = self._trazas.intervalo
+        for intento in range(reintentos + 1):
+            try:
+                with self._conexion_bd() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            SELECT registrar_feedback_rag(%s, %s, %s, %s, %s, %s, %s)
+                        """, (
+                            consulta_id, respuesta_id, feedback.calificacion,
+                            feedback.comentario, json.dumps(convert_db_types(feedback.aspectos)) if feedback.aspectos else None,
+                            feedback.respuesta_esperada, None
+                        ))
+
+                        feedback_id = cur.fetchone()[0]
+                        logger.info(f"Feedback registrado con ID: {feedback_id}")
+                        return feedback_id
+            except psycopg2.IntegrityError as e:
+                if e.pgcode != '23503' or intento == reintentos:
+                    logger.error(f"Error registrando feedback: {str(e)}")
+                    raise
+                logger.info(f"Consulta {consulta_id} aún sin escribir; reintentando feedback en {espera:.1f}s")
+                time.sleep(espera)
+                espera *= 2
+            except Exception as e:
+                logger.error(f"Error registrando feedback: {str(e)}")
+                raise
 
     async def obtener_estadisticas_mejora_continua(self, dias: int = 30) -> Dict[str, Any]:
         """Obtener estadísticas para mejora continua"""
+        return await self._en_bd(self._obtener_estadisticas_mejora_continua_bd, dias)
+
+    def _obtener_estadisticas_mejora_continua_bd(self, dias: int = 30) -> Dict[str, Any]:
         try:
-            with self.get_db_connection() as conn:
+            with self._conexion_bd() as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     # Reporte de mejora continua
                     cur.execute("SELECT * FROM generar_reporte_mejora_continua(%s)", (dias,))
@@ -1162,6 +1582,9 @@ REFERENCIAS:
                     return {
                         'reporte_mejora': reporte,
                         'preguntas_optimizar': preguntas_optimizar,
+                        'cache_respuestas': self._cache.estadisticas(),
+                        'cache_semantico': self._cache_semantico.estadisticas(),
+                        'reranking': self._reranking.estadisticas(),
                         'fecha_analisis': datetime.now().isoformat()
                     }
         except Exception as e:
@@ -1200,25 +1623,63 @@ async def main():
     await sistema.registrar_feedback(consulta_id, 1, feedback)
     print("\nFeedback registrado")
 
+async def _cerrar_sistema_rag(sistema: SistemaRAGTrazable):
+    await sistema.cerrar()
+    sistema.azure_client.close()
+
+
+async def _cerrar_azure_search(azure_search: "AzureSearchVectorizado"):
+    await azure_search.cerrar()
+    azure_search.cerrar_sincrono()
+
+
+def obtener_sistema_rag() -> SistemaRAGTrazable:
+    """SistemaRAGTrazable compartido por el proceso (clientes HTTP con keep-alive)"""
+    return obtener_registro_clientes().obtener('sistema_rag', SistemaRAGTrazable, cerrar=_cerrar_sistema_rag)
+
+
+def obtener_azure_search() -> "AzureSearchVectorizado":
+    """AzureSearchVectorizado compartido por el proceso"""
+    return obtener_registro_clientes().obtener('azure_search_vectorizado', AzureSearchVectorizado,
+                                               cerrar=_cerrar_azure_search)
+
+
+def _cliente_chat_compartido() -> AzureOpenAI:
+    """Cliente síncrono de chat de consulta_hibrida_sincrona, compartido por el proceso"""
+    import httpx
+    return obtener_registro_clientes().obtener('azure_openai_chat', lambda: AzureOpenAI(
+        api_key=os.getenv('AZURE_OPENAI_API_KEY'),
+        api_version=os.getenv('AZURE_OPENAI_VERSION', '2024-12-01-preview'),
+        azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
+        http_client=httpx.Client(timeout=30.0)
+    ), cerrar=lambda cliente: cliente.close())
+
+
 # Función pública síncrona para integración fácil
-def consulta_hibrida_sincrona(pregunta: str) -> Dict[str, Any]:
+def consulta_hibrida_sincrona(pregunta: str,
+                              al_fuentes: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                              al_token: Optional[Callable[[str], None]] = None,
+                              cancelado: Optional[threading.Event] = None) -> Dict[str, Any]:
     """
     Función síncrona para facilitar integración con interfaces que no usan async
     Retorna respuesta RAG con trazabilidad completa de Azure Search
+    
+    Args:
+        al_fuentes: Se llama con las fuentes apenas termina la búsqueda
+        al_token: Si se pasa, la respuesta del LLM se genera en streaming y se
+            llama con cada fragmento de texto
+        cancelado: Si se activa (p. ej. el cliente del stream se desconectó)
+            no se llama al LLM o se corta su stream entre fragmentos
     """
     try:
-        # Ejecutar la consulta usando asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         async def _ejecutar_consulta():
             try:
                 # Cargar variables de entorno
                 load_dotenv()
                 load_dotenv('config/.env')
                 
-                # Usar directamente el Azure Search
-                azure_search = AzureSearchVectorizado()
+                # Usar directamente el Azure Search (instancia compartida)
+                azure_search = obtener_azure_search()
                 chunks_azure = await azure_search.buscar_semanticamente(pregunta, top_k=5)
                 
                 # Formatear respuesta
@@ -1271,18 +1732,15 @@ def consulta_hibrida_sincrona(pregunta: str) -> Dict[str, Any]:
                                 'doc_ref': f"Doc {i}"
                             })
                 
+                if al_fuentes is not None:
+                    al_fuentes(fuentes_formateadas)
+                
+                if cancelado is not None and cancelado.is_set():
+                    return {'respuesta': '', 'fuentes': fuentes_formateadas, 'confianza': 0.0, 'metodo': 'cancelado'}
+                
                 # Generar respuesta usando OpenAI si hay fuentes
                 if fuentes_formateadas:
-                    import httpx
-                    from openai import AzureOpenAI
-                    
-                    http_client = httpx.Client(timeout=30.0)
-                    azure_client = AzureOpenAI(
-                        api_key=os.getenv('AZURE_OPENAI_API_KEY'),
-                        api_version=os.getenv('AZURE_OPENAI_VERSION', '2024-12-01-preview'),
-                        azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
-                        http_client=http_client
-                    )
+                    azure_client = _cliente_chat_compartido()
                     
                     # Crear contexto para la respuesta con referencias numeradas
                     contexto_chunks = '\n\n'.join([
@@ -1316,14 +1774,30 @@ FORMATO DE CITAS: Usa [Doc 1], [Doc 2], [Doc 3] para referenciar los documentos
 
 Respuesta:"""
 
-                    response = azure_client.chat.completions.create(
-                        model=os.getenv('AZURE_OPENAI_DEPLOYMENT', 'gpt-4o-mini'),
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=2500,  # Aumentado para respuestas más completas
-                        temperature=0.3
-                    )
+                    def _generar_respuesta():
+                        response = azure_client.chat.completions.create(
+                            model=os.getenv('AZURE_OPENAI_DEPLOYMENT', 'gpt-4o-mini'),
+                            messages=[{"role": "user", "content": prompt}],
+                            max_tokens=2500,  # Aumentado para respuestas más completas
+                            temperature=0.3,
+                            stream=al_token is not None
+                        )
+                        
+                        if al_token is None:
+                            return response.choices[0].message.content
+                        partes = []
+                        for chunk in response:
+                            if cancelado is not None and cancelado.is_set():
+                                # Cerrar la conexión HTTP deja de generar (y de facturar) tokens
+                                response.close()
+                                break
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                partes.append(chunk.choices[0].delta.content)
+                                al_token(chunk.choices[0].delta.content)
+                        return ''.join(partes)
                     
-                    respuesta_texto = response.choices[0].message.content
+                    # Cliente síncrono: en un hilo para no bloquear el loop compartido
+                    respuesta_texto = await asyncio.get_running_loop().run_in_executor(None, _generar_respuesta)
                     
                     return {
                         'respuesta': respuesta_texto,
@@ -1350,12 +1824,8 @@ Respuesta:"""
                     'metodo': 'error'
                 }
         
-        # Ejecutar la función async
-        try:
-            resultado = loop.run_until_complete(_ejecutar_consulta())
-            return resultado
-        finally:
-            loop.close()
+        # Ejecutar en el event loop compartido: los clientes async se reutilizan entre llamadas
+        return obtener_registro_clientes().ejecutar(_ejecutar_consulta())
             
     except Exception as e:
         logging.error(f"Error en consulta_hibrida_sincrona: {str(e)}")
@@ -1422,7 +1892,7 @@ class SistemaRAGCompleto:
         """Inicializar el sistema RAG completo"""
         self.azure_search = None
         try:
-            self.azure_search = AzureSearchVectorizado()
+            self.azure_search = obtener_azure_search()
         except Exception as e:
             print(f"Warning: Azure Search no disponible: {e}")
     
@@ -1567,7 +2037,7 @@ Instrucciones:
 RESPUESTA:
 """
                 try:
-                    response = await self.azure_search.openai_client.chat.completions.acreate(
+                    response = await self.azure_search.cliente_openai_async().chat.completions.create(
                         model="gpt-4",
                         messages=[{"role": "user", "content": prompt}],
                         max_tokens=2500,
@@ -13,9 +13,13 @@ from dataclasses import dataclass
 import logging
 from datetime import datetime
 import hashlib
-import pickle
 from pathlib import Path
 
+try:
+    from .core.almacen_embeddings import AlmacenEmbeddings
+except ImportError:
+    from core.almacen_embeddings import AlmacenEmbeddings
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -41,6 +45,79 @@ class ConsultaVectorial:
     filtros_adicionales: Optional[Dict[str, Any]] = None
     usar_hibrido: bool = True  # Combinar texto + vector
 
+class MatrizEmbeddings:
+    """
+    Embeddings del cache como matriz float32 contigua con filas normalizadas.
+    La búsqueda es un producto matriz-vector + argpartition; las altas se
+    añaden al final (capacidad que se duplica) sin reconstruir la matriz.
+    """
+    
+    def __init__(self, capacidad_inicial: int = 1024):
+        self.capacidad_inicial = capacidad_inicial
+        self._matriz: Optional[np.ndarray] = None  # (capacidad, dim)
+        self.ids: List[str] = []                   # hash de contenido por fila
+        self._fila: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @property
+    def dimensiones(self) -> Optional[int]:
+        return None if self._matriz is None else self._matriz.shape[1]
+    
+    @staticmethod
+    def _normalizar(matriz: np.ndarray) -> np.ndarray:
+        normas = np.linalg.norm(matriz, axis=-1, keepdims=True)
+        normas[normas == 0] = 1.0
+        return matriz / normas
+    
+    def _reservar(self, filas: int, dim: int):
+        if self._matriz is None:
+            self._matriz = np.empty((max(self.capacidad_inicial, filas), dim), dtype=np.float32)
+        elif filas > len(self._matriz):
+            nueva = np.empty((max(filas, 2 * len(self._matriz)), dim), dtype=np.float32)
+            nueva[:len(self.ids)] = self._matriz[:len(self.ids)]
+            self._matriz = nueva
+    
+    def agregar_lote(self, ids: List[str], vectores) -> int:
+        """Añade (o reemplaza) varios vectores; descarta los de otra dimensión"""
+        if not ids:
+            return 0
+        vectores = np.asarray(vectores, dtype=np.float32)
+        if vectores.ndim != 2 or (self.dimensiones is not None and vectores.shape[1] != self.dimensiones):
+            logger.warning(f"Embeddings con dimensión incompatible descartados: {vectores.shape}")
+            return 0
+        vectores = self._normalizar(vectores)
+        
+        nuevos = [i for i, id_ in enumerate(ids) if id_ not in self._fila]
+        existentes = [i for i, id_ in enumerate(ids) if id_ in self._fila]
+        self._reservar(len(self.ids) + len(nuevos), vectores.shape[1])
+        if existentes:
+            self._matriz[[self._fila[ids[i]] for i in existentes]] = vectores[existentes]
+        if nuevos:
+            inicio = len(self.ids)
+            self._matriz[inicio:inicio + len(nuevos)] = vectores[nuevos]
+            for desplazamiento, i in enumerate(nuevos):
+                self._fila[ids[i]] = inicio + desplazamiento
+                self.ids.append(ids[i])
+        return len(ids)
+    
+    def agregar(self, id_: str, vector: List[float]):
+        """Añade (o reemplaza) un vector"""
+        self.agregar_lote([id_], [vector])
+    
+    def buscar(self, vector: List[float], k: int = 10) -> List[Tuple[str, float]]:
+        """Los k ids más similares (coseno) al vector, de mayor a menor"""
+        if not self.ids or self.dimensiones != len(vector):
+            return []
+        consulta = self._normalizar(np.asarray(vector, dtype=np.float32))
+        similitudes = self._matriz[:len(self.ids)] @ consulta
+        k = min(k, len(similitudes))
+        mejores = np.argpartition(-similitudes, k - 1)[:k]
+        mejores = mejores[np.argsort(-similitudes[mejores])]
+        return [(self.ids[i], float(similitudes[i])) for i in mejores]
+
+
 class VectorizadorCompleto:
     """Sistema completo de vectorización para RAG semántico"""
     
@@ -57,8 +134,9 @@ class VectorizadorCompleto:
         self.azure_search = None
         self.postgres_conn = None
         
-        # Cache local de embeddings
-        self.embedding_cache = {}
+        # Cache local de embeddings (almacén .npy + metadatos) + matriz para búsqueda
+        self.almacen_embeddings = AlmacenEmbeddings(str(self.cache_dir / "almacen"))
+        self.matriz_embeddings = MatrizEmbeddings()
         self._cargar_cache_local()
         
         # Estadísticas
@@ -95,24 +173,29 @@ class VectorizadorCompleto:
         }
     
     def _cargar_cache_local(self):
-        """Carga cache local de embeddings"""
+        """Carga cache local de embeddings (migra el embeddings_cache.pkl anterior)"""
         cache_file = self.cache_dir / "embeddings_cache.pkl"
-        if cache_file.exists():
+        if cache_file.exists() and not len(self.almacen_embeddings):
             try:
-                with open(cache_file, 'rb') as f:
-                    self.embedding_cache = pickle.load(f)
-                logger.info(f"Cache local cargado: {len(self.embedding_cache)} embeddings")
+                self.almacen_embeddings.importar_pickle(str(cache_file))
+                cache_file.rename(cache_file.with_suffix('.pkl.migrado'))
             except Exception as e:
-                logger.warning(f"Error cargando cache: {e}")
-                self.embedding_cache = {}
+                logger.warning(f"Error migrando cache: {e}")
+        logger.info(f"Cache local cargado: {len(self.almacen_embeddings)} embeddings")
+        self._indexar_cache()
+    
+    def _indexar_cache(self):
+        """Construye la matriz de búsqueda con los vectores del almacén"""
+        self.matriz_embeddings = MatrizEmbeddings(capacidad_inicial=max(1024, len(self.almacen_embeddings)))
+        for hashes, vectores, _ in self.almacen_embeddings.segmentos():
+            self.matriz_embeddings.agregar_lote(hashes, vectores)
     
     def _guardar_cache_local(self):
-        """Guarda cache local de embeddings"""
-        cache_file = self.cache_dir / "embeddings_cache.pkl"
+        """Guarda los embeddings nuevos como un segmento del almacén (incremental)"""
         try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(self.embedding_cache, f)
-            logger.info(f"Cache local guardado: {len(self.embedding_cache)} embeddings")
+            nuevos = self.almacen_embeddings.guardar()
+            if nuevos:
+                logger.info(f"Cache local guardado: +{nuevos} embeddings ({len(self.almacen_embeddings)} en total)")
         except Exception as e:
             logger.error(f"Error guardando cache: {e}")
     
@@ -184,9 +267,9 @@ class VectorizadorCompleto:
         
         # Verificar cache
         hash_contenido = self._get_hash_contenido(texto)
-        if usar_cache and hash_contenido in self.embedding_cache:
+        if usar_cache and hash_contenido in self.almacen_embeddings:
             self.stats['cache_hits'] += 1
-            return self.embedding_cache[hash_contenido]['vector']
+            return self.almacen_embeddings.obtener(hash_contenido).tolist()
         
         # Generar nuevo embedding
         try:
@@ -203,12 +286,12 @@ class VectorizadorCompleto:
             
             # Guardar en cache
             if usar_cache:
-                self.embedding_cache[hash_contenido] = {
-                    'vector': vector,
+                self.almacen_embeddings.agregar(hash_contenido, vector, {
                     'texto': texto[:100],  # Solo primeros 100 chars para debug
                     'timestamp': datetime.now().isoformat(),
                     'dimensiones': len(vector)
-                }
+                })
+                self.matriz_embeddings.agregar(hash_contenido, vector)
             
             self.stats['embeddings_generados'] += 1
             self.stats['cache_misses'] += 1
@@ -445,56 +528,25 @@ class VectorizadorCompleto:
         if not vector_consulta:
             return []
         
-        # Buscar en cache local
+        # Buscar en la matriz del cache local (un producto matriz-vector)
         resultados = []
-        
-        for hash_content, cached_item in self.embedding_cache.items():
-            if 'vector' not in cached_item:
-                continue
-            
-            # Calcular similitud coseno
-            vector_cached = cached_item['vector']
-            similitud = self._calcular_similitud_coseno(vector_consulta, vector_cached)
-            
-            resultado = {
+        for hash_content, similitud in self.matriz_embeddings.buscar(vector_consulta, k):
+            cached_item = self.almacen_embeddings.metadatos(hash_content) or {}
+            resultados.append({
                 'hash': hash_content,
                 'similitud': similitud,
                 'texto': cached_item.get('texto', ''),
                 'timestamp': cached_item.get('timestamp', ''),
                 'dimensiones': cached_item.get('dimensiones', 0)
-            }
-            
-            resultados.append(resultado)
+            })
         
-        # Ordenar por similitud descendente
-        resultados.sort(key=lambda x: x['similitud'], reverse=True)
-        
-        return resultados[:k]
-    
-    def _calcular_similitud_coseno(self, vector1: List[float], vector2: List[float]) -> float:
-        """Calcula similitud coseno entre dos vectores"""
-        try:
-            vec1 = np.array(vector1)
-            vec2 = np.array(vector2)
-            
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-            
-            return float(dot_product / (norm1 * norm2))
-            
-        except Exception as e:
-            logger.error(f"Error calculando similitud: {e}")
-            return 0.0
+        return resultados
     
     def obtener_estadisticas(self) -> Dict[str, Any]:
         """Obtiene estadísticas del sistema"""
         stats = self.stats.copy()
         stats.update({
-            'cache_local_size': len(self.embedding_cache),
+            'cache_local_size': len(self.almacen_embeddings),
             'cache_hit_rate': self.stats['cache_hits'] / max(1, self.stats['cache_hits'] + self.stats['cache_misses']),
             'azure_openai_disponible': self.azure_openai is not None,
             'postgres_disponible': self.postgres_conn is not None,
@@ -534,7 +586,7 @@ def main():
     print(f"   - Duración: {resultados['duracion']:.2f}s")
     
     # Probar búsqueda vectorial local
-    if vectorizador.embedding_cache:
+    if len(vectorizador.almacen_embeddings):
         print("\n🔍 Probando búsqueda vectorial local...")
         resultados_busqueda = vectorizador.buscar_vectorial_local("homicidio", [], k=3)
         
@@ -12,9 +12,13 @@ from dataclasses import dataclass
 import logging
 from datetime import datetime
 import hashlib
-import pickle
 from pathlib import Path
 
+try:
+    from .core.almacen_embeddings import AlmacenEmbeddings
+except ImportError:
+    from core.almacen_embeddings import AlmacenEmbeddings
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -44,8 +48,8 @@ class VectorizadorProyecto:
         # Inicializar componentes
         self.postgres_conn = None
         
-        # Cache local de embeddings
-        self.embedding_cache = {}
+        # Cache local de embeddings (almacén .npy + metadatos)
+        self.almacen_embeddings = AlmacenEmbeddings(str(self.cache_dir / "almacen"))
         self._cargar_cache_local()
         
         # Estadísticas
@@ -71,24 +75,22 @@ class VectorizadorProyecto:
         }
     
     def _cargar_cache_local(self):
-        """Carga cache local de embeddings"""
+        """Carga cache local de embeddings (migra el embeddings_cache.pkl anterior)"""
         cache_file = self.cache_dir / "embeddings_cache.pkl"
-        if cache_file.exists():
+        if cache_file.exists() and not len(self.almacen_embeddings):
             try:
-                with open(cache_file, 'rb') as f:
-                    self.embedding_cache = pickle.load(f)
-                logger.info(f"Cache local cargado: {len(self.embedding_cache)} embeddings")
+                self.almacen_embeddings.importar_pickle(str(cache_file))
+                cache_file.rename(cache_file.with_suffix('.pkl.migrado'))
             except Exception as e:
-                logger.warning(f"Error cargando cache: {e}")
-                self.embedding_cache = {}
+                logger.warning(f"Error migrando cache: {e}")
+        logger.info(f"Cache local cargado: {len(self.almacen_embeddings)} embeddings")
     
     def _guardar_cache_local(self):
-        """Guarda cache local de embeddings"""
-        cache_file = self.cache_dir / "embeddings_cache.pkl"
+        """Guarda los embeddings nuevos como un segmento del almacén (incremental)"""
         try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(self.embedding_cache, f)
-            logger.info(f"Cache local guardado: {len(self.embedding_cache)} embeddings")
+            nuevos = self.almacen_embeddings.guardar()
+            if nuevos:
+                logger.info(f"Cache local guardado: +{nuevos} embeddings ({len(self.almacen_embeddings)} en total)")
         except Exception as e:
             logger.error(f"Error guardando cache: {e}")
     
@@ -158,9 +160,9 @@ class VectorizadorProyecto:
         
         # Verificar cache
         hash_contenido = self._get_hash_contenido(texto)
-        if usar_cache and hash_contenido in self.embedding_cache:
+        if usar_cache and hash_contenido in self.almacen_embeddings:
             self.stats['cache_hits'] += 1
-            return self.embedding_cache[hash_contenido]['vector']
+            return self.almacen_embeddings.obtener(hash_contenido).tolist()
         
         # Generar nuevo embedding usando la interfaz funcional
         vector = self.generar_embedding_via_interfaz(texto)
@@ -168,12 +170,11 @@ class VectorizadorProyecto:
         if vector:
             # Guardar en cache
             if usar_cache:
-                self.embedding_cache[hash_contenido] = {
-                    'vector': vector,
+                self.almacen_embeddings.agregar(hash_contenido, vector, {
                     'texto': texto[:100],  # Solo primeros 100 chars para debug
                     'timestamp': datetime.now().isoformat(),
                     'dimensiones': len(vector)
-                }
+                })
             
             self.stats['embeddings_generados'] += 1
             self.stats['cache_misses'] += 1
@@ -349,7 +350,7 @@ class VectorizadorProyecto:
         """Obtiene estadísticas del sistema"""
         stats = self.stats.copy()
         stats.update({
-            'cache_local_size': len(self.embedding_cache),
+            'cache_local_size': len(self.almacen_embeddings),
             'cache_hit_rate': self.stats['cache_hits'] / max(1, self.stats['cache_hits'] + self.stats['cache_misses']),
             'postgres_disponible': self.postgres_conn is not None,
             'cache_dir': str(self.cache_dir)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests del almacén de embeddings en segmentos .npy: ida y vuelta por disco,
+reemplazo de ids y compactación
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.core.almacen_embeddings import AlmacenEmbeddings
+
+
+def _vectores(n, dim=4, desde=0):
+    return np.arange(desde * dim, (desde + n) * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_segmentos_sobreviven_a_reabrir(tmp_path):
+    almacen = AlmacenEmbeddings(str(tmp_path), dtype='float32')
+    almacen.agregar_lote(['a', 'b'], _vectores(2), [{'doc': 1}, {'doc': 2}])
+    assert almacen.guardar() == 2
+    almacen.agregar_lote(['c'], _vectores(1, desde=2))
+    almacen.guardar()
+
+    reabierto = AlmacenEmbeddings(str(tmp_path))
+    assert len(reabierto) == 3
+    assert reabierto.dtype == np.float32
+    np.testing.assert_array_equal(reabierto.obtener('c'), _vectores(1, desde=2)[0])
+    assert reabierto.metadatos('b') == {'doc': 2, 'id': 'b'}
+    partes = list(reabierto.segmentos())
+    assert [ids for ids, _, _ in partes] == [['a', 'b'], ['c']]
+    assert isinstance(partes[0][1], np.memmap)
+
+
+def test_reemplazo_gana_la_version_mas_reciente(tmp_path):
+    almacen = AlmacenEmbeddings(str(tmp_path), dtype='float32')
+    almacen.agregar_lote(['a', 'b'], _vectores(2))
+    almacen.guardar()
+    almacen.agregar('a', [9.0, 9.0, 9.0, 9.0])
+    almacen.guardar()
+
+    assert len(almacen) == 2
+    np.testing.assert_array_equal(almacen.obtener('a'), [9.0] * 4)
+    assert [ids for ids, _, _ in almacen.segmentos()] == [['b'], ['a']]
+
+
+def test_compactar_descarta_y_conserva(tmp_path):
+    almacen = AlmacenEmbeddings(str(tmp_path), dtype='float32')
+    for i in range(3):
+        almacen.agregar_lote([f"x{i}", f"y{i}"], _vectores(2, desde=2 * i))
+        almacen.guardar()
+
+    almacen.compactar(descartar=['x0'])
+    almacen.compactar(conservar={'x1', 'y1', 'x2'})
+
+    reabierto = AlmacenEmbeddings(str(tmp_path))
+    assert sorted(reabierto._ubicacion) == ['x1', 'x2', 'y1']
+    assert len(list(reabierto.segmentos())) == 1
+    np.testing.assert_array_equal(reabierto.obtener('x2'), _vectores(1, desde=4)[0])
+    assert sorted(p.name for p in tmp_path.glob('seg_*.npy')) == [f"{reabierto._segmentos[0]}.npy"]
+
+
+def test_segmentos_es_una_instantanea(tmp_path):
+    almacen = AlmacenEmbeddings(str(tmp_path), dtype='float32')
+    for i in range(3):
+        almacen.agregar_lote([f"x{i}"], _vectores(1, desde=i))
+        almacen.guardar()
+
+    partes = almacen.segmentos()
+    primera = next(partes)
+    # Una compactación a mitad de la iteración no afecta a lo ya devuelto
+    almacen.compactar(descartar=['x1'])
+    restantes = list(partes)
+
+    assert [primera[0]] + [ids for ids, _, _ in restantes] == [['x0'], ['x1'], ['x2']]
+    np.testing.assert_array_equal(restantes[-1][1], _vectores(1, desde=2))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests del cache semántico: preguntas de plantilla sobre entidades distintas
+no comparten respuesta aunque sus embeddings superen el umbral
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("psycopg2")
+
+from src.core.cache_semantico import CacheSemantico, terminos_distintivos
+
+
+class _CursorNulo:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, *args):
+        pass
+
+    def fetchall(self):
+        return []
+
+
+class _ConexionNula:
+    def cursor(self, **kwargs):
+        return _CursorNulo()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _cache_con(pregunta, embedding):
+    cache = CacheSemantico(_ConexionNula, umbral=0.97, max_entradas=10, ttl=60)
+    cache.buscar(embedding, pregunta)  # primera búsqueda: carga (vacía) desde la BD
+    cache.agregar('hash-1', pregunta, embedding, 'respuesta cacheada', [])
+    return cache
+
+
+def test_terminos_distintivos_ignoran_la_plantilla():
+    assert terminos_distintivos('¿Quién es Oswaldo Olivo?') == {'oswaldo', 'olivo'}
+    assert terminos_distintivos('qué sabes de oswaldo olivo') == {'oswaldo', 'olivo'}
+    assert terminos_distintivos('víctimas en 2005') != terminos_distintivos('víctimas en 2006')
+
+
+def test_misma_plantilla_otra_persona_no_acierta():
+    base = np.ones(8, dtype=np.float32)
+    casi_igual = base.copy()
+    casi_igual[0] += 0.05  # similitud coseno > 0.99
+    cache = _cache_con('¿Quién es Oswaldo Olivo?', base)
+
+    assert cache.buscar(casi_igual, '¿Quién es Rosa Edith Sierra?') is None
+    acierto = cache.buscar(casi_igual, 'Qué sabes de Oswaldo Olivo')
+    assert acierto is not None and acierto[0]['respuesta'] == 'respuesta cacheada'
+
+
+def test_bajo_el_umbral_no_acierta_aunque_coincidan_terminos():
+    base = np.ones(8, dtype=np.float32)
+    distinto = base.copy()
+    distinto[:4] = -1
+    cache = _cache_con('¿Quién es Oswaldo Olivo?', base)
+
+    assert cache.buscar(distinto, '¿Quién es Oswaldo Olivo?') is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests de to_cypher_literal y del reintento por mitades de la carga masiva de AGEConnector
+"""
+
+import math
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from core.graph.age_connector import AGEConnector, cypher_clave, to_cypher_literal
+
+
+def test_flotantes_no_finitos_son_null():
+    assert to_cypher_literal(float('nan')) == "null"
+    assert to_cypher_literal([1.5, math.inf, -math.inf]) == "[1.5, null, null]"
+
+
+def test_claves_no_identificador_van_entre_backquotes():
+    assert to_cypher_literal({'nombre': 'a'}) == "{nombre: 'a'}"
+    assert to_cypher_literal({'fecha inicio': 1}) == "{`fecha inicio`: 1}"
+    assert cypher_clave('a`b') == "`a``b`"
+    with pytest.raises(ValueError):
+        cypher_clave('')
+
+
+def test_lote_fallido_se_divide_hasta_aislar_filas():
+    conector = AGEConnector.__new__(AGEConnector)
+    ejecutadas = []
+
+    def _ejecutar(cypher, graph_name):
+        if "'mala'" in cypher:
+            raise RuntimeError("literal inválido")
+        ejecutadas.append(cypher)
+        return cypher.count("{")
+
+    conector._execute_cypher_bulk = _ejecutar
+    filas = [{'n': 'ok'} for _ in range(7)] + [{'n': 'mala'}]
+    fallidas = []
+    creadas = conector._ejecutar_lote_bulk(
+        lambda lote: f"UNWIND {to_cypher_literal(lote)} AS row", filas, "g", fallidas
+    )
+
+    assert creadas == 7
+    assert [f['row'] for f in fallidas] == [{'n': 'mala'}]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
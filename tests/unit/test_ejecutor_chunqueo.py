@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests del ejecutor de chunqueo: el manifiesto permite retomar una corrida
+sin reprocesar las entradas que no cambiaron
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+
+import ejecutor_chunqueo
+from ejecutor_chunqueo import MANIFIESTO, ejecutar_chunqueo
+
+PROCESADOS = []
+
+
+def _chunquear(ruta):
+    PROCESADOS.append(os.path.basename(ruta))
+    with open(ruta, encoding='utf-8') as f:
+        texto = json.load(f)['texto_extraido']
+    return {'documento_id': os.path.basename(ruta), 'archivo': os.path.basename(ruta),
+            'chunks': [{'texto_chunk': parte} for parte in texto.split('.') if parte]}
+
+
+def _entrada(directorio, nombre, texto):
+    with open(directorio / nombre, 'w', encoding='utf-8') as f:
+        json.dump({'texto_extraido': texto}, f)
+
+
+def _corrida(entrada, salida, version='v1', **kwargs):
+    PROCESADOS.clear()
+    resumen = ejecutar_chunqueo(_chunquear, str(entrada), str(salida), version, procesos=1, **kwargs)
+    return resumen, sorted(PROCESADOS)
+
+
+@pytest.fixture
+def directorios(tmp_path):
+    entrada, salida = tmp_path / 'entrada', tmp_path / 'salida'
+    entrada.mkdir()
+    for i in range(3):
+        _entrada(entrada, f"doc{i}.json", f"uno.dos.{i}")
+    return entrada, salida
+
+
+def test_segunda_corrida_omite_entradas_sin_cambios(directorios):
+    entrada, salida = directorios
+    resumen, procesados = _corrida(entrada, salida)
+    assert procesados == ['doc0.json', 'doc1.json', 'doc2.json']
+    assert resumen['chunks'] == 9
+
+    resumen, procesados = _corrida(entrada, salida)
+    assert procesados == []
+    assert resumen['omitidos'] == 3
+
+    with open(salida / MANIFIESTO, encoding='utf-8') as f:
+        manifiesto = json.load(f)['documentos']
+    assert manifiesto['doc1.json']['chunks'] == 3 and manifiesto['doc1.json']['version'] == 'v1'
+
+
+def test_reprocesa_modificadas_borradas_y_cambio_de_version(directorios):
+    entrada, salida = directorios
+    _corrida(entrada, salida)
+
+    _entrada(entrada, 'doc1.json', 'uno.dos.tres.cuatro')
+    os.remove(salida / 'doc2.json')
+    resumen, procesados = _corrida(entrada, salida)
+    assert procesados == ['doc1.json', 'doc2.json']
+    with open(salida / 'doc1.json', encoding='utf-8') as f:
+        assert len(json.load(f)['chunks']) == 4
+
+    assert _corrida(entrada, salida, version='v2')[1] == ['doc0.json', 'doc1.json', 'doc2.json']
+    assert _corrida(entrada, salida, version='v2', forzar=True)[1] == ['doc0.json', 'doc1.json', 'doc2.json']
+
+
+def test_error_no_se_registra_y_se_reintenta(directorios):
+    entrada, salida = directorios
+    with open(entrada / 'doc0.json', 'w', encoding='utf-8') as f:
+        f.write('{roto')
+    resumen, _ = _corrida(entrada, salida)
+    assert resumen['errores'] == 1 and resumen['procesados'] == 2
+
+    _entrada(entrada, 'doc0.json', 'ya.arreglado')
+    assert _corrida(entrada, salida)[1] == ['doc0.json']
+
+
+def _manifiesto(salida):
+    with open(salida / MANIFIESTO, encoding='utf-8') as f:
+        return json.load(f)['documentos']
+
+
+def test_mtime_tocado_sin_cambios_no_se_vuelve_a_hashear(directorios, monkeypatch):
+    entrada, salida = directorios
+    _corrida(entrada, salida)
+    estado = os.stat(entrada / 'doc0.json')
+    os.utime(entrada / 'doc0.json', ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+
+    hasheados = []
+    hash_original = ejecutor_chunqueo.hash_archivo
+    monkeypatch.setattr(ejecutor_chunqueo, 'hash_archivo', lambda ruta: hasheados.append(ruta) or hash_original(ruta))
+    assert _corrida(entrada, salida)[1] == []
+    assert len(hasheados) == 1
+    assert _manifiesto(salida)['doc0.json']['mtime'] == estado.st_mtime_ns + 10**9
+
+    hasheados.clear()
+    _corrida(entrada, salida)
+    assert hasheados == []
+
+
+def test_entradas_borradas_salen_del_manifiesto_con_su_salida(directorios):
+    entrada, salida = directorios
+    _corrida(entrada, salida)
+    os.remove(entrada / 'doc1.json')
+
+    resumen, procesados = _corrida(entrada, salida)
+    assert procesados == [] and resumen['eliminados'] == 1
+    assert 'doc1.json' not in _manifiesto(salida)
+    assert not (salida / 'doc1.json').exists()
+    assert (salida / 'doc0.json').exists()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
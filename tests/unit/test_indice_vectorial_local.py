@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests del índice IVF local: recall frente a la búsqueda exacta, persistencia
+con mmap y lectura de los chunks desde su JSON de origen
+"""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.core.indice_vectorial_local import IndiceVectorialLocal, RecuperadorLocalMEL, leer_chunks_mel
+
+
+def _chunks(n=2000, dim=32, grupos=20, semilla=0):
+    """Vectores agrupados alrededor de `grupos` centros, 50 chunks por documento"""
+    rng = np.random.default_rng(semilla)
+    centros = rng.normal(size=(grupos, dim))
+    for i in range(n):
+        vector = centros[i % grupos] + rng.normal(scale=0.3, size=dim)
+        yield {'chunk_id': f"c{i}", 'documento_id': f"doc{i // 50}", 'archivo': f"doc{i // 50}.pdf",
+               'mel_embedding': vector.astype(np.float32)}
+
+
+def _recall(indice, consultas, k, nprobe):
+    aciertos = 0
+    for consulta in consultas:
+        exactos = {r['chunk_id'] for r in indice.buscar_exacto(consulta, k)}
+        aproximados = {r['chunk_id'] for r in indice.buscar(consulta, k, nprobe=nprobe)}
+        aciertos += len(exactos & aproximados)
+    return aciertos / (k * len(consultas))
+
+
+def test_recall_ivf_frente_a_fuerza_bruta():
+    indice = IndiceVectorialLocal.construir(_chunks(), nlist=32)
+    consultas = np.random.default_rng(1).normal(size=(30, 32))
+
+    assert _recall(indice, consultas, k=10, nprobe=len(indice.centroides)) == 1.0
+    assert _recall(indice, consultas, k=10, nprobe=8) >= 0.9
+
+
+def test_busqueda_exacta_coincide_con_producto_punto():
+    chunks = list(_chunks(n=300))
+    indice = IndiceVectorialLocal.construir(chunks, nlist=4)
+    matriz = np.vstack([c['mel_embedding'] for c in chunks])
+    matriz /= np.linalg.norm(matriz, axis=1, keepdims=True)
+    consulta = matriz[17]
+
+    esperados = [f"c{i}" for i in np.argsort(-(matriz @ consulta))[:5]]
+    assert [r['chunk_id'] for r in indice.buscar_exacto(consulta, 5)] == esperados
+
+
+def test_guardar_y_cargar_con_mmap(tmp_path):
+    indice = IndiceVectorialLocal.construir(_chunks(n=500), nlist=8)
+    indice.guardar(str(tmp_path))
+    cargado = IndiceVectorialLocal.cargar(str(tmp_path))
+
+    assert isinstance(cargado.vectores, np.memmap)
+    consulta = np.asarray(indice.vectores[3])
+    assert cargado.buscar(consulta, 5, nprobe=8) == indice.buscar(consulta, 5, nprobe=8)
+    filtrado = cargado.buscar(consulta, 5, filtros={'documento_id': 'doc2'})
+    assert filtrado and all(r['documento_id'] == 'doc2' for r in filtrado)
+
+
+def test_textos_se_leen_del_json_de_origen(tmp_path):
+    # El JSON de salida se llama como la entrada, no como el documento_id
+    chunks = [{'chunk_id': f"c{i}", 'documento_id': 'DOC-1', 'archivo': 'sentencia.pdf',
+               'texto_chunk': f"texto {i}", 'posicion': i + 1, 'mel_embedding': [float(i), 1.0, 0.5]}
+              for i in range(3)]
+    with open(tmp_path / 'entrada_001.json', 'w', encoding='utf-8') as f:
+        json.dump({'documento_id': 'DOC-1', 'archivo': 'sentencia.pdf', 'chunks': chunks}, f)
+
+    recuperador = RecuperadorLocalMEL.__new__(RecuperadorLocalMEL)
+    recuperador.indice = IndiceVectorialLocal.construir(leer_chunks_mel(str(tmp_path)), nlist=1)
+    recuperador.directorio_chunks = str(tmp_path)
+
+    resultados = recuperador.indice.buscar([2.0, 1.0, 0.5], k=3)
+    textos = recuperador._textos(resultados)
+    assert recuperador.indice.fuente_de('DOC-1') == 'entrada_001.json'
+    assert {c: t['texto_chunk'] for c, t in textos.items()} == {'c0': 'texto 0', 'c1': 'texto 1', 'c2': 'texto 2'}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests de NameIndex: candidatos de resolver() y elección del nombre canónico
+con el que se filtran las búsquedas de persona
+"""
+
+import time
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from core.name_index import NameIndex, normalizar_nombre
+
+
+class _Cursor:
+    def __init__(self, filas):
+        self.filas = filas
+        self.ejecutadas = []
+
+    def execute(self, sql, params=None):
+        self.ejecutadas.append((sql, params))
+
+    def fetchall(self):
+        return self.filas
+
+    def close(self):
+        pass
+
+
+class _Conexion:
+    def __init__(self, filas):
+        self.cursor_ = _Cursor(filas)
+
+    def cursor(self):
+        return self.cursor_
+
+
+def _indice(vista=True, umbral=0.3):
+    indice = NameIndex(umbral=umbral)
+    # Esquema ya verificado: no se consulta la BD
+    indice._funcion, indice._vista, indice._verificado = True, vista, time.monotonic()
+    return indice
+
+
+def test_normalizar_nombre_quita_tildes_y_mayusculas():
+    assert normalizar_nombre('Ana Matilde GUZMÁN') == 'ana matilde guzman'
+
+
+def test_resolver_normaliza_y_respeta_el_orden_de_la_bd():
+    conn = _Conexion([('Ana Matilde Guzmán', 1), ('Matilde Guzmán', 0.82), ('Ana Guzmán', 0.41)])
+    candidatos = _indice(umbral=0.4).resolver('  Ana Matilde GUZMÁN ', tipo='victim', conn=conn)
+
+    assert candidatos == [('Ana Matilde Guzmán', 1.0), ('Matilde Guzmán', 0.82), ('Ana Guzmán', 0.41)]
+    (sql_limite, params_limite), (_, params) = conn.cursor_.ejecutadas
+    assert 'set_limit' in sql_limite and params_limite == (0.4,)
+    assert params[:4] == ['ana matilde guzman'] * 3 + ['%ana matilde guzman%']
+    assert params[-2:] == ['%victim%', 10]
+
+
+def test_resolver_consulta_vacia_no_toca_la_bd():
+    conn = _Conexion([('X', 1.0)])
+    assert _indice().resolver('  ', conn=conn) == []
+    assert conn.cursor_.ejecutadas == []
+
+
+def test_elegir_mantiene_la_consulta_si_la_subcadena_coincide():
+    indice = _indice()
+    candidatos = [('Ana Matilde Guzmán', 0.9), ('Matilde Guzmán López', 0.7)]
+    assert indice._elegir('matilde guzman', candidatos) == 'matilde guzman'
+    assert indice._elegir('matilde guzman', []) == 'matilde guzman'
+
+
+def test_elegir_corrige_errores_de_escritura_sobre_el_umbral():
+    indice = _indice(umbral=0.5)
+    assert indice._elegir('matilde guzmna', [('Matilde Guzmán', 0.62), ('Matilde Gómez', 0.55)]) == 'Matilde Guzmán'
+    assert indice._elegir('matilde guzmna', [('Matilde Guzmán', 0.45)]) == 'matilde guzmna'
+
+
+def test_nombre_canonico_sin_bd_devuelve_la_consulta(monkeypatch):
+    indice = _indice()
+
+    def fallar(*args, **kwargs):
+        raise psycopg2.OperationalError("sin conexión")
+
+    monkeypatch.setattr(indice, 'resolver', fallar)
+    assert indice.nombre_canonico('ana guzman') == 'ana guzman'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Test de normalizar_pregunta: mismo hash para preguntas que solo difieren en
+espacios en blanco (igual que la función SQL normalizar_pregunta)
+"""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from src.core.cache_respuestas import generar_hash_pregunta, normalizar_pregunta
+
+
+def test_espacios_en_blanco_colapsados():
+    assert normalizar_pregunta("  ¿Quién es\tOswaldo\n Olivo?\n") == "quien es oswaldo olivo"
+    assert generar_hash_pregunta("¿Quién es Oswaldo Olivo?") == generar_hash_pregunta("quien es\n\noswaldo   olivo")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests de la coalescencia async de ServicioEmbeddings: una sola llamada a la API
+por texto y cancelaciones que no se propagan a los demás interesados
+"""
+
+import asyncio
+
+import pytest
+
+from src.core.servicio_embeddings import ServicioEmbeddings
+
+
+def _api_lenta(llamadas, liberar):
+    async def llamar(textos):
+        llamadas.append(list(textos))
+        await liberar.wait()
+        return [[float(len(t))] for t in textos]
+    return llamar
+
+
+def test_peticiones_concurrentes_se_coalescen():
+    async def escenario():
+        servicio = ServicioEmbeddings(max_entradas=10)
+        llamadas, liberar = [], asyncio.Event()
+        llamar = _api_lenta(llamadas, liberar)
+        tareas = [asyncio.create_task(servicio.embedding_async("hola", llamar)) for _ in range(3)]
+        await asyncio.sleep(0)
+        liberar.set()
+        return await asyncio.gather(*tareas), llamadas, servicio
+
+    resultados, llamadas, servicio = asyncio.run(escenario())
+    assert resultados == [[4.0]] * 3
+    assert llamadas == [["hola"]]
+    assert servicio.estadisticas()['coalescidos'] == 2
+
+
+def test_cancelar_al_dueno_no_cancela_a_los_coalescidos():
+    async def escenario():
+        servicio = ServicioEmbeddings(max_entradas=10)
+        llamadas, liberar = [], asyncio.Event()
+        llamar = _api_lenta(llamadas, liberar)
+        dueno = asyncio.create_task(servicio.embedding_async("hola", llamar))
+        await asyncio.sleep(0)
+        espera = asyncio.create_task(servicio.embedding_async("hola", llamar))
+        await asyncio.sleep(0)
+        dueno.cancel()
+        await asyncio.sleep(0)
+        liberar.set()
+        vector = await espera
+        # La llamada terminó y quedó en cache aunque su dueño se canceló
+        en_cache = await servicio.embedding_async("hola", llamar)
+        return dueno, vector, en_cache, llamadas
+
+    dueno, vector, en_cache, llamadas = asyncio.run(escenario())
+    assert dueno.cancelled()
+    assert vector == [4.0]
+    assert en_cache == [4.0]
+    assert llamadas == [["hola"]]
+
+
+def test_error_de_la_api_llega_a_todos_y_libera_el_texto():
+    async def escenario():
+        servicio = ServicioEmbeddings(max_entradas=10)
+        fallar = True
+
+        async def llamar(textos):
+            await asyncio.sleep(0)
+            if fallar:
+                raise ValueError("caída")
+            return [[1.0] for _ in textos]
+
+        tareas = [asyncio.create_task(servicio.embedding_async("hola", llamar)) for _ in range(2)]
+        errores = await asyncio.gather(*tareas, return_exceptions=True)
+        fallar = False
+        return errores, await servicio.embedding_async("hola", llamar)
+
+    errores, vector = asyncio.run(escenario())
+    assert all(isinstance(e, ValueError) for e in errores)
+    assert vector == [1.0]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])